@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { PlusCircle, RefreshCw, TrendingUp, TrendingDown, DollarSign, Bell } from 'lucide-react';
 import { base_url } from '../components/config';
@@ -23,6 +23,7 @@ const Dashboard = () => {
           
           if (response.ok) {
             const data = await response.json();
+            setUserData(data);
             console.log('User data fetched:', data);
           } else {
             console.error('Failed to fetch user data');
@@ -148,6 +149,29 @@ const Dashboard = () => {
     }
     runFelix(userData?.username);
   }, [isRefreshing]);
+
+  // Bet state changes and newly released grades are pushed by the server instead of polled
+  const courseCodeRef = useRef(courseCode);
+  courseCodeRef.current = courseCode;
+  useEffect(() => {
+    if (!userData?.username) return;
+    const source = new EventSource(`${base_url}events/${userData.username}`);
+    source.addEventListener('bet', () => {
+      fetchUserData();
+      fetchUserBets(0);
+      fetchOpenBets(0);
+    });
+    source.addEventListener('grades', (e) => {
+      const { coursecode, grades } = JSON.parse(e.data);
+      if (coursecode.toUpperCase() !== courseCodeRef.current.toUpperCase()) return;
+      setQueryResults(prev => {
+        const merged = new Map(prev.grades.map(g => [g.name, g.grade]));
+        Object.entries(grades).forEach(([name, grade]) => merged.set(name, String(grade)));
+        return { grades: [...merged].map(([name, grade]) => ({ name, grade })) };
+      });
+    });
+    return () => source.close();
+  }, [userData?.username]);
   
 
   //  Fetch user's bets by status
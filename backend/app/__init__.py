@@ -1,19 +1,67 @@
 from app.views.routes import BB_BASE_URL, BB_CLIENT_ID, BB_CLIENT_SECRET, BB_REDIRECT_URI, WEB_ORIGIN
 from flask import Flask
+import os
+import threading
+from app.src import state
 from app.src.token_manager import TokenManager
-from app.models.db import db
+from app.models.db import db, Courses, TOKEN_PROBE_COURSE
 from app.views.proxy import proxy_bp
+from app.src.catalogue import CourseCatalogue
+from app.src.assessment_index import AssessmentIndexCache
+from app.src.assessment_cache import AssessmentCache, warm_assessments
+from app.src.grade_snapshots import GradeSnapshots
+from app.src.grade_histograms import GradeHistograms, load_salt
+from app.src.events import EventBus
+from app.cli import register_commands
+from app.src import governor, instrumentation, parse_pool, pricing, user_stats
 
-def create_app() -> Flask:
+def create_app(config: dict | None = None) -> Flask:
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///db.sqlite"
+    app.config.update(config or {})
     from .views.routes import api, SECRET_KEY
     db.init_app(app)
+    app.config.setdefault("STATE_URL", os.environ.get("STATE_URL", "sqlite:///data/state.sqlite"))
+    app.extensions["state"] = state.configure(app.config["STATE_URL"])
+    app.extensions["catalogue"] = CourseCatalogue(store=app.extensions["state"])
+    app.extensions["assessment_index"] = AssessmentIndexCache()
+    app.extensions["assessment_cache"] = AssessmentCache(store=app.extensions["state"])
+    app.extensions["grade_snapshots"] = GradeSnapshots(store=app.extensions["state"])
+    # Salt for the hashed usernames in grade_contributions: stable across restarts and workers
+    if not app.config.get("GRADE_HISTOGRAM_SALT"):
+        app.config["GRADE_HISTOGRAM_SALT"] = os.environ.get("GRADE_HISTOGRAM_SALT") or load_salt()
+    app.extensions["grade_histograms"] = GradeHistograms(
+        app.config["GRADE_HISTOGRAM_SALT"], app.config.get("GRADE_HISTOGRAM_MIN_SAMPLES", 5),
+    )
+    app.config.setdefault("PARSE_WORKERS", int(os.environ.get("PARSE_WORKERS", 0)))
+    app.extensions["parse_pool"] = parse_pool.configure(
+        app.config["PARSE_WORKERS"], app.config.get("PARSE_MAX_PENDING"),
+    )
+    app.extensions["repricer"] = pricing.Repricer(app)
+    app.extensions["events"] = EventBus(
+        max_connections=app.config.get("EVENTS_MAX_CONNECTIONS", 200),
+        max_per_user=app.config.get("EVENTS_MAX_PER_USER", 5),
+    )
     with app.app_context():
         db.create_all()
+        if db.session.get(Courses, TOKEN_PROBE_COURSE["course_code"]) is None:
+            db.session.add(Courses(**TOKEN_PROBE_COURSE))
         db.session.commit()
+        user_stats.rebuild_if_empty()
+        app.extensions["grade_histograms"].reset_untracked()
+        if pricing.upgrade_schema():
+            pricing.price_unpriced()
+        app.extensions["catalogue"].load()
+        instrumentation.init_app(app, db.engine)
+    governor.init_app(app)
     app.register_blueprint(api)
     app.register_blueprint(proxy_bp)
+    register_commands(app)
+    if os.environ.get("WARM_ASSESSMENTS_ON_START", "").lower() in ("1", "true", "yes"):
+        _start_warmup(app)
+    if app.extensions["parse_pool"] is not None:
+        # Each child imports the app on start-up: keep that off the startup path
+        threading.Thread(target=app.extensions["parse_pool"].start, name="parse-pool-start", daemon=True).start()
     app.config["SECRET_KEY"] = SECRET_KEY
     app.config["BB_BASE_URL"] = BB_BASE_URL
     app.config["BB_CLIENT_ID"] = BB_CLIENT_ID
@@ -24,9 +72,24 @@ def create_app() -> Flask:
         base_url=app.config["BB_BASE_URL"],
         client_id=app.config["BB_CLIENT_ID"],
         client_secret=app.config["BB_CLIENT_SECRET"],
+        store=app.extensions["state"],
     )
     return app
 
+def _start_warmup(app: Flask) -> None:
+    """Warm the assessment cache for every known course without delaying startup."""
+    def run():
+        report = warm_assessments(
+            app.extensions["assessment_cache"],
+            app.extensions["catalogue"].codes(),
+            max_workers=int(os.environ.get("WARM_ASSESSMENTS_WORKERS", 8)),
+        )
+        failed = [r for r in report if "error" in r]
+        app.logger.info("Assessment warm-up: %d courses, %d failed", len(report), len(failed))
+        for r in failed:
+            app.logger.warning("Warm-up failed for %s: %s", r["course_code"], r["error"])
+    threading.Thread(target=run, name="assessment-warmup", daemon=True).start()
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,436 @@
+"""
+ASGI serving mode. The upstream-bound endpoints (grade_check, course_check, update_bets,
+bb_proxy, assessments) and the per-user event streams run as coroutines on one event loop with an async HTTP client, so an
+in-flight Blackboard call costs a socket rather than a worker thread. Database work and HTML
+parsing still run on a thread pool, but only for their own (short) duration. Every other
+route is the unchanged Flask app, served through a WSGI bridge.
+
+    pip install ".[asgi]"
+    uvicorn --factory app.asgi:create_asgi_app --host 0.0.0.0 --port 5000
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from http.cookies import SimpleCookie
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urljoin
+
+import httpx
+import requests
+from a2wsgi import WSGIMiddleware
+from flask import Flask
+from flask_cors.core import get_cors_headers, get_cors_options
+from werkzeug.datastructures import Headers
+
+from app import create_app
+from app.models.db import TOKEN_PROBE_COURSE, Bets, BetStatus, User, db
+from app.src import breaker, governor, upstream
+from app.src.assessment_index import SEMESTERS
+from app.src.catalogue import get_catalogue
+from app.src.events import TooManySubscribers, format_sse
+from app.src.instrumentation import HTTP_SECONDS
+import app.views.routes as routes
+
+log = logging.getLogger(__name__)
+
+
+class UpstreamThrottled(httpx.TransportError):
+    """upstream.UpstreamThrottled for the httpx client."""
+
+
+class UpstreamUnavailable(httpx.TransportError):
+    """upstream.UpstreamUnavailable for the httpx client."""
+
+
+class _UpstreamTransport(httpx.AsyncBaseTransport):
+    """
+    httpx counterpart of upstream.UpstreamAdapter: same circuit breakers, rate governor,
+    per-host call counts and latency.
+    """
+
+    def __init__(self, **kwargs):
+        self._inner = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host or "unknown"
+        try:
+            circuit = upstream.admit(host)
+        except upstream.UpstreamUnavailable as e:
+            raise UpstreamUnavailable(str(e), request=request) from None
+        gov = governor.get_governor()
+        if gov is not None:
+            try:
+                await gov.acquire_async(host)
+            except governor.RateLimited as e:
+                if circuit is not None:
+                    circuit.release_probe()
+                raise UpstreamThrottled(str(e), request=request) from None
+        started = time.perf_counter()
+        outcome = "error"
+        ok = False
+        try:
+            resp = await self._inner.handle_async_request(request)
+            outcome = f"{resp.status_code // 100}xx"
+            ok = not breaker.is_failure_status(resp.status_code)
+            return resp
+        finally:
+            if circuit is not None:
+                circuit.record(ok)
+            upstream.UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=host)
+            upstream.UPSTREAM_REQUESTS.inc(host=host, outcome=outcome)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def new_async_client(max_connections: int = 500) -> httpx.AsyncClient:
+    connect, read = upstream.DEFAULT_TIMEOUT
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections // 4)
+    return httpx.AsyncClient(
+        transport=_UpstreamTransport(limits=limits),
+        timeout=httpx.Timeout(read, connect=connect),
+        # Like the shared requests session: never remember a user's Set-Cookie
+        cookies=httpx.Cookies(CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))),
+    )
+
+
+@dataclass
+class _Request:
+    method: str
+    query_string: bytes
+    headers: dict[str, str]
+    body: bytes = b""
+    cookies: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Response:
+    status: int
+    body: bytes = b""
+    headers: list[tuple[str, str]] = field(default_factory=list)
+
+
+def _json(obj, status: int = 200) -> _Response:
+    return _Response(status, json.dumps(obj, separators=(",", ":")).encode(), [("content-type", "application/json")])
+
+
+def _unavailable(body: dict) -> _Response:
+    resp = _json(body, 503)
+    resp.headers.append(("retry-after", str(routes.blackboard_retry_after())))
+    return resp
+
+
+def _scope_headers(scope) -> dict[str, str]:
+    return {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+
+
+def _cookie_header(token: str) -> dict[str, str]:
+    return {"Cookie": "; ".join(f"{k}={v}" for k, v in routes.bbrouter_cookies(token).items())}
+
+
+Handler = Callable[..., Awaitable[_Response]]
+_EVENTS_PATH = re.compile(r"/events/(?P<username>[^/]+)")
+
+
+class AsyncGateway:
+    """ASGI app: native coroutine handlers for the upstream-bound routes, Flask for the rest."""
+
+    def __init__(self, flask_app: Flask, max_connections: int = 500, sync_workers: int = 32, wsgi_workers: int = 16):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_workers)
+        # The blueprint's CORS(api) only covers Flask responses: native routes add the same headers
+        # (preflight OPTIONS requests aren't routed natively, so Flask answers those)
+        self._cors_options = get_cors_options(flask_app)
+        self.max_connections = max_connections
+        self.sync_workers = sync_workers
+        self._client: Optional[httpx.AsyncClient] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._routes: list[tuple[tuple[str, ...], re.Pattern, str, Handler]] = [
+            (("GET",), re.compile(r"/grade_check/(?P<username>[^/]+)/(?P<course_code>[^/]+)"), "api.grade_check", self.grade_check),
+            (("GET",), re.compile(r"/course_check/(?P<username>[^/]+)/(?P<course_code>[^/]+)"), "api.course_check", self.course_check),
+            (("GET",), re.compile(r"/update_bets/(?P<username>[^/]+)"), "api.update_bets", self.update_bets),
+            (
+                ("GET", "POST", "PUT", "PATCH", "DELETE"),
+                re.compile(r"/api/bb/(?P<api_path>.+)"), "api.bb_proxy", self.bb_proxy,
+            ),
+            (
+                ("GET",),
+                re.compile(r"/courses/(?P<course_code>[^/]+)/(?P<semester>\d+)/(?P<year>\d+)/assessments"),
+                "api.get_assessments", self.get_assessments,
+            ),
+        ]
+
+    # ===== ASGI plumbing =====
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http":
+            m = _EVENTS_PATH.fullmatch(scope["path"])
+            if m and scope["method"] == "GET":
+                return await self.events(scope, receive, send, m["username"])
+            for methods, pattern, endpoint, handler in self._routes:
+                m = pattern.fullmatch(scope["path"])
+                if m and scope["method"] in methods:
+                    return await self._dispatch(endpoint, handler, m.groupdict(), scope, receive, send)
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.aclose()
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = new_async_client(self.max_connections)
+        return self._client
+
+    async def _dispatch(self, endpoint: str, handler: Handler, params: dict, scope, receive, send) -> None:
+        started = time.perf_counter()
+        body = b""
+        if scope["method"] not in ("GET", "HEAD"):
+            more = True
+            while more:
+                message = await receive()
+                body += message.get("body", b"")
+                more = message.get("more_body", False)
+        headers = _scope_headers(scope)
+        cookies = SimpleCookie()
+        cookies.load(headers.get("cookie", ""))
+        req = _Request(scope["method"], scope["query_string"], headers, body, {k: m.value for k, m in cookies.items()})
+        level = headers.get("x-request-priority", "").lower()
+        try:
+            with governor.priority(level if level in governor.PRIORITIES else governor.INTERACTIVE):
+                resp = await handler(req, **params)
+        except httpx.HTTPError as e:
+            resp = _json({"error": str(e)}, 502)
+        except Exception:
+            log.exception("Unhandled error in %s", endpoint)
+            resp = _json({"error": "Internal Server Error"}, 500)
+        await send({
+            "type": "http.response.start",
+            "status": resp.status,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in resp.headers + self._cors(headers, scope["method"])],
+        })
+        await send({"type": "http.response.body", "body": resp.body})
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=scope["method"], status=resp.status)
+
+    def _cors(self, headers: dict[str, str], method: str) -> list[tuple[str, str]]:
+        """What flask_cors would add to a Flask response to this request."""
+        added = get_cors_headers(self._cors_options, Headers(list(headers.items())), method)
+        return [(k.lower(), str(v)) for k, v in added.items(multi=True)]
+
+    async def _sync(self, fn: Callable):
+        """Run blocking work (SQLAlchemy, parsing, token store) in an app context on the pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.sync_workers, thread_name_prefix="asgi-sync")
+
+        def call():
+            with self.flask_app.app_context():
+                return fn()
+        # Carry the request's context (upstream priority) onto the worker thread
+        return await asyncio.get_running_loop().run_in_executor(self._executor, contextvars.copy_context().run, call)
+
+    # ===== grade pages =====
+    async def _token_ok(self, token: str, probe_id: Optional[str]) -> Optional[bool]:
+        """routes.token_probe"""
+        if not token:
+            return False
+        try:
+            r = await self.client.get(routes.mygrades_url(probe_id), headers=_cookie_header(token))
+        except httpx.HTTPError:
+            return None
+        if breaker.is_failure_status(r.status_code):
+            return None
+        return r.status_code == 200
+
+    async def _grade_page(self, username: str, course_code: str, course_id: Optional[str], token: str):
+        """routes.grade_scrape_with_cookie (with the user's snapshot check)"""
+        if not course_id:
+            return {}
+        try:
+            r = await self.client.get(routes.mygrades_url(course_id), headers=_cookie_header(token))
+            if r.status_code != 200:
+                if breaker.is_failure_status(r.status_code):
+                    return await self._sync(lambda: routes.stale_grades(username, course_code))
+                return {}
+            return await self._sync(lambda: routes.observe_grades(username, course_code, r.text))
+        except httpx.HTTPError as e:
+            return await self._sync(lambda: routes.stale_grades(username, course_code)) or f"Error scraping website: {e}"
+        except Exception as e:
+            return f"An unexpected error occurred: {e}"
+
+    async def _user_grades(self, username: str, course_code: str):
+        """(token ok, grade page) for grade_check / course_check; None if the user doesn't exist."""
+        def load():
+            user = User.query.filter_by(username=username).first()
+            if not user:
+                return None
+            catalogue = get_catalogue()
+            return user.token, catalogue.course_id(TOKEN_PROBE_COURSE["course_code"]), catalogue.course_id(course_code)
+        loaded = await self._sync(load)
+        if loaded is None:
+            return None
+        token, probe_id, course_id = loaded
+        # As in routes: the grade page is only fetched with a token that works
+        token_ok = await self._token_ok(token, probe_id)
+        return token_ok, await self._grade_page(username, course_code, course_id, token) if token_ok else None
+
+    async def _grades_reply(self, username: str, course_code: str, available_only: bool = False) -> _Response:
+        loaded = await self._user_grades(username, course_code)
+        if loaded is None:
+            return _json({"error": "User not found"}, 404)
+        respond = partial(routes.grades_response, username, course_code, *loaded, available_only=available_only)
+        # Unreachable Blackboard: the stale fallback reads the snapshot store
+        body, status = await self._sync(respond) if loaded[0] is None else respond()
+        return _unavailable(body) if status == 503 else _json(body, status)
+
+    async def grade_check(self, req: _Request, username: str, course_code: str) -> _Response:
+        return await self._grades_reply(username, course_code)
+
+    async def course_check(self, req: _Request, username: str, course_code: str) -> _Response:
+        return await self._grades_reply(username, course_code, available_only=True)
+
+    async def update_bets(self, req: _Request, username: str) -> _Response:
+        def load():
+            user = User.query.filter_by(username=username).first()
+            if not user:
+                return None
+            codes = db.session.query(Bets.coursecode).filter_by(u1=username, status=BetStatus.Accepted).distinct()
+            catalogue = get_catalogue()
+            # create_bet allows a bet without a course: there's no page to fetch for it
+            probe_id = catalogue.course_id(TOKEN_PROBE_COURSE["course_code"])
+            return user.token, probe_id, {c: catalogue.course_id(c) for (c,) in codes if c}
+        loaded = await self._sync(load)
+        if loaded is None:
+            return _json({"error": "User not found"}, 404)
+        token, probe_id, course_ids = loaded
+        token_ok = await self._token_ok(token, probe_id)
+        if token_ok is None:
+            return _unavailable({"error": "Blackboard is unavailable"})
+        if not token_ok:
+            return _json({"error": "Blackboard token has expired. please update"}, 404)
+        # Every course's page at once, then routes.settle_user_bets in one sync call
+        pages = dict(zip(course_ids, await asyncio.gather(
+            *(self._grade_page(username, code, cid, token) for code, cid in course_ids.items())
+        )))
+
+        def page_for(course_code: str):
+            if course_code in pages:
+                return pages[course_code]
+            # A bet on another course was accepted since `load`: fetch its page here
+            return routes.grade_scrape_with_cookie(course_code, token, username)
+
+        def settle():
+            user = User.query.filter_by(username=username).first()
+            return routes.settle_user_bets(user, page_for) if user else 0
+        return _json({"number of bets updated": await self._sync(settle)})
+
+    # ===== server-sent events =====
+    async def events(self, scope, receive, send, username: str) -> None:
+        """routes.user_events, holding a coroutine per stream instead of a thread."""
+        bus = self.flask_app.extensions["events"]
+        cors = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in self._cors(_scope_headers(scope), "GET")]
+        try:
+            sub = bus.subscribe(username, asyncio.get_running_loop())
+        except TooManySubscribers:
+            resp = _json({"error": "Too many open event streams"}, 503)
+            await send({
+                "type": "http.response.start", "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"30"), *cors],
+            })
+            await send({"type": "http.response.body", "body": resp.body})
+            return
+        heartbeat = self.flask_app.config.get("EVENTS_HEARTBEAT", 15)
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await send({
+                "type": "http.response.start", "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no"), *cors,
+                ],
+            })
+            chunk = "retry: 5000\n\n"
+            while not disconnected.is_set():
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+                event = await sub.get(heartbeat)
+                chunk = format_sse(event) if event else ": heartbeat\n\n"
+        finally:
+            watcher.cancel()
+            bus.unsubscribe(sub)
+
+    # ===== Learn REST proxy =====
+    async def bb_proxy(self, req: _Request, api_path: str) -> _Response:
+        mgr = self.flask_app.extensions["bb_tokens"]
+        base_url = self.flask_app.config["BB_BASE_URL"]
+        sid = req.cookies.get("sid")
+        token = await self._sync(lambda: mgr.refresh_3lo_if_needed(sid)) if sid else None
+        if not token:
+            return _json({"error": "not_authenticated"}, 401)
+
+        upstream_url = urljoin(base_url + "/", api_path)
+        if not upstream_url.startswith(base_url + "/learn/api/public/"):
+            return _json({"error": "blocked_path"}, 403)
+        if req.query_string:
+            upstream_url += "?" + req.query_string.decode("latin-1")
+
+        headers = {"Authorization": f"Bearer {token}"}
+        if "content-type" in req.headers:
+            headers["Content-Type"] = req.headers["content-type"]
+        body = None if req.method in ("GET", "HEAD") else req.body
+        try:
+            rr = await self.client.request(
+                req.method, upstream_url, headers=headers, content=body, timeout=30 if body is None else 60
+            )
+        except httpx.HTTPError as e:
+            return _json({"error": str(e)}, 502)
+        return _Response(rr.status_code, rr.content, [("content-type", rr.headers.get("content-type", "application/octet-stream"))])
+
+    # ===== assessments =====
+    async def get_assessments(self, req: _Request, course_code: str, semester: str, year: str) -> _Response:
+        sem = SEMESTERS.get(int(semester))
+        if sem is None:
+            return _json({"error": "Invalid semester"}, 400)
+        cache = self.flask_app.extensions["assessment_cache"]
+        try:
+            # Hits are a store read; misses are already coalesced per key, so at most one pool thread each
+            body, etag = await self._sync(lambda: cache.get_response(course_code, sem, int(year)))
+        except ValueError as e:
+            return _json({"error": str(e)}, 404)
+        except requests.RequestException as e:
+            # The profile pages are fetched with requests (grade_extractor), not the async client
+            return _json({"error": str(e)}, 502)
+        max_age = self.flask_app.config.get("ASSESSMENTS_MAX_AGE", 600)
+        headers = [("etag", f'"{etag}"'), ("cache-control", f"public, max-age={max_age}")]
+        if_none_match = req.headers.get("if-none-match", "")
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if "*" in tags or f'"{etag}"' in tags:
+            return _Response(304, b"", headers)
+        return _Response(200, body.encode("utf-8"), [("content-type", "application/json")] + headers)
+
+
+def create_asgi_app(config: dict | None = None) -> AsyncGateway:
+    return AsyncGateway(create_app(config))
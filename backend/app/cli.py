@@ -0,0 +1,115 @@
+from __future__ import annotations
+import time
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+
+import app.src.grade_extractor as ge
+from sqlalchemy import func, select
+
+from app.models.db import Bets, db
+from app.src import pricing, user_stats
+from app.src.assessment_cache import current_offering, warm_assessments
+from app.src.catalogue import get_catalogue, load_offerings_file
+from app.views.routes import reprice_bets, settle_assessment
+
+
+@click.command("import-courses")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=500, show_default=True, help="Rows per upsert statement/commit.")
+@with_appcontext
+def import_courses(path: str, batch_size: int):
+    """Bulk upsert a semester's offerings from a CSV or JSON file."""
+    try:
+        rows = load_offerings_file(path)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    count = get_catalogue().upsert(rows, batch_size=batch_size)
+    click.echo(f"Upserted {count} courses ({len(get_catalogue())} in catalogue)")
+
+
+@click.command("warm-assessments")
+@click.option("--workers", default=8, show_default=True, help="Max concurrent my.uq.edu.au fetches.")
+@click.option("--semester", type=click.IntRange(1, 3), help="1, 2 or 3 (summer). Default: current.")
+@click.option("--year", type=int, help="Default: current.")
+@with_appcontext
+def warm_assessments_command(workers: int, semester: int | None, year: int | None):
+    """Fetch every catalogue course's assessment table into the shared cache."""
+    sem, yr = current_offering()
+    sem = [ge.Semester.SEM1, ge.Semester.SEM2, ge.Semester.SUMMER][semester - 1] if semester else sem
+    yr = year or yr
+    started = time.perf_counter()
+    report = warm_assessments(
+        current_app.extensions["assessment_cache"], get_catalogue().codes(), sem, yr, max_workers=workers
+    )
+    for r in report:
+        outcome = f"{r['rows']} rows" if "error" not in r else f"FAILED {r['error']}"
+        click.echo(f"{r['course_code']:<10} {r['seconds']:7.2f}s  {outcome}")
+    failed = sum(1 for r in report if "error" in r)
+    click.echo(f"Warmed {len(report) - failed}/{len(report)} courses for {sem.value} {yr} in {time.perf_counter() - started:.2f}s")
+
+
+@click.command("rebuild-stats")
+@click.option("--check", is_flag=True, help="Only report users whose stats differ from the bets table.")
+@with_appcontext
+def rebuild_stats(check: bool):
+    """Recompute per-user stats (wins, losses, staked, P&L, exposure) from the bets table."""
+    drifted = user_stats.check()
+    for d in drifted:
+        changes = ", ".join(
+            f"{f} {d['stored'][f]} -> {d['expected'][f]}" for f in user_stats.STAT_FIELDS
+            if d["stored"][f] != d["expected"][f]
+        )
+        click.echo(f"{d['username']:<20} {changes}")
+    click.echo(f"{len(drifted)} user(s) out of step with bets")
+    if check:
+        if drifted:
+            raise SystemExit(1)
+        return
+    click.echo(f"Rebuilt stats for {user_stats.rebuild()} users")
+
+
+@click.command("settle-assessment")
+@click.argument("course_code")
+@click.argument("year", type=int)
+@click.argument("semester", type=click.IntRange(1, 3))
+@click.argument("assessment")
+@click.option("--workers", default=8, show_default=True, help="Max concurrent grade page fetches.")
+@click.option("--batch-size", default=200, show_default=True, help="Bets settled per transaction.")
+@with_appcontext
+def settle_assessment_command(course_code: str, year: int, semester: int, assessment: str, workers: int, batch_size: int):
+    """Settle every accepted bet on one assessment. Safe to re-run: no bet is paid twice."""
+    started = time.perf_counter()
+    report = settle_assessment(course_code, year, semester, assessment, workers=workers, batch_size=batch_size)
+    for name in report["unavailable"]:
+        click.echo(f"{name:<20} grade page unavailable")
+    click.echo(
+        f"{report['bets']} accepted bet(s): {report['settled']} settled, {report['no_mark']} without a mark, "
+        f"{report['already_settled']} already settled, {len(report['unavailable'])} bettor(s) unavailable "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+
+@click.command("reprice-bets")
+@with_appcontext
+def reprice_bets_command():
+    """Re-price every open bet now (e.g. after a change to how bets are priced)."""
+    courses = db.session.scalars(
+        select(func.upper(Bets.coursecode)).where(Bets.status.in_(pricing.OPEN_STATUSES)).distinct()
+    ).all()
+    changed = 0
+    for course_code in courses:
+        if course_code:
+            changed += reprice_bets(course_code)
+            db.session.commit()
+    click.echo(f"Re-priced {changed} bet(s) across {len(courses)} course(s)")
+
+
+def register_commands(app: Flask) -> None:
+    """`flask --app app <command>` — commands run inside an app context."""
+    app.cli.add_command(import_courses)
+    app.cli.add_command(warm_assessments_command)
+    app.cli.add_command(rebuild_stats)
+    app.cli.add_command(settle_assessment_command)
+    app.cli.add_command(reprice_bets_command)
@@ -53,6 +53,7 @@ class Bets(db.Model):
     wager1 = db.Column(db.Float())
     wager2 = db.Column(db.Float())
     description = db.Column(db.Text())
+    implied_prob = db.Column(db.Float())  # P(mark <= lower): u1 wins; kept current by app.src.pricing
 
     def to_json(self):
         """Converts the Bets object to a JSON-serializable dictionary."""
@@ -71,6 +72,7 @@ class Bets(db.Model):
             "wager1": self.wager1,
             "wager2": self.wager2,
             "description": self.description,
+            "implied_prob": self.implied_prob,
         }
     
 class Courses(db.Model):
@@ -79,13 +81,66 @@ class Courses(db.Model):
     course_id = db.Column(db.String(80))
     course_name = db.Column(db.Text())
 
+class UserStats(db.Model):
+    """Per-user betting aggregates, kept in step with `bets` by app.src.user_stats."""
+    __tablename__ = "user_stats"
+    username = db.Column(db.String(80), primary_key=True)
+    wins = db.Column(db.Integer(), nullable=False, default=0)
+    losses = db.Column(db.Integer(), nullable=False, default=0)
+    staked = db.Column(db.Float(), nullable=False, default=0.0)  # stakes on bets that were accepted
+    net_pnl = db.Column(db.Float(), nullable=False, default=0.0)  # won minus lost on settled bets
+    open_exposure = db.Column(db.Float(), nullable=False, default=0.0)  # stakes on pending/accepted bets
+    # Leaderboard orders: highest first, ties by name
+    __table_args__ = (
+        db.Index("ix_user_stats_net_pnl", net_pnl.desc(), username),
+        db.Index("ix_user_stats_wins", wins.desc(), username),
+    )
+
+    def to_json(self):
+        return {
+            "username": self.username,
+            "wins": self.wins,
+            "losses": self.losses,
+            "staked": self.staked,
+            "net_pnl": self.net_pnl,
+            "open_exposure": self.open_exposure,
+        }
+
+class SettlementLedger(db.Model):
+    """One row per settled bet, written in the settling transaction: a bet already here is never paid again."""
+    __tablename__ = "settlement_ledger"
+    bet_uuid = db.Column(db.Uuid, primary_key=True)  # the idempotency key
+    run = db.Column(db.String(120), nullable=False)  # which pass settled it: "user:<name>" or "assessment:<id>"
+    outcome = db.Column(db.Enum(BetStatus), nullable=False)
+    grade = db.Column(db.Float(), nullable=False)
+    settled_at = db.Column(db.DateTime(), nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class GradeHistogram(db.Model):
+    """Anonymous mark counts for one assessment offering (see app.src.grade_histograms)."""
+    __tablename__ = "grade_histograms"
+    course_code = db.Column(db.String(80), primary_key=True)
+    semester = db.Column(db.Integer(), primary_key=True)
+    year = db.Column(db.Integer(), primary_key=True)
+    assessment = db.Column(db.String(120), primary_key=True)  # normalised Grade Centre column name
+    counts = db.Column(db.LargeBinary(), nullable=False)  # one little-endian uint32 per bin
+    total = db.Column(db.Integer(), nullable=False, default=0)
+    version = db.Column(db.Integer(), nullable=False, default=0)  # bumped on every update
+
+class GradeContribution(db.Model):
+    """The whole-mark bin each of one user's marks occupies in an offering's grade histograms."""
+    __tablename__ = "grade_contributions"
+    user_key = db.Column(db.String(64), primary_key=True)  # salted hash of the username, never the name
+    course_code = db.Column(db.String(80), primary_key=True)
+    semester = db.Column(db.Integer(), primary_key=True)
+    year = db.Column(db.Integer(), primary_key=True)
+    bins = db.Column(db.Text(), nullable=False)  # JSON {normalised assessment: bin}
+    version = db.Column(db.Integer(), nullable=False, default=1)  # bumped on every update
+
 class AssignmentMap(db.Model):
     __tablename__ = "assignmentMap"
     uuid = db.Column(db.Uuid, primary_key=True, default=uuid.uuid4)
     ECP_name = db.Column(db.String(80))
     Grade_name = db.Column(db.String(80))
 
-#basics for testing token vality
-test_course = Courses(course_code = "CSSE2010", course_id = "_161931_1", course_name = "Introduction to Computer Systems")
-db.session.add(test_course)
-db.session.commit()
+#basics for testing token vality (seeded by create_app once the tables exist)
+TOKEN_PROBE_COURSE = {"course_code": "CSSE2010", "course_id": "_161931_1", "course_name": "Introduction to Computer Systems"}
@@ -0,0 +1,146 @@
+from __future__ import annotations
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable
+
+import app.src.grade_extractor as ge
+from app.src import governor
+from app.src.singleflight import SingleFlight
+from app.src.state import StateStore, get_store
+
+
+def current_offering(today: datetime.date | None = None) -> tuple[ge.Semester, int]:
+    """
+    The offering students are betting on right now. Summer Semester is labelled by the
+    year it starts in (Dec), so January belongs to the previous year's summer.
+    """
+    today = today or datetime.date.today()
+    if today.month == 1:
+        return ge.Semester.SUMMER, today.year - 1
+    if today.month <= 6:
+        return ge.Semester.SEM1, today.year
+    if today.month <= 11:
+        return ge.Semester.SEM2, today.year
+    return ge.Semester.SUMMER, today.year
+
+
+def fetch_assessments(course_code: str, semester: ge.Semester, year: int) -> list[dict]:
+    """Profile URL lookup + assessment table parse (raises ValueError if there's no such offering)."""
+    extractor = ge.CourseExtractor(courses=[course_code])
+    site = extractor.get_page(course_code, semester, year)
+    return extractor.get_table(site)
+
+
+class AssessmentCache:
+    """
+    Encoded `/courses/<code>/<sem>/<year>/assessments` responses keyed by (course, semester,
+    year), kept in the shared StateStore so a warm-up run from the CLI serves every API worker.
+    Entries are {"body", "etag"} (or {"error"} for offerings that don't exist, cached briefly).
+    Concurrent misses for one key share a single upstream fetch: threads in a worker coalesce
+    on a SingleFlight, workers on a store lease.
+    """
+    _NS = "assessments"
+    _LEASE_NS = "assessments_fetch"
+    _LEASE_TTL = 60.0
+
+    def __init__(self, store: StateStore | None = None, ttl: float = 12 * 3600, negative_ttl: float = 300):
+        self._store_override = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._flights = SingleFlight()
+
+    @property
+    def _store(self) -> StateStore:
+        return self._store_override or get_store()
+
+    @staticmethod
+    def key(course_code: str, semester: ge.Semester, year: int) -> str:
+        return f"{course_code.upper()}:{semester.name}:{year}"
+
+    @staticmethod
+    def encode(table: list[dict]) -> dict:
+        body = json.dumps(table, sort_keys=True, separators=(",", ":"))
+        return {"body": body, "etag": hashlib.sha1(body.encode("utf-8")).hexdigest()}
+
+    def put(self, course_code: str, semester: ge.Semester, year: int, table: list[dict]) -> None:
+        self._store.set(self._NS, self.key(course_code, semester, year), self.encode(table), ttl=self.ttl)
+
+    def _fill(self, key: str, course_code: str, semester: ge.Semester, year: int) -> dict:
+        entry = self._store.get(self._NS, key)
+        if entry is not None:
+            return entry
+        leased = self._store.add(self._LEASE_NS, key, os.getpid(), ttl=self._LEASE_TTL)
+        if not leased:
+            # Another worker is fetching this key: wait for its entry rather than fetch again
+            deadline = time.time() + self._LEASE_TTL
+            while time.time() < deadline and self._store.get(self._LEASE_NS, key) is not None:
+                time.sleep(0.05)
+            entry = self._store.get(self._NS, key)
+            if entry is not None:
+                return entry
+        try:
+            try:
+                entry = self.encode(fetch_assessments(course_code, semester, year))
+                self._store.set(self._NS, key, entry, ttl=self.ttl)
+            except ValueError as e:
+                entry = {"error": str(e)}
+                self._store.set(self._NS, key, entry, ttl=self.negative_ttl)
+            return entry
+        finally:
+            if leased:
+                self._store.delete(self._LEASE_NS, key)
+
+    def get_response(self, course_code: str, semester: ge.Semester, year: int) -> tuple[str, str]:
+        """(json body, etag); raises ValueError if the offering doesn't exist."""
+        key = self.key(course_code, semester, year)
+        entry = self._store.get(self._NS, key)
+        if entry is None:
+            entry, _ = self._flights.do(key, lambda: self._fill(key, course_code, semester, year))
+        if "error" in entry:
+            raise ValueError(entry["error"])
+        return entry["body"], entry["etag"]
+
+    def get_or_fetch(self, course_code: str, semester: ge.Semester, year: int) -> list[dict]:
+        body, _ = self.get_response(course_code, semester, year)
+        return json.loads(body)
+
+    def size(self) -> int:
+        return self._store.count(self._NS)
+
+
+def warm_assessments(
+    cache: AssessmentCache,
+    course_codes: Iterable[str],
+    semester: ge.Semester | None = None,
+    year: int | None = None,
+    max_workers: int = 8,
+) -> list[dict]:
+    """
+    Fetch and parse every course's assessment table concurrently (at most `max_workers`
+    upstream requests in flight) into `cache`. Returns one report row per course:
+    {course_code, seconds, rows} on success or {course_code, seconds, error} on failure.
+    """
+    if semester is None or year is None:
+        semester, year = current_offering()
+
+    def warm(code: str) -> dict:
+        started = time.perf_counter()
+        try:
+            # Warm-up can wait: user-facing calls to the same host go first
+            with governor.priority(governor.BACKGROUND):
+                table = fetch_assessments(code, semester, year)
+            cache.put(code, semester, year, table)
+            return {"course_code": code, "seconds": time.perf_counter() - started, "rows": len(table)}
+        except Exception as e:
+            return {"course_code": code, "seconds": time.perf_counter() - started, "error": f"{type(e).__name__}: {e}"}
+
+    report = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup") as pool:
+        futures = [pool.submit(warm, code) for code in course_codes]
+        for f in as_completed(futures):
+            report.append(f.result())
+    return sorted(report, key=lambda r: r["course_code"])
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import difflib
+import re
+import threading
+import unicodedata
+from typing import Callable, Iterable, Optional
+
+from flask import current_app
+
+import app.src.grade_extractor as ge
+
+# Words that carry no identity in an assessment name ("The Final Exam" == "final exam")
+_STOPWORDS = {"the", "a", "an", "of", "and", "for", "in", "on", "to", "task", "assessment", "item"}
+_WEIGHT = re.compile(r"\(?\b\d+(\.\d+)?\s*%\)?")
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+# Common spellings seen on profiles vs. Grade Centre ("Assigment 1" is a real Blackboard column)
+_SYNONYMS = {
+    "assigment": "assignment", "assignement": "assignment", "asst": "assignment", "assn": "assignment",
+    "exam": "examination", "quizzes": "quiz", "prac": "practical", "pracs": "practical",
+    "labs": "lab", "tutorial": "tut", "tutorials": "tut", "mid": "midsemester", "midsem": "midsemester",
+}
+FUZZY_CUTOFF = 0.75
+
+SEMESTERS = {1: ge.Semester.SEM1, 2: ge.Semester.SEM2, 3: ge.Semester.SUMMER}
+SEMESTER_NUMBERS = {sem: n for n, sem in SEMESTERS.items()}
+
+
+def normalize(name: str) -> str:
+    """Case/accents/punctuation/weight-insensitive form: 'Assignment 1 (30%)' -> 'assignment 1'."""
+    s = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    s = _WEIGHT.sub(" ", s)
+    return " ".join(_NON_WORD.sub(" ", s).split())
+
+
+def fuzzy_key(name: str) -> str:
+    """Order-insensitive token key with stopwords dropped and common spellings folded."""
+    tokens = {_SYNONYMS.get(t, t) for t in normalize(name).split()} - _STOPWORDS
+    return " ".join(sorted(tokens))
+
+
+class AssessmentNameIndex:
+    """
+    Maps course-profile assessment names (what bets are placed on) to Blackboard
+    Grade Centre column names for one course offering. All matching happens at build
+    time; `resolve` is a dict lookup (names first seen at settlement are resolved
+    once and memoised).
+    """
+
+    def __init__(self, grade_names: Iterable[str], profile_names: Iterable[str] = (), overrides: dict[str, str] | None = None):
+        self.grade_names = set(grade_names)
+        self._by_norm = {normalize(g): g for g in self.grade_names}
+        self._by_fuzzy: dict[str, str] = {}
+        for g in self.grade_names:
+            self._by_fuzzy.setdefault(fuzzy_key(g), g)
+        # An empty key (a name of only stopwords) would be contained in every name
+        self._fuzzy_keys = [k for k in self._by_fuzzy if k]
+        self._resolved: dict[str, Optional[str]] = {}
+        for ecp, grade in (overrides or {}).items():
+            if grade in self.grade_names:
+                self._resolved[normalize(ecp)] = grade
+        for name in profile_names:
+            self.resolve(name)
+
+    def _match(self, norm: str) -> Optional[str]:
+        if norm in self._by_norm:
+            return self._by_norm[norm]
+        fk = fuzzy_key(norm)
+        if not fk:
+            return None  # only stopwords ("The Final"): nothing left to match fuzzily
+        if fk in self._by_fuzzy:
+            return self._by_fuzzy[fk]
+        # Fuzzy candidates must carry the same numbers: "Quiz 2" is never "Quiz 1"
+        tokens = set(fk.split())
+        nums = _numbers(tokens)
+        candidates = [k for k in self._fuzzy_keys if _numbers(set(k.split())) == nums]
+        # "Demo 2 - Prototype" vs "Demo 2": one name's tokens contain the other's
+        contained = [k for k in candidates if set(k.split()) <= tokens or tokens <= set(k.split())]
+        if len(contained) == 1:
+            return self._by_fuzzy[contained[0]]
+        close = difflib.get_close_matches(fk, candidates, n=2, cutoff=FUZZY_CUTOFF)
+        if len(close) == 1 or (len(close) == 2 and _ratio(fk, close[0]) - _ratio(fk, close[1]) > 0.1):
+            return self._by_fuzzy[close[0]]
+        return None  # no match, or ambiguous
+
+    def resolve(self, name: str) -> Optional[str]:
+        norm = normalize(name)
+        if norm not in self._resolved:
+            self._resolved[norm] = self._match(norm)
+        return self._resolved[norm]
+
+    def covers(self, grade_names: Iterable[str]) -> bool:
+        return self.grade_names.issuperset(grade_names)
+
+
+def _numbers(tokens: set[str]) -> set[str]:
+    return {t for t in tokens if t.isdigit()}
+
+
+def _ratio(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def profile_assessment_names(course_code: str, semester: int, year: int) -> list[str]:
+    """Assessment task names from the course profile (empty if the profile can't be read)."""
+    sem = SEMESTERS.get(semester)
+    if sem is None:
+        return []
+    try:
+        table = current_app.extensions["assessment_cache"].get_or_fetch(course_code, sem, year)
+    except Exception:
+        return []
+    return [row.get("Assessment task") for row in table if row.get("Assessment task")]
+
+
+class AssessmentIndexCache:
+    """One AssessmentNameIndex per (course, semester, year), rebuilt only when Blackboard grows new columns."""
+
+    def __init__(self):
+        self._indexes: dict[tuple[str, int, int], AssessmentNameIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        course_code: str,
+        semester: int,
+        year: int,
+        grade_names: Iterable[str],
+        overrides: Callable[[], dict[str, str]] | None = None,
+    ) -> AssessmentNameIndex:
+        """`overrides` (manual ECP -> grade name rows) is only called when the index is (re)built."""
+        key = (course_code.upper(), semester, year)
+        grade_names = set(grade_names)
+        idx = self._indexes.get(key)
+        if idx is not None and idx.covers(grade_names):
+            return idx
+        profile = profile_assessment_names(course_code, semester, year)
+        idx = AssessmentNameIndex(
+            grade_names | (idx.grade_names if idx else set()), profile, overrides() if overrides else None
+        )
+        with self._lock:
+            self._indexes[key] = idx
+        return idx
+
+    def peek(self, course_code: str, semester: int, year: int) -> AssessmentNameIndex | None:
+        """The index if it's already built; never builds one (no course profile fetch)."""
+        return self._indexes.get((course_code.upper(), semester, year))
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def invalidate(self, course_code: str | None = None) -> None:
+        with self._lock:
+            if course_code is None:
+                self._indexes.clear()
+            else:
+                for key in [k for k in self._indexes if k[0] == course_code.upper()]:
+                    self._indexes.pop(key, None)
@@ -0,0 +1,144 @@
+"""
+Per-host circuit breakers for outbound calls. After `failures` consecutive failed calls to a
+host (connection errors, timeouts, 5xx, 429) its circuit opens: calls fail immediately with
+CircuitOpen instead of each holding a worker until the timeout. After `reset_timeout`
+seconds one probe call is let through (half-open); success closes the circuit, failure
+re-opens it for another `reset_timeout`.
+
+While a circuit is open the grade endpoints answer from the last snapshot, marked stale.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+
+from app.src import metrics
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = metrics.gauge(
+    "upstream_circuit_state", "Circuit breaker state per host (0 closed, 1 half-open, 2 open)", labels=("host",)
+)
+CIRCUIT_TRANSITIONS = metrics.counter(
+    "upstream_circuit_transitions_total", "Circuit breaker state changes", labels=("host", "state")
+)
+CIRCUIT_REJECTED = metrics.counter(
+    "upstream_circuit_rejected_total", "Outbound calls failed fast by an open circuit", labels=("host",)
+)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, host: str, failures: int = 5, reset_timeout: float = 30.0):
+        self.host = host
+        self.failure_threshold = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+        self._lock = threading.Lock()
+
+    def _set(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUE[state], host=self.host)
+        CIRCUIT_TRANSITIONS.inc(host=self.host, state=state)
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self) -> None:
+        """Raises CircuitOpen unless the call may go out (closed, or this is the half-open probe)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced after a while
+                if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                    self._probe_started = now
+                    return
+            retry_after = self.retry_after() or self.reset_timeout
+        CIRCUIT_REJECTED.inc(host=self.host)
+        raise CircuitOpen(self.host, retry_after)
+
+    def release_probe(self) -> None:
+        """The admitted call never went out (e.g. rate limited): let another probe through."""
+        with self._lock:
+            self._probe_started = None
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._failures = 0
+                self._probe_started = None
+                if self.state != CLOSED:
+                    self._set(CLOSED)
+                return
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                if self.state != OPEN:
+                    self._set(OPEN)
+
+
+def is_failure_status(status_code: int) -> bool:
+    return status_code >= 500 or status_code == 429
+
+
+class Breakers:
+    """One CircuitBreaker per host, created on first use."""
+
+    def __init__(self, failures: int = 5, reset_timeout: float = 30.0):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> CircuitBreaker:
+        b = self._breakers.get(host)
+        if b is None:
+            with self._lock:
+                b = self._breakers.get(host)
+                if b is None:
+                    b = self._breakers[host] = CircuitBreaker(host, self.failures, self.reset_timeout)
+        return b
+
+    def retry_after(self, host: str) -> float:
+        """Seconds until `host`'s open circuit lets a probe through (0 when it isn't open)."""
+        b = self._breakers.get(host)
+        return b.retry_after() if b is not None and b.state == OPEN else 0.0
+
+    def open_hosts(self) -> dict[str, str]:
+        return {h: b.state for h, b in self._breakers.items() if b.state != CLOSED}
+
+
+def from_env() -> Breakers | None:
+    """UPSTREAM_BREAKER_FAILURES (default 5; 0 disables) and UPSTREAM_BREAKER_RESET (seconds, default 30)."""
+    failures = int(os.environ.get("UPSTREAM_BREAKER_FAILURES", 5))
+    if failures <= 0:
+        return None
+    return Breakers(failures, float(os.environ.get("UPSTREAM_BREAKER_RESET", 30)))
+
+
+_breakers: Breakers | None = from_env()
+
+
+def configure(breakers: Breakers | None) -> Breakers | None:
+    global _breakers
+    _breakers = breakers
+    return _breakers
+
+
+def get_breakers() -> Breakers | None:
+    return _breakers
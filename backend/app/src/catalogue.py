@@ -0,0 +1,149 @@
+from __future__ import annotations
+import csv
+import io
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.db import db, Courses
+from app.src.state import StateStore, get_store
+
+
+class CourseCatalogue:
+    """
+    In-memory `course_code -> course_id` index over the `courses` table.
+    Loaded once at startup; every write bumps a generation counter in the shared
+    StateStore so other workers reload on their next check (at most `check_interval` s later).
+    """
+    _NS = "catalogue"
+    _GEN_KEY = "generation"
+
+    def __init__(self, store: StateStore | None = None, check_interval: float = 5.0):
+        self._store_override = store
+        self._check_interval = check_interval
+        self._index: dict[str, str] = {}
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def _store(self) -> StateStore:
+        return self._store_override or get_store()
+
+    # ===== reads =====
+    def load(self) -> int:
+        """(Re)build the index from the DB. Needs an app context."""
+        generation = self._store.get(self._NS, self._GEN_KEY)
+        rows = db.session.execute(db.select(Courses.course_code, Courses.course_id)).all()
+        index = {code.upper(): cid for code, cid in rows if code and cid}
+        with self._lock:
+            self._index = index  # swapped whole, readers never see a half-built dict
+            self._generation = generation
+            self._checked_at = time.time()
+        return len(index)
+
+    def _maybe_reload(self) -> None:
+        now = time.time()
+        if now - self._checked_at < self._check_interval:
+            return
+        self._checked_at = now
+        if self._store.get(self._NS, self._GEN_KEY) != self._generation:
+            self.load()
+
+    def course_id(self, course_code: str) -> Optional[str]:
+        self._maybe_reload()
+        return self._index.get(course_code.upper())
+
+    def codes(self) -> list[str]:
+        self._maybe_reload()
+        return sorted(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # ===== writes =====
+    def invalidate(self) -> None:
+        self._store.set(self._NS, self._GEN_KEY, time.time_ns())
+        self.load()
+
+    def upsert(self, rows: Iterable[dict], batch_size: int = 500) -> int:
+        """
+        Insert-or-update courses in batches of `batch_size` (one statement + commit per batch).
+        Rows need `course_code` and `course_id`; `course_name` is optional.
+        """
+        total = 0
+        batch: list[dict] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                total += self._upsert_batch(batch)
+                batch = []
+        if batch:
+            total += self._upsert_batch(batch)
+        if total:
+            self.invalidate()
+        return total
+
+    def _upsert_batch(self, batch: list[dict]) -> int:
+        if db.engine.dialect.name == "sqlite":
+            stmt = sqlite_insert(Courses).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Courses.course_code],
+                set_={"course_id": stmt.excluded.course_id, "course_name": stmt.excluded.course_name},
+            )
+            db.session.execute(stmt)
+        else:
+            for row in batch:
+                db.session.merge(Courses(**row))
+        db.session.commit()
+        return len(batch)
+
+
+def _field(row: dict, name: str) -> str:
+    value = row.get(name)
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"Field {name} must be a string in row: {row}")
+    return str(value).strip()  # JSON numbers, e.g. a bare numeric course_id
+
+
+def _clean(row: dict) -> dict:
+    if not isinstance(row, dict):
+        raise ValueError(f"Expected an object per course, got: {row!r}")
+    code = _field(row, "course_code").upper()
+    cid = _field(row, "course_id")
+    if not code or not cid:
+        raise ValueError(f"Missing course_code/course_id in row: {row}")
+    return {"course_code": code, "course_id": cid, "course_name": _field(row, "course_name") or None}
+
+
+def parse_offerings(content: str, fmt: str) -> list[dict]:
+    """
+    Parse a semester's offerings from CSV (header: course_code,course_id[,course_name])
+    or JSON (a list of objects, or {"courses": [...]}).
+    """
+    if fmt == "json":
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get("courses", [])
+        if not isinstance(data, list):
+            raise ValueError("Expected a list of courses")
+        return [_clean(r) for r in data]
+    if fmt == "csv":
+        return [_clean(r) for r in csv.DictReader(io.StringIO(content))]
+    raise ValueError(f"Unsupported format '{fmt}' (expected csv or json)")
+
+
+def load_offerings_file(path: str | Path) -> list[dict]:
+    path = Path(path)
+    return parse_offerings(path.read_text(encoding="utf-8-sig"), path.suffix.lstrip(".").lower())
+
+
+def get_catalogue() -> CourseCatalogue:
+    return current_app.extensions["catalogue"]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+import asyncio
+import json
+import queue
+import threading
+from typing import Optional
+
+from flask import current_app
+
+from app.src import metrics
+
+SSE_CONNECTIONS = metrics.gauge("sse_connections", "Open server-sent event streams")
+EVENTS_PUBLISHED = metrics.counter("events_published_total", "Events published to user streams", labels=("type",))
+EVENTS_DROPPED = metrics.counter("events_dropped_total", "Events dropped because a stream's buffer was full")
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """One open stream's buffer. A client that stops reading loses events rather than memory."""
+
+    def __init__(self, username: str, maxsize: int = 100):
+        self.username = username
+        self._queue: queue.Queue = queue.Queue(maxsize)
+
+    def put(self, event: dict) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            EVENTS_DROPPED.inc()
+
+    def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read from an event loop (ASGI mode); publishers may be on any thread."""
+
+    def __init__(self, username: str, loop: asyncio.AbstractEventLoop, maxsize: int = 100):
+        self.username = username
+        self._loop = loop
+        self._aqueue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def _put(self, event: dict) -> None:
+        try:
+            self._aqueue.put_nowait(event)
+        except asyncio.QueueFull:
+            EVENTS_DROPPED.inc()
+
+    def put(self, event: dict) -> None:
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self._aqueue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+    In-process pub/sub from the settlement and grade-fetch paths to each user's open
+    `/events/<username>` streams. Publishing never blocks. Events only reach streams held by
+    this worker process.
+    """
+
+    def __init__(self, max_connections: int = 200, max_per_user: int = 5):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self._subs: dict[str, set[Subscription]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, username: str, loop: asyncio.AbstractEventLoop | None = None) -> Subscription:
+        """Raises TooManySubscribers when the process or user connection cap is reached."""
+        sub = AsyncSubscription(username, loop) if loop else Subscription(username)
+        with self._lock:
+            user_subs = self._subs.setdefault(username, set())
+            if self._count >= self.max_connections or len(user_subs) >= self.max_per_user:
+                if not user_subs:
+                    del self._subs[username]
+                raise TooManySubscribers(username)
+            user_subs.add(sub)
+            self._count += 1
+        SSE_CONNECTIONS.inc()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            user_subs = self._subs.get(sub.username)
+            if not user_subs or sub not in user_subs:
+                return
+            user_subs.discard(sub)
+            if not user_subs:
+                del self._subs[sub.username]
+            self._count -= 1
+        SSE_CONNECTIONS.dec()
+
+    def publish(self, username: str, event: dict) -> None:
+        EVENTS_PUBLISHED.inc(type=event.get("type", ""))
+        with self._lock:
+            subs = list(self._subs.get(username, ()))
+        for sub in subs:
+            sub.put(event)
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+def get_events() -> EventBus:
+    return current_app.extensions["events"]
+
+
+def bet_event(bet) -> dict:
+    """Build before commit: reading a committed (expired) row would re-select it."""
+    return {
+        "type": "bet",
+        "uuid": str(bet.uuid),
+        "status": bet.status.name,
+        "coursecode": bet.coursecode,
+        "assessment": bet.assessment,
+    }
+
+
+def publish_bet(event: dict, *usernames: str) -> None:
+    """A bet changed state (accepted, settled): tell every party to it."""
+    bus = get_events()
+    for username in {u for u in usernames if u and u != "NONE"}:
+        bus.publish(username, event)
+
+
+def publish_grades(username: str, course_code: str, changed: dict[str, str]) -> None:
+    get_events().publish(username, {"type": "grades", "coursecode": course_code, "grades": changed})
@@ -0,0 +1,284 @@
+"""
+Per-host token-bucket governor for outbound calls (learn.uq.edu.au, my.uq.edu.au, ...), so a
+busy minute of settlement, token checks, course checks and proxying doesn't trip upstream
+throttling. Every call through upstream.UpstreamAdapter (and the ASGI httpx transport) takes
+a token for its host first.
+
+Two priority classes share each host's bucket. Interactive calls (the default) reserve the
+next token and sleep until it's due; background calls (warm-up, bulk settlement, clients that
+send `X-Request-Priority: background`) only take tokens nobody is waiting for. Both wait in
+bounded queues with a maximum wait: past either, the call is rejected with RateLimited
+rather than piling up threads.
+
+    with governor.priority(governor.BACKGROUND):
+        warm_assessments(...)
+"""
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator
+
+from flask import Flask, g, request
+
+from app.src import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+GOVERNOR_WAIT = metrics.histogram(
+    "upstream_governor_wait_seconds", "Time outbound calls waited for a rate token", labels=("host", "priority"),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+GOVERNOR_REJECTED = metrics.counter(
+    "upstream_governor_rejected_total", "Outbound calls refused by the rate governor",
+    labels=("host", "priority", "reason"),
+)
+GOVERNOR_QUEUED = metrics.gauge(
+    "upstream_governor_queued", "Outbound calls waiting for a rate token", labels=("host", "priority")
+)
+
+_priority: ContextVar[str] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority(level: str) -> Iterator[None]:
+    """Outbound calls made inside the block (on this thread / task) use `level`."""
+    if level not in PRIORITIES:
+        raise ValueError(f"priority must be one of {PRIORITIES}")
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimited(Exception):
+    def __init__(self, host: str, level: str, reason: str):
+        super().__init__(f"Upstream rate limit for {host}: {level} call refused ({reason})")
+        self.host = host
+        self.priority = level
+        self.reason = reason
+
+
+@dataclass
+class Limits:
+    rate: float  # tokens per second
+    burst: float  # bucket size
+    max_queue: int = 100  # callers waiting per priority
+    max_wait: float = 10.0  # interactive: seconds
+    background_max_wait: float = 120.0
+
+
+class HostBucket:
+    def __init__(self, host: str, limits: Limits):
+        self.host = host
+        self.limits = limits
+        self.tokens = limits.burst
+        self._updated = time.monotonic()
+        self._waiting = dict.fromkeys(PRIORITIES, 0)
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.limits.burst, self.tokens + (now - self._updated) * self.limits.rate)
+        self._updated = now
+
+    def _reject(self, level: str, reason: str) -> RateLimited:
+        GOVERNOR_REJECTED.inc(host=self.host, priority=level, reason=reason)
+        return RateLimited(self.host, level, reason)
+
+    def reserve(self, level: str, waited: float = 0.0) -> tuple[bool, float]:
+        """
+        (granted, delay). Granted: the token is held; sleep `delay` before calling. Not granted
+        (background only): nothing is held; sleep `delay` and ask again. Raises RateLimited.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            rate = self.limits.rate
+            if level == INTERACTIVE:
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True, 0.0
+                # Reserve the next token ahead of any background caller: the bucket goes into debt
+                delay = (1 - self.tokens) / rate
+                if self._waiting[INTERACTIVE] >= self.limits.max_queue:
+                    raise self._reject(level, "queue_full")
+                if delay > self.limits.max_wait:
+                    raise self._reject(level, "timeout")
+                self.tokens -= 1
+                self._waiting[INTERACTIVE] += 1
+                GOVERNOR_QUEUED.inc(host=self.host, priority=INTERACTIVE)
+                return True, delay
+            # Background: only a token that is here now and that no interactive caller is owed
+            if self.tokens >= 1 and self._waiting[INTERACTIVE] == 0:
+                self.tokens -= 1
+                return True, 0.0
+            delay = max((1 - self.tokens) / rate, 0.01)
+            if waited + delay > self.limits.background_max_wait:
+                raise self._reject(level, "timeout")
+            return False, delay
+
+    def enter_queue(self, level: str) -> None:
+        with self._lock:
+            if self._waiting[level] >= self.limits.max_queue:
+                raise self._reject(level, "queue_full")
+            self._waiting[level] += 1
+        GOVERNOR_QUEUED.inc(host=self.host, priority=level)
+
+    def leave_queue(self, level: str) -> None:
+        with self._lock:
+            self._waiting[level] -= 1
+        GOVERNOR_QUEUED.dec(host=self.host, priority=level)
+
+
+class Governor:
+    """Buckets per host, created on first use from `default` or a per-host override."""
+
+    def __init__(self, default: Limits, hosts: dict[str, Limits] | None = None):
+        self.default = default
+        self.hosts = hosts or {}
+        self._buckets: dict[str, HostBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> HostBucket:
+        b = self._buckets.get(host)
+        if b is None:
+            with self._lock:
+                b = self._buckets.get(host)
+                if b is None:
+                    b = self._buckets[host] = HostBucket(host, self.hosts.get(host, self.default))
+        return b
+
+    def acquire(self, host: str, level: str | None = None) -> float:
+        """Block until a call to `host` may go out; returns the seconds waited. Raises RateLimited."""
+        level = level or current_priority()
+        b = self.bucket(host)
+        started = time.monotonic()
+        granted, delay = b.reserve(level)
+        if not granted:
+            b.enter_queue(level)
+            try:
+                while not granted:
+                    time.sleep(delay)
+                    granted, delay = b.reserve(level, time.monotonic() - started)
+            finally:
+                b.leave_queue(level)
+        if delay:
+            try:
+                time.sleep(delay)
+            finally:
+                b.leave_queue(INTERACTIVE)
+        return self._waited(host, level, started)
+
+    async def acquire_async(self, host: str, level: str | None = None) -> float:
+        """`acquire` for the event loop: waits with asyncio.sleep."""
+        level = level or current_priority()
+        b = self.bucket(host)
+        started = time.monotonic()
+        granted, delay = b.reserve(level)
+        if not granted:
+            b.enter_queue(level)
+            try:
+                while not granted:
+                    await asyncio.sleep(delay)
+                    granted, delay = b.reserve(level, time.monotonic() - started)
+            finally:
+                b.leave_queue(level)
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                b.leave_queue(INTERACTIVE)
+        return self._waited(host, level, started)
+
+    @staticmethod
+    def _waited(host: str, level: str, started: float) -> float:
+        waited = time.monotonic() - started
+        GOVERNOR_WAIT.observe(waited, host=host, priority=level)
+        return waited
+
+
+def _parse_hosts(spec: str, base: Limits) -> dict[str, Limits]:
+    """"learn.uq.edu.au=20/40,my.uq.edu.au=10" -> per-host Limits (burst defaults to 2x rate)."""
+    hosts = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        host, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        hosts[host.strip()] = Limits(
+            float(rate), float(burst) if burst else 2 * float(rate),
+            base.max_queue, base.max_wait, base.background_max_wait,
+        )
+    return hosts
+
+
+def _worker_share(limits: Limits, workers: int) -> Limits:
+    """This process's part of a host-wide limit shared by `workers` processes."""
+    return Limits(
+        limits.rate / workers, max(1.0, limits.burst / workers),
+        limits.max_queue, limits.max_wait, limits.background_max_wait,
+    )
+
+
+def from_env() -> Governor | None:
+    """
+    UPSTREAM_RATE (calls/s per host, default 25; 0 disables the governor), UPSTREAM_BURST,
+    UPSTREAM_HOST_LIMITS ("host=rate[/burst],..."), UPSTREAM_MAX_QUEUE, UPSTREAM_MAX_WAIT and
+    UPSTREAM_BACKGROUND_MAX_WAIT (seconds).
+
+    Buckets live in each process, so rates and bursts are host-wide totals split evenly across
+    UPSTREAM_WORKERS processes (default WEB_CONCURRENCY, which gunicorn and uvicorn read as
+    their worker count, else 1).
+    """
+    rate = float(os.environ.get("UPSTREAM_RATE", 25))
+    if rate <= 0:
+        return None
+    workers = max(1, int(os.environ.get("UPSTREAM_WORKERS", os.environ.get("WEB_CONCURRENCY", 1))))
+    base = Limits(
+        rate,
+        float(os.environ.get("UPSTREAM_BURST", 2 * rate)),
+        int(os.environ.get("UPSTREAM_MAX_QUEUE", 100)),
+        float(os.environ.get("UPSTREAM_MAX_WAIT", 10)),
+        float(os.environ.get("UPSTREAM_BACKGROUND_MAX_WAIT", 120)),
+    )
+    hosts = _parse_hosts(os.environ.get("UPSTREAM_HOST_LIMITS", ""), base)
+    return Governor(_worker_share(base, workers), {host: _worker_share(limits, workers) for host, limits in hosts.items()})
+
+
+_governor: Governor | None = from_env()
+
+
+def configure(governor: Governor | None) -> Governor | None:
+    """Install `governor` for the process (None: outbound calls are not rate limited)."""
+    global _governor
+    _governor = governor
+    return _governor
+
+
+def get_governor() -> Governor | None:
+    return _governor
+
+
+def init_app(app: Flask) -> None:
+    """Requests that send `X-Request-Priority: background` make background outbound calls."""
+
+    @app.before_request
+    def _set_priority():
+        level = request.headers.get("X-Request-Priority", "").lower()
+        if level in PRIORITIES:
+            g.priority_token = _priority.set(level)
+
+    @app.teardown_request
+    def _reset_priority(exc):
+        token = g.pop("priority_token", None)
+        if token is not None:
+            _priority.reset(token)
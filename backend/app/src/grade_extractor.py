@@ -2,53 +2,104 @@ import requests
 import json
 from bs4 import BeautifulSoup
 import os
+import re
+import threading
 import time
 import pandas as pd
+from dataclasses import dataclass
 from pathlib import Path
 import enum
 
+from app.src import parse_pool, upstream
+
+# Outbound base URL (override to point at a local stand-in, e.g. tools/fake_blackboard.py)
+MYUQ_BASE_URL = os.environ.get("MYUQ_BASE_URL", "https://my.uq.edu.au").rstrip("/")
+
 # Semester Enumerate
 class Semester(enum.Enum):
     SEM1 = 'Semester 1'
     SEM2 = 'Semester 2'
     SUMMER = 'Summer Semester'
 
+@dataclass(frozen=True)
+class Offering:
+    semester: Semester
+    year: int
+    url: str | None
+    available: bool
+
+
 class CourseExtractor():
+    # COURSE_CODE -> (expires_at, {(Semester, year): Offering}); one course page lists every offering
+    _offerings: dict[str, tuple[float, dict[tuple[Semester, int], Offering] | None]] = {}
+    _offerings_lock = threading.Lock()
+    OFFERINGS_TTL = 6 * 3600
+    # Not found / no offering rows: may be a page served mid-outage, so look again soon
+    OFFERINGS_EMPTY_TTL = 300
     
     def __init__(self, courses: list[str]):
         self.courses = courses
 
     @staticmethod
     def get_course_url(course_code: str) -> str:
-        return f'https://my.uq.edu.au/programs-courses/course.html?course_code={course_code}'
-    
+        return f'{MYUQ_BASE_URL}/programs-courses/course.html?course_code={course_code}'
+
     @staticmethod
-    def get_page(code: str, semester: Semester, year: int):
-        url = CourseExtractor.get_course_url(code)
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+    def parse_offerings(html: str) -> dict[tuple[Semester, int], Offering] | None:
+        """
+        Index every offering row on a course page by (semester, year).
+        Returns None if the page says the course doesn't exist.
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        if soup.find(id="course-notfound") is not None:
+            return None
+        offerings: dict[tuple[Semester, int], Offering] = {}
+        for item in soup.find_all('tr'):
+            text = item.text.strip()
+            semester = next((s for s in Semester if s.value in text), None)
+            year = re.search(r'(?<!\d)(20\d\d)(?!\d)', text)
+            if semester is None or year is None:
+                continue
+            key = (semester, int(year.group(1)))
+            link = item.find('a', class_="profile-available")
+            available = link is not None and 'unavailable' not in text
+            # Several rows per offering (campus / mode): keep the first available one
+            if key not in offerings or (available and not offerings[key].available):
+                offerings[key] = Offering(key[0], key[1], link["href"] if available else None, available)
+        return offerings
+
+    @staticmethod
+    def get_offerings(code: str) -> dict[tuple[Semester, int], Offering] | None:
+        """
+        Cached offering index for a course; the course page is downloaded at most once per TTL.
+        Raises requests.HTTPError (nothing cached) if the page isn't a 200.
+        """
+        code = code.upper()
+        now = time.time()
+        cached = CourseExtractor._offerings.get(code)
+        if cached is not None and now < cached[0]:
+            return cached[1]
         header = requests.utils.default_headers()
         header.update(
             {
                 "User-Agent": "My User Agent 1.0",
             }
         )
-        page = requests.get(url, headers=header)
-        soup = BeautifulSoup(page.text, 'html.parser')
-        
-        if soup.find(id="course-notfound") is not None:
+        page = upstream.get(CourseExtractor.get_course_url(code), headers=header, timeout=20)
+        page.raise_for_status()
+        offerings = parse_pool.parse(CourseExtractor.parse_offerings, page.text)
+        ttl = CourseExtractor.OFFERINGS_TTL if offerings else CourseExtractor.OFFERINGS_EMPTY_TTL
+        with CourseExtractor._offerings_lock:
+            CourseExtractor._offerings[code] = (now + ttl, offerings)
+        return offerings
+    
+    @staticmethod
+    def get_page(code: str, semester: Semester, year: int):
+        offerings = CourseExtractor.get_offerings(code)
+        offering = (offerings or {}).get((semester, year))
+        if offering is None or not offering.available:
             raise ValueError(f"Course {code} not found for {semester.value} {year}.")
-        box = soup.find_all('tr')
-
-        for item in box:
-            text = item.text.strip()
-            if (str(year) in text and semester.value in text
-            and 'unavailable' not in text):
-                h = item.find_all('a', class_="profile-available")
-                href = h[0]["href"]
-                #report the last part of the href
-                return href
-        raise ValueError(f"Course {code} not found for {semester.value} {year}.")
+        return offering.url
 
     def get_table(self, site: str):
         headers = requests.utils.default_headers()
@@ -58,8 +109,15 @@ class CourseExtractor():
             }
         )
         assessment = f"{site}#assessment"
-        page = requests.get(assessment, headers=headers)
-        html_content = page.text
+        page = upstream.get(assessment, headers=headers)
+        try:
+            return parse_pool.parse(CourseExtractor.parse_assessment_table, page.text)
+        except ValueError as e:
+            raise ValueError(f"{e} for {site}.") from None
+
+    @staticmethod
+    def parse_assessment_table(html_content: str) -> list[dict]:
+        """Assessment rows ({Assessment task, Category, Weight, ...}) from a course profile page."""
         soup = BeautifulSoup(html_content, 'html.parser')
 
         # Remove <ul class="icon-list"> elements
@@ -69,7 +127,7 @@ class CourseExtractor():
         # Extract table headings + rows for pandas df
         table = soup.find('table')
         if table is None:
-            raise ValueError(f"No table found on assessment page for {site}.")
+            raise ValueError("No table found on assessment page")
         headers = [header.text.strip() for header in table.find_all('th')]
         rows = []
         for row in table.find('tbody').find_all('tr'):
@@ -106,7 +164,7 @@ class CourseExtractor():
                 'User-Agent': 'My User Agent 1.0',
             }
         )
-        response = requests.get(site, headers=headers)
+        response = upstream.get(site, headers=headers)
         if response.status_code != 200:
             raise ValueError(f"Failed to retrieve {site}")
         return response.text
@@ -0,0 +1,260 @@
+"""
+Anonymous mark distributions per assessment offering (course, semester, year, assessment),
+built from grade pages as they arrive. Each is a fixed array of counts, one bin per whole
+mark from 0 to 100 (the last bin also takes anything above), stored as packed uint32s.
+
+What each user currently contributes is kept in `grade_contributions`, keyed by a salted hash
+of the username (no names are stored), and every change is worked out against that record in
+the same transaction as the counts. Seeing a page again, from any worker, after the snapshot
+store was wiped or expired, never counts its marks twice.
+
+Pricing reads a cumulative distribution precomputed per histogram, so P(mark <= lower) is one
+array lookup. Histograms with fewer than MIN_SAMPLES marks aren't served (too few to
+be a distribution, and few enough to identify someone); pricing uses its prior instead.
+"""
+from __future__ import annotations
+import hashlib
+import hmac
+import json
+import math
+import secrets
+import threading
+from pathlib import Path
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.models.db import GradeContribution, GradeHistogram, db
+from app.src import metrics
+from app.src.assessment_index import normalize
+
+BINS = 101
+MIN_SAMPLES = 5
+_DTYPE = np.dtype("<u4")
+# Attempts at the read / compare-and-swap update before giving up on a histogram or contribution
+_RETRIES = 5
+# Where a generated salt is kept when GRADE_HISTOGRAM_SALT isn't configured
+SALT_FILE = "data/grade_histogram_salt"
+
+HISTOGRAM_UPDATES = metrics.counter(
+    "grade_histogram_updates_total", "Marks added to, moved within or removed from grade histograms", labels=("kind",)
+)
+
+
+def _mark(text) -> float | None:
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None  # ungraded ('-') or non-numeric
+    return None if math.isnan(value) else value
+
+
+def load_salt(path: str | Path = SALT_FILE) -> str:
+    """The salt in `path`, created on first use: it must survive restarts or every user looks new."""
+    path = Path(path)
+    try:
+        return path.read_text().strip()
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        salt = secrets.token_hex(32)
+        try:
+            with path.open("x") as f:
+                f.write(salt)
+            return salt
+        except FileExistsError:
+            return path.read_text().strip()  # another worker got there first
+
+
+def bins_of(marks) -> np.ndarray:
+    return np.clip(np.floor(np.asarray(marks, dtype=float)), 0, BINS - 1).astype(np.intp)
+
+
+def cdf_of(counts: np.ndarray) -> np.ndarray:
+    """cdf[i] = share of marks in bins below i (BINS + 1 entries, cdf[0] = 0, cdf[BINS] = 1)."""
+    cdf = np.zeros(BINS + 1)
+    np.cumsum(counts, out=cdf[1:])
+    return cdf / cdf[-1]
+
+
+def at_most_probability(cdfs: np.ndarray, lower, rows=None) -> np.ndarray:
+    """
+    P(mark <= lower) per bet, at whole-mark resolution: marks in `lower`'s own bin count as at
+    or below it (exact for whole marks). `cdfs`: CDF rows (k x BINS + 1, see cdf_of); `rows`:
+    each bet's row in `cdfs` (default: one row per bet, in order).
+    """
+    lower = np.asarray(lower, dtype=float)
+    rows = np.arange(len(lower)) if rows is None else np.asarray(rows, dtype=np.intp)
+    return np.where(lower >= 0, cdfs[rows, bins_of(lower) + 1], 0.0)
+
+
+class GradeHistograms:
+    """The `grade_histograms` table plus a per-process cache of CDFs, keyed by histogram version."""
+
+    def __init__(self, salt: str, min_samples: int = MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._salt = salt.encode()
+        self._cdfs: dict[tuple, tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(course_code: str, semester: int, year: int, assessment: str) -> tuple[str, int, int, str]:
+        return course_code.upper(), int(semester), int(year), normalize(assessment)
+
+    @staticmethod
+    def _where(key: tuple):
+        course_code, semester, year, assessment = key
+        return (
+            GradeHistogram.course_code == course_code, GradeHistogram.semester == semester,
+            GradeHistogram.year == year, GradeHistogram.assessment == assessment,
+        )
+
+    # ===== updates =====
+    def user_key(self, username: str) -> str:
+        return hmac.new(self._salt, username.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def record(self, username: str, course_code: str, semester: int, year: int, current: dict[str, str]) -> int:
+        """
+        Make the offering's histograms hold `username`'s current marks ({name: mark}, from their
+        grade page), moving counts only where they differ from what the user already contributes.
+        Runs in the caller's transaction. Returns histograms changed.
+        """
+        offering = (course_code.upper(), int(semester), int(year))
+        user = self.user_key(username)
+        bins = {}
+        for name, text in current.items():
+            mark = _mark(text)
+            if mark is not None:
+                bins[normalize(name)] = int(bins_of(mark))
+        where = (
+            GradeContribution.user_key == user, GradeContribution.course_code == offering[0],
+            GradeContribution.semester == offering[1], GradeContribution.year == offering[2],
+        )
+        # Compare-and-swap on the contribution's version: of two workers recording the same page,
+        # one moves the counts and the other then finds nothing left to move
+        for _ in range(_RETRIES):
+            row = db.session.execute(select(GradeContribution.bins, GradeContribution.version).where(*where)).first()
+            counted = json.loads(row.bins) if row else {}
+            if counted == bins:
+                return 0
+            if row is None:
+                claimed = self._insert(GradeContribution, dict(
+                    user_key=user, course_code=offering[0], semester=offering[1],
+                    year=offering[2], bins=json.dumps(bins), version=1,
+                ))
+            else:
+                claimed = db.session.execute(
+                    update(GradeContribution).where(*where, GradeContribution.version == row.version)
+                    .values(bins=json.dumps(bins), version=row.version + 1)
+                ).rowcount == 1
+            if claimed:
+                return self._move(offering, counted, bins)
+        raise RuntimeError(f"Grade contribution for {offering} kept changing underneath the update")
+
+    def _move(self, offering: tuple, counted: dict[str, int], bins: dict[str, int]) -> int:
+        changed = 0
+        for assessment in counted.keys() | bins.keys():
+            old, new = counted.get(assessment), bins.get(assessment)
+            if old == new:
+                continue
+            delta = np.zeros(BINS, dtype=np.int64)
+            if old is not None:
+                delta[old] -= 1
+            if new is not None:
+                delta[new] += 1
+            HISTOGRAM_UPDATES.inc(kind="added" if old is None else "removed" if new is None else "moved")
+            self._apply((*offering, assessment), delta)
+            changed += 1
+        return changed
+
+    def _apply(self, key: tuple, delta: np.ndarray) -> None:
+        # Compare-and-swap on `version`: two processes updating one histogram never lose a count
+        for _ in range(_RETRIES):
+            row = db.session.execute(
+                select(GradeHistogram.counts, GradeHistogram.version).where(*self._where(key))
+            ).first()
+            if row is None:
+                counts = np.clip(delta, 0, None)  # a mark leaving a histogram that doesn't exist: nothing to remove
+                course_code, semester, year, assessment = key
+                if self._insert(GradeHistogram, dict(
+                    course_code=course_code, semester=semester, year=year, assessment=assessment,
+                    counts=counts.astype(_DTYPE).tobytes(), total=int(counts.sum()), version=1,
+                )):
+                    return
+                continue
+            counts = np.clip(np.frombuffer(row.counts, _DTYPE).astype(np.int64) + delta, 0, None)
+            done = db.session.execute(
+                update(GradeHistogram)
+                .where(*self._where(key), GradeHistogram.version == row.version)
+                .values(counts=counts.astype(_DTYPE).tobytes(), total=int(counts.sum()), version=row.version + 1)
+            ).rowcount
+            if done:
+                return
+        raise RuntimeError(f"Grade histogram {key} kept changing underneath the update")
+
+    @staticmethod
+    def _insert(model, values: dict) -> bool:
+        """Insert a row unless its key exists (then False: someone else inserted it meanwhile)."""
+        if db.engine.dialect.name == "sqlite":
+            return db.session.execute(sqlite_insert(model).values(values).on_conflict_do_nothing()).rowcount == 1
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model).values(values))
+            return True
+        except IntegrityError:
+            return False
+
+    @staticmethod
+    def reset_untracked() -> bool:
+        """
+        Drop histograms counted before contributions were recorded (they can't be told apart from
+        recounts); they rebuild as grade pages arrive. Returns True if any were dropped.
+        """
+        if db.session.execute(select(GradeContribution.user_key).limit(1)).first() is not None:
+            return False
+        if db.session.execute(select(GradeHistogram.course_code).limit(1)).first() is None:
+            return False
+        db.session.execute(delete(GradeHistogram))
+        db.session.commit()
+        return True
+
+    # ===== reads =====
+    def _cdf(self, key: tuple, version: int, counts: bytes) -> np.ndarray:
+        cached = self._cdfs.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        cdf = cdf_of(np.frombuffer(counts, _DTYPE))
+        with self._lock:
+            self._cdfs[key] = (version, cdf)
+        return cdf
+
+    def cdfs(self, course_code: str, semester: int, year: int) -> dict[str, np.ndarray]:
+        """{normalised assessment: CDF} for an offering's histograms with enough marks (one query)."""
+        course_code, semester, year = course_code.upper(), int(semester), int(year)
+        rows = db.session.execute(
+            select(GradeHistogram.assessment, GradeHistogram.version, GradeHistogram.counts).where(
+                GradeHistogram.course_code == course_code, GradeHistogram.semester == semester,
+                GradeHistogram.year == year, GradeHistogram.total >= self.min_samples,
+            )
+        )
+        return {a: self._cdf((course_code, semester, year, a), v, c) for a, v, c in rows}
+
+    def cdf(self, course_code: str, semester: int, year: int, assessment: str) -> np.ndarray | None:
+        """One assessment's CDF, or None if it has fewer than `min_samples` marks."""
+        key = self.key(course_code, semester, year, assessment)
+        row = db.session.execute(
+            select(GradeHistogram.version, GradeHistogram.counts)
+            .where(*self._where(key), GradeHistogram.total >= self.min_samples)
+        ).first()
+        return self._cdf(key, row.version, row.counts) if row else None
+
+    def counts(self, course_code: str, semester: int, year: int, assessment: str) -> np.ndarray:
+        key = self.key(course_code, semester, year, assessment)
+        blob = db.session.execute(select(GradeHistogram.counts).where(*self._where(key))).scalar()
+        return np.frombuffer(blob, _DTYPE).astype(np.int64) if blob else np.zeros(BINS, dtype=np.int64)
+
+
+def get_grade_histograms() -> GradeHistograms:
+    return current_app.extensions["grade_histograms"]
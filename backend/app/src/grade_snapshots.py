@@ -0,0 +1,152 @@
+from __future__ import annotations
+import hashlib
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from flask import current_app
+
+from app.src import metrics
+from app.src.state import StateStore, get_store
+
+# Everything above the grade stream (page chrome, "last refreshed" timestamp, head scripts with
+# per-request tokens) changes on every load; only hash from the stream body onwards
+_CONTENT_START = 'id="streamDetailMainBodyRight"'
+_SCRIPT = re.compile(r"<script\b.*?</script>", re.IGNORECASE | re.DOTALL)
+
+SNAPSHOT_RESULTS = metrics.counter(
+    "grade_snapshot_total", "Grade page arrivals by outcome (unchanged pages skip the parse)", labels=("outcome",)
+)
+
+
+def content_hash(html: str) -> str:
+    start = html.find(_CONTENT_START)
+    body = _SCRIPT.sub("", html[start:] if start >= 0 else html)
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def grade_map(page) -> dict[str, str]:
+    """{name: grade} from a parsed grade page ({} for no grades or an error string)."""
+    return {item['name']: item['grade'] for item in page['grades']} if isinstance(page, dict) and page else {}
+
+
+def diff_grades(old: dict[str, str], new: dict[str, str]) -> dict[str, str]:
+    """Assessments whose mark is new or different in `new`."""
+    return {name: mark for name, mark in new.items() if old.get(name) != mark}
+
+
+@dataclass
+class GradeUpdate:
+    page: dict  # parse_grades_page result
+    changed: dict[str, str]  # marks new/different since the previous snapshot
+    reparsed: bool  # parsed and swapped in as the snapshot by this call (only then are changes reported)
+    first: bool = False  # no previous snapshot: `changed` is every mark, not a release
+    previous: dict[str, str] = field(default_factory=dict)  # marks in the previous snapshot
+
+    @property
+    def grades(self) -> dict[str, str]:
+        return grade_map(self.page)
+
+
+@dataclass
+class SettlementView:
+    """
+    One (user, course) as settlement sees it: current marks, the marks that changed since the
+    last settlement pass, and the bets that pass already checked. A bet needs checking only if
+    it's new to settlement or its assessment's mark changed.
+    """
+    grades: dict[str, str]
+    changed: set[str]
+    checked: set[str]
+    seen: set[str] = field(default_factory=set)  # bets checked/skipped this pass and still open
+
+    def wants(self, bet_id: str, grade_name: str | None) -> bool:
+        return bet_id not in self.checked or grade_name in self.changed
+
+
+class GradeSnapshots:
+    """
+    Last grade page seen per (user, course): its content hash, parse result and when it was
+    last fetched. A page whose hash matches is not parsed again; `last()` serves it while
+    Blackboard is unreachable. Settlement keeps its own record of the marks it last
+    acted on, so a grade_check that sees a release first doesn't hide it from update_bets.
+    """
+    _NS = "grade_snapshots"
+    _SETTLED_NS = "grade_settlement"
+    # An unchanged page only rewrites its fetch time once this stale (seconds)
+    TOUCH_AFTER = 300
+    # Swaps lost to concurrent fetches of the same (user, course) before giving up
+    _RETRIES = 5
+
+    def __init__(self, store: StateStore | None = None, ttl: float = 90 * 24 * 3600):
+        self._store_override = store
+        self.ttl = ttl
+
+    @property
+    def _store(self) -> StateStore:
+        return self._store_override or get_store()
+
+    @staticmethod
+    def key(username: str, course_code: str) -> str:
+        return f"{username}:{course_code.upper()}"
+
+    def observe(self, username: str, course_code: str, html: str, parse: Callable[[str], dict]) -> GradeUpdate:
+        """
+        Compare `html` with the last snapshot and swap it in if it differs. The swap is a
+        compare-and-swap on the snapshot read, so of overlapping fetches of one page exactly one
+        reports the change (`reparsed`); the others see it as unchanged, or retry against it.
+        """
+        key = self.key(username, course_code)
+        digest = content_hash(html)
+        page = None
+        for _ in range(self._RETRIES):
+            snap = self._store.get(self._NS, key)
+            now = time.time()
+            if snap is not None and snap["hash"] == digest:
+                SNAPSHOT_RESULTS.inc(outcome="unchanged")
+                if now - snap.get("at", 0) > self.TOUCH_AFTER:
+                    self._store.replace(self._NS, key, snap, {**snap, "at": now}, ttl=self.ttl)
+                return GradeUpdate(snap["page"], {}, reparsed=False)
+            if page is None:
+                page = parse(html)
+            entry = {"hash": digest, "page": page, "at": now}
+            if snap is None:
+                swapped = self._store.add(self._NS, key, entry, ttl=self.ttl)
+            else:
+                swapped = self._store.replace(self._NS, key, snap, entry, ttl=self.ttl)
+            if swapped:
+                previous = grade_map(snap["page"]) if snap else {}
+                SNAPSHOT_RESULTS.inc(outcome="changed" if snap else "new")
+                return GradeUpdate(page, diff_grades(previous, grade_map(page)), reparsed=True, first=snap is None, previous=previous)
+        # Kept losing to other fetches: theirs is the snapshot of record, and they reported it
+        SNAPSHOT_RESULTS.inc(outcome="contended")
+        return GradeUpdate(page, {}, reparsed=False)
+
+    def last(self, username: str, course_code: str) -> tuple[dict, float | None] | None:
+        """(page, fetched at as a unix time) of the last snapshot, or None."""
+        snap = self._store.get(self._NS, self.key(username, course_code))
+        return (snap["page"], snap.get("at")) if snap is not None else None
+
+    # ===== settlement =====
+    def settlement_view(self, username: str, course_code: str, grades: dict[str, str]) -> SettlementView:
+        last = self._store.get(self._SETTLED_NS, self.key(username, course_code)) or {}
+        changed = set(diff_grades(last.get("grades", {}), grades))
+        return SettlementView(grades, changed, set(last.get("checked", ())))
+
+    def save_settlement(self, username: str, course_code: str, view: SettlementView) -> None:
+        if not view.grades or (not view.changed and view.seen == view.checked):
+            return  # no page, or nothing new: skip the write
+        self._store.set(
+            self._SETTLED_NS, self.key(username, course_code),
+            {"grades": view.grades, "checked": sorted(view.seen)}, ttl=self.ttl,
+        )
+
+    def forget_settlement(self) -> None:
+        """Make the next settlement pass re-check every open bet (e.g. after a name mapping change)."""
+        for key, _ in list(self._store.items(self._SETTLED_NS)):
+            self._store.delete(self._SETTLED_NS, key)
+
+
+def get_grade_snapshots() -> GradeSnapshots:
+    return current_app.extensions["grade_snapshots"]
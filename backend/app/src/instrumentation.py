@@ -0,0 +1,65 @@
+from __future__ import annotations
+import time
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.src import metrics
+
+HTTP_SECONDS = metrics.histogram(
+    "http_request_seconds", "Request latency by endpoint", labels=("endpoint", "method", "status")
+)
+DB_QUERIES_PER_REQUEST = metrics.histogram(
+    "db_queries_per_request", "SQL statements executed per request", labels=("endpoint",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+DB_SECONDS_PER_REQUEST = metrics.histogram(
+    "db_seconds_per_request", "Time spent in SQL per request", labels=("endpoint",)
+)
+DB_QUERIES = metrics.counter("db_queries_total", "SQL statements executed")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context: a statement that raises never reaches
+    # after_cursor_execute, and its start time goes away with the context
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    if has_request_context():
+        started = getattr(context, "_query_started", None)
+        g.db_queries = g.get("db_queries", 0) + 1
+        if started is not None:
+            g.db_seconds = g.get("db_seconds", 0.0) + (time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def init_app(app: Flask, engine: Engine) -> None:
+    """Per-endpoint latency histograms and per-request SQL counts/time."""
+    instrument_engine(engine)
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    @app.after_request
+    def _record(response):
+        started = g.get("request_started")
+        if started is not None:
+            endpoint = request.endpoint or "unmatched"
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code
+            )
+            DB_QUERIES_PER_REQUEST.observe(g.get("db_queries", 0), endpoint=endpoint)
+            DB_SECONDS_PER_REQUEST.observe(g.get("db_seconds", 0.0), endpoint=endpoint)
+        return response
@@ -0,0 +1,168 @@
+"""
+Optional process pool for the BeautifulSoup parses (grade pages, course and profile pages).
+Parsing holds the GIL, so one large grade page stalls every other request thread in the
+worker; handing it to a warm process keeps those threads running and spreads parses across
+cores. With no pool configured, or when the pool's queue is full, parses run inline.
+
+    parse(parse_grades_page, response.text)   # -> whatever the parse function returns
+
+Parse functions must be importable top-level functions (or static methods) that take the raw
+page and return picklable data.
+"""
+from __future__ import annotations
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+
+from app.src import metrics
+
+T = TypeVar("T")
+
+PARSE_TASKS = metrics.counter(
+    "parse_tasks_total", "HTML parses by where they ran (pool, inline, overflow = pool queue full)",
+    labels=("where",),
+)
+PARSE_IN_FLIGHT = metrics.gauge("parse_pool_in_flight", "Parses queued or running in the process pool")
+PARSE_SECONDS = metrics.histogram("parse_seconds", "Wall time of one HTML parse, including pool hand-off", labels=("fn",))
+
+
+def _warm() -> None:
+    """Worker initializer: pay the parser imports once per process, not on the first page."""
+    from bs4 import BeautifulSoup
+    BeautifulSoup("<html><body><div id='x'>warm</div></body></html>", "html.parser").find(id="x")
+    try:
+        BeautifulSoup("<p>warm</p>", "lxml")
+    except Exception:
+        pass  # lxml not installed
+
+
+def _noop() -> None:
+    return None
+
+
+class ParsePool:
+    """
+    A bounded ProcessPoolExecutor. At most `max_pending` parses are queued or running at once;
+    callers past that parse inline instead of waiting. Pages under `min_bytes` always parse
+    inline (the hand-off costs more than the parse). Parses also run inline while the workers
+    are starting, and a crashed worker breaks the executor: it is rebuilt in the background.
+    """
+
+    def __init__(self, workers: int, max_pending: int | None = None, min_bytes: int = 16 * 1024):
+        self.workers = workers
+        self.max_pending = max_pending if max_pending is not None else workers * 4
+        self.min_bytes = min_bytes
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._starting = False
+        self._closed = False
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Forking a process that already runs request threads can copy held locks into the child
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method), initializer=_warm)
+        # Start every worker now rather than on the first parses
+        for f in [executor.submit(_noop) for _ in range(self.workers)]:
+            f.result()
+        return executor
+
+    def start(self) -> "ParsePool":
+        """Start the workers (blocks until they're up); a no-op if running or already starting."""
+        with self._lock:
+            if self._executor is not None or self._starting or self._closed:
+                return self
+            self._starting = True
+        executor = None
+        try:
+            executor = self._new_executor()
+        finally:
+            with self._lock:
+                self._starting = False
+                closed = self._closed
+                if not closed:
+                    self._executor = executor
+        if closed and executor is not None:
+            executor.shutdown(wait=False)
+        return self
+
+    def _start_in_background(self) -> None:
+        threading.Thread(target=self.start, name="parse-pool-start", daemon=True).start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _claim(self) -> tuple[bool, ProcessPoolExecutor | None]:
+        """(not started, executor to submit to — None if the caller should parse inline)"""
+        with self._lock:
+            executor = self._executor
+            if executor is None or self._in_flight >= self.max_pending:
+                return executor is None, None
+            self._in_flight += 1
+        PARSE_IN_FLIGHT.inc()
+        return False, executor
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        PARSE_IN_FLIGHT.dec()
+
+    def run(self, fn: Callable[[str | bytes], T], html: str | bytes) -> T:
+        if len(html) < self.min_bytes:
+            PARSE_TASKS.inc(where="inline")
+            return fn(html)
+        cold, executor = self._claim()
+        if executor is None:
+            if cold:
+                self._start_in_background()
+            PARSE_TASKS.inc(where="inline" if cold else "overflow")
+            return fn(html)
+        try:
+            result = executor.submit(fn, html).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            self._start_in_background()
+            PARSE_TASKS.inc(where="inline")
+            return fn(html)
+        finally:
+            self._release()
+        PARSE_TASKS.inc(where="pool")
+        return result
+
+    def __len__(self) -> int:
+        return self._in_flight
+
+
+_pool: ParsePool | None = None
+
+
+def configure(workers: int, max_pending: int | None = None, min_bytes: int = 16 * 1024) -> ParsePool | None:
+    """Install the process-wide pool (workers=0 removes it: every parse runs inline)."""
+    global _pool
+    old, _pool = _pool, (ParsePool(workers, max_pending, min_bytes) if workers > 0 else None)
+    if old is not None:
+        old.shutdown()
+    return _pool
+
+
+def parse(fn: Callable[[str | bytes], T], html: str | bytes) -> T:
+    """`fn(html)`, in the pool if one is configured."""
+    started = time.perf_counter()
+    try:
+        pool = _pool
+        if pool is None:
+            PARSE_TASKS.inc(where="inline")
+            return fn(html)
+        return pool.run(fn, html)
+    finally:
+        PARSE_SECONDS.observe(time.perf_counter() - started, fn=getattr(fn, "__qualname__", "parse"))
+
@@ -0,0 +1,177 @@
+"""
+Implied odds for bets, stored on the bet (`bets.implied_prob`) so listings never price anything.
+
+The price is the probability of the event settlement pays u1 on (app.src.settlement.outcome):
+P(mark <= lower). It comes from the assessment's empirical distribution when it has one
+(app.src.grade_histograms: a lookup in a precomputed CDF). Otherwise it comes from the prior
+gambler/preditor.py uses: a mark normal with mean 55 and standard deviation 15. Once the
+bettor's mark is released the outcome is certain (1 or 0), decided exactly as settlement does.
+A bet is priced when it's created; when new marks for a course are parsed, the course's open
+bets are re-priced together, on a background worker so grade requests never wait on it.
+"""
+from __future__ import annotations
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+import numpy as np
+from flask import Flask, current_app
+from sqlalchemy import bindparam, inspect, select, text, update
+
+from app.models.db import Bets, BetStatus, db
+from app.src import grade_histograms, metrics
+
+try:
+    from scipy.special import ndtr as _ndtr
+except ImportError:  # optional: pip install ".[speedups]"
+    _erf = np.frompyfunc(math.erf, 1, 1)
+
+    def _ndtr(x):
+        return 0.5 * (1.0 + _erf(np.asarray(x, dtype=float) / math.sqrt(2)).astype(float))
+
+# gambler/preditor.py's prior for a mark (percent)
+MEAN_MARK = 55.0
+STD_MARK = 15.0
+# Bets whose price can still change
+OPEN_STATUSES = (BetStatus.Pending, BetStatus.Accepted)
+DECIMALS = 4
+
+REPRICED = metrics.counter("bets_repriced_total", "Bets whose stored implied probability changed")
+REPRICE_SECONDS = metrics.histogram("bet_reprice_seconds", "Time to re-price one batch of bets")
+
+
+def normal_cdf(x) -> np.ndarray:
+    return _ndtr((np.asarray(x, dtype=float) - MEAN_MARK) / STD_MARK)
+
+
+def implied_probability(lower, marks=None, cdfs=None) -> np.ndarray:
+    """
+    P(mark <= lower) per bet (u1 wins), for an array of `lower` bounds. `marks`: the released
+    mark per bet, NaN where it isn't out yet (those bets are certain: 1.0 or 0.0). `cdfs`: per
+    bet, its assessment's grade_histograms CDF, or None for the prior. A NaN bound gives NaN.
+    """
+    lower = np.asarray(lower, dtype=float)
+    prob = normal_cdf(lower)
+    if cdfs is not None:
+        bounded = ~np.isnan(lower)
+        at = np.array([i for i, c in enumerate(cdfs) if c is not None and bounded[i]], dtype=np.intp)
+        if len(at):
+            # Bets on one assessment share its CDF: stack each distinct CDF once
+            distinct: dict[int, int] = {}
+            rows = [distinct.setdefault(id(cdfs[i]), len(distinct)) for i in at]
+            table = np.stack([cdfs[i] for i in at[np.unique(rows, return_index=True)[1]]])
+            prob[at] = grade_histograms.at_most_probability(table, lower[at], rows)
+    if marks is not None:
+        marks = np.asarray(marks, dtype=float)
+        # settlement.outcome: Win iff lower >= mark
+        prob = np.where(np.isnan(marks) | np.isnan(lower), prob, (marks <= lower).astype(float))
+    return np.round(prob, DECIMALS)
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _stored(p: float) -> float | None:
+    return None if math.isnan(p) else float(p)
+
+
+def price(lower, mark: float | None = None, cdf: np.ndarray | None = None) -> float | None:
+    """One bet's implied probability (None if its `lower` isn't a number)."""
+    marks = None if mark is None else [mark]
+    return _stored(implied_probability([_number(lower)], marks, [cdf])[0])
+
+
+_SET_PRICE = update(Bets).where(Bets.uuid == bindparam("id")).values(implied_prob=bindparam("p"))
+
+
+Resolve = Callable[[str, int, int, str], tuple[float | None, np.ndarray | None]]
+
+
+def reprice(where: Iterable, resolve: Resolve | None = None) -> int:
+    """
+    Re-price the open bets matching `where` in one batch. `resolve(u1, semester, year,
+    assessment)` gives (the bettor's released mark or None, the assessment's CDF or None);
+    omitted, every bet gets the prior. Writes only prices that changed, in the caller's
+    transaction. Returns bets changed.
+    """
+    started = time.perf_counter()
+    rows = db.session.execute(
+        select(Bets.uuid, Bets.u1, Bets.lower, Bets.semester, Bets.year, Bets.assessment, Bets.implied_prob)
+        .where(*where, Bets.status.in_(OPEN_STATUSES))
+    ).all()
+    if not rows:
+        return 0
+    marks = cdfs = None
+    if resolve is not None:
+        # One lookup per (bettor, assessment), not per bet
+        known: dict[tuple, tuple] = {}
+        marks, cdfs = [], []
+        for r in rows:
+            key = (r.u1, r.semester, r.year, r.assessment)
+            if key not in known:
+                known[key] = resolve(*key)
+            mark, cdf = known[key]
+            marks.append(math.nan if mark is None else mark)
+            cdfs.append(cdf)
+    probs = implied_probability([_number(r.lower) for r in rows], marks, cdfs)
+    changed = [
+        {"id": r.uuid, "p": p}
+        for r, p in zip(rows, map(_stored, probs.tolist()))
+        if r.implied_prob != p
+    ]
+    if changed:
+        db.session.connection().execute(_SET_PRICE, changed)
+        REPRICED.inc(len(changed))
+    REPRICE_SECONDS.observe(time.perf_counter() - started)
+    return len(changed)
+
+
+# ===== schema / background work =====
+def upgrade_schema() -> bool:
+    """Add `bets.implied_prob` to a database created before it existed. Returns True if added."""
+    if "implied_prob" in {c["name"] for c in inspect(db.engine).get_columns("bets")}:
+        return False
+    db.session.execute(text("ALTER TABLE bets ADD COLUMN implied_prob FLOAT"))
+    db.session.commit()
+    return True
+
+
+def price_unpriced() -> int:
+    """Give open bets without a stored price the prior (e.g. after `upgrade_schema`)."""
+    changed = reprice([Bets.implied_prob.is_(None)])
+    db.session.commit()
+    return changed
+
+
+class Repricer:
+    """
+    Runs re-pricing jobs one at a time on a background thread, each in its own app context and
+    transaction, so parsing a grade page never writes to `bets` inside the request's transaction.
+    """
+
+    def __init__(self, app: Flask):
+        self._app = app
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reprice")
+
+    def submit(self, fn: Callable[..., int], *args):
+        return self._pool.submit(self._run, fn, args)
+
+    def _run(self, fn: Callable[..., int], args: tuple) -> int:
+        with self._app.app_context():
+            try:
+                changed = fn(*args)
+                db.session.commit()
+                return changed
+            except Exception:
+                db.session.rollback()
+                self._app.logger.exception("Re-pricing failed: %s%r", getattr(fn, "__name__", fn), args)
+                return 0
+
+
+def get_repricer() -> Repricer:
+    return current_app.extensions["repricer"]
@@ -0,0 +1,43 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    """Counts (and keeps) every SQL statement executed on `engine` while active."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.statements: list[str] = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def assert_max_queries(engine: Engine, limit: int) -> Iterator[QueryCounter]:
+    """
+    Fail if the block runs more than `limit` statements — guards endpoints against N+1 regressions:
+
+        with assert_max_queries(db.engine, 3):
+            client.get(f"/check_bets/{user}/0")
+    """
+    with QueryCounter(engine) as qc:
+        yield qc
+    if qc.count > limit:
+        listing = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(qc.statements))
+        raise AssertionError(f"Expected at most {limit} queries, ran {qc.count}:\n{listing}")
@@ -16,6 +16,9 @@ from bs4 import BeautifulSoup
 from cryptography.fernet import Fernet, InvalidToken
 from playwright.sync_api import sync_playwright, Browser, BrowserContext
 
+from app.src import parse_pool, upstream
+from app.src.state import StateStore, get_store
+
 @dataclass
 class _LiveSession:
     session_id: str
@@ -30,6 +33,9 @@ class SessionManager:
       - Launching a headful Playwright browser to complete login
       - Persisting storage state (cookies, localStorage)
       - Replaying those cookies to scrape pages with requests + BeautifulSoup
+    Live browser handles can't leave the process that launched them, so they stay in
+    `_sessions`; a registry record in the shared StateStore tells every worker which
+    sessions exist and who owns them.
     Provides a thin dispatcher via `main(action, **kwargs)` so callers (routes) stay simple.
     """
 
@@ -38,6 +44,8 @@ class SessionManager:
         storage_dir: Path | str = "data",
         encryption_key: Optional[str] = None,  # Fernet.generate_key().decode()
         user_agent: str | None = None,
+        store: StateStore | None = None,
+        login_ttl: float = 3600,
     ) -> None:
         self.storage_dir = Path(storage_dir).resolve()
         self.storage_dir.mkdir(parents=True, exist_ok=True)
@@ -51,6 +59,8 @@ class SessionManager:
 
         self._sessions: Dict[str, _LiveSession] = {}
         self._lock = threading.RLock()
+        self._store_override = store
+        self._login_ttl = login_ttl
         self._ua = user_agent or (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
             "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -116,6 +126,13 @@ class SessionManager:
 
     # ---------- Internals ----------
 
+    _NS = "login_sessions"
+
+    @property
+    def _store(self) -> StateStore:
+        # Resolved lazily: module-level managers are built before create_app configures the store
+        return self._store_override or get_store()
+
     def _gen_session_id(self) -> str:
         return secrets.token_urlsafe(16)
 
@@ -139,15 +156,19 @@ class SessionManager:
 
     def _ensure_live(self, session_id: str) -> _LiveSession:
         with self._lock:
-            if session_id not in self._sessions:
-                raise KeyError("Unknown session_id. Start with /auth/login.")
-            return self._sessions[session_id]
+            if session_id in self._sessions:
+                return self._sessions[session_id]
+        owner = self._store.get(self._NS, session_id)
+        if owner is not None:
+            raise KeyError(f"session_id is held by worker pid {owner['pid']}; retry against that worker.")
+        raise KeyError("Unknown session_id. Start with /auth/login.")
 
     def _close(self, session_id: str) -> None:
         with self._lock:
             sess = self._sessions.pop(session_id, None)
         if not sess:
             return
+        self._store.delete(self._NS, session_id)
         # Close outside the lock
         try:
             sess.context.close()
@@ -180,6 +201,11 @@ class SessionManager:
                         context=context,
                         created_at=time.time(),
                     )
+                self._store.set(
+                    self._NS, session_id,
+                    {"pid": os.getpid(), "created_at": time.time()},
+                    ttl=self._login_ttl,
+                )
                 # Keep the thread alive until commit/close tears it down
                 while True:
                     time.sleep(1)
@@ -203,11 +229,12 @@ class SessionManager:
     def _status(self, session_id: str) -> dict:
         with self._lock:
             in_memory = session_id in self._sessions
+        in_memory = in_memory or self._store.get(self._NS, session_id) is not None
         state_exists = self._state_path(session_id).exists()
         return {"in_memory": in_memory, "state_saved": state_exists}
 
     def _build_requests_session_from_state(self, state: dict) -> requests.Session:
-        s = requests.Session()
+        s = upstream.new_session()
         s.headers.update({"User-Agent": self._ua})
         for c in state.get("cookies", []):
             domain = (c.get("domain") or "").lstrip(".")
@@ -235,20 +262,7 @@ class SessionManager:
             return 401, {"error": f"Unauthorized ({r.status_code}). Cookies may be expired or scoped to another domain."}
         r.raise_for_status()
 
-        soup = BeautifulSoup(r.text, "lxml")
-        title_el = soup.select_one("title")
-        title = title_el.get_text(strip=True) if title_el else None
-        links = [
-            {"text": a.get_text(strip=True), "href": a.get("href")}
-            for a in soup.select("a[href]")
-        ][:25]
-
-        return 200, {
-            "status": r.status_code,
-            "title": title,
-            "content_length": len(r.text),
-            "sample_links": links,
-        }
+        return 200, {"status": r.status_code, **parse_pool.parse(summarise_page, r.text)}
 
     # ----- optional maintenance -----
 
@@ -263,6 +277,8 @@ class SessionManager:
                     dead.append(sid)
             for sid in dead:
                 self._sessions.pop(sid, None)
+        for sid in dead:
+            self._store.delete(self._NS, sid)
 
 
 # --------- module-level singleton + convenience ---------
@@ -273,6 +289,22 @@ _MANAGER = SessionManager(
     encryption_key=os.getenv("ENCRYPTION_KEY"),
 )
 
+def summarise_page(html: str) -> dict:
+    """Title, size and the first 25 links of a scraped page."""
+    soup = BeautifulSoup(html, "lxml")
+    title_el = soup.select_one("title")
+    title = title_el.get_text(strip=True) if title_el else None
+    links = [
+        {"text": a.get_text(strip=True), "href": a.get("href")}
+        for a in soup.select("a[href]")
+    ][:25]
+    return {
+        "title": title,
+        "content_length": len(html),
+        "sample_links": links,
+    }
+
+
 def main(action: str, **kwargs: Any) -> Tuple[int, dict]:
     """
     Public entrypoint for routes.py - thin wrapper around SessionManager.main().
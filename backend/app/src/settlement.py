@@ -0,0 +1,92 @@
+"""
+Settling accepted bets against released marks, shared by the per-user pass (`update_bets`)
+and the assessment-wide pass (`settle_assessment`).
+
+Each bet is claimed in `settlement_ledger` (keyed by the bet's uuid) in the same transaction
+that sets its status and moves the stakes; a bet some earlier or concurrent pass already
+claimed is skipped. Re-running a pass, or two passes overlapping, pays each bet once.
+Balances move with `money = money + delta` so passes touching the same user never overwrite
+each other's credits.
+"""
+from __future__ import annotations
+import uuid
+from typing import Iterable
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.db import Bets, BetStatus, SettlementLedger, User, db
+from app.src import metrics
+
+SETTLED = metrics.counter(
+    "bets_settled_total", "Bets settled, by pass and outcome", labels=("run", "outcome")
+)
+ALREADY_SETTLED = metrics.counter(
+    "bets_settle_skipped_total", "Bets a pass found already claimed in the settlement ledger", labels=("run",)
+)
+
+_CREDIT = (
+    update(User)
+    .where(User.username == bindparam("u"))
+    .values(money=User.money + bindparam("delta"))
+)
+
+
+def outcome(bet: Bets, grade: float) -> BetStatus:
+    """u1 wins when the mark is at or below the bet's `lower`."""
+    return BetStatus.Win if bet.lower >= grade else BetStatus.Loss
+
+
+def claim(rows: list[dict]) -> set[uuid.UUID]:
+    """Insert ledger rows; returns the bet uuids this transaction claimed (the rest were already there)."""
+    if not rows:
+        return set()
+    if db.engine.dialect.name == "sqlite":
+        stmt = (
+            sqlite_insert(SettlementLedger).values(rows)
+            .on_conflict_do_nothing(index_elements=[SettlementLedger.bet_uuid])
+            .returning(SettlementLedger.bet_uuid)
+        )
+        return set(db.session.execute(stmt).scalars())
+    keys = [r["bet_uuid"] for r in rows]
+    taken = set(db.session.execute(
+        select(SettlementLedger.bet_uuid).where(SettlementLedger.bet_uuid.in_(keys)).with_for_update()
+    ).scalars())
+    fresh = [r for r in rows if r["bet_uuid"] not in taken]
+    if fresh:
+        db.session.execute(insert(SettlementLedger), fresh)
+    return {r["bet_uuid"] for r in fresh}
+
+
+def settle(decided: Iterable[tuple[Bets, float]], run: str) -> list[Bets]:
+    """
+    Settle each (accepted bet, mark) not already in the ledger: record it there, set the bet's
+    status and credit/debit both parties. `run` names the pass ("user:<name>",
+    "assessment:<id>"). Runs in the caller's transaction (commit afterwards). Returns the
+    bets settled.
+    """
+    decided = [(bet, grade, outcome(bet, grade)) for bet, grade in decided]
+    claimed = claim([
+        {"bet_uuid": bet.uuid, "run": run, "outcome": status, "grade": grade}
+        for bet, grade, status in decided
+    ])
+    kind = run.partition(":")[0]
+    if len(claimed) < len(decided):
+        ALREADY_SETTLED.inc(len(decided) - len(claimed), run=kind)
+    deltas: dict[str, float] = {}
+    settled = []
+    for bet, _, status in decided:
+        if bet.uuid not in claimed:
+            continue
+        bet.status = status
+        sign = 1 if status == BetStatus.Win else -1
+        deltas[bet.u1] = deltas.get(bet.u1, 0.0) + sign * (bet.wager1 or 0.0)
+        if bet.u2:
+            deltas[bet.u2] = deltas.get(bet.u2, 0.0) - sign * (bet.wager2 or 0.0)
+        SETTLED.inc(run=kind, outcome=status.name)
+        settled.append(bet)
+    credits = [{"u": name, "delta": delta} for name, delta in deltas.items() if delta]
+    if credits:
+        # Core executemany: the ORM's bulk-by-primary-key UPDATE can't carry `money + delta`
+        db.session.connection().execute(_CREDIT, credits)
+    return settled
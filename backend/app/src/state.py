@@ -0,0 +1,240 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Optional, Tuple
+
+
+class StateStore:
+    """
+    Namespaced key/value store with per-key TTL for runtime state that has to be
+    visible to every worker process (OAuth PKCE verifiers, 3LO tokens, proxy cookie jars...).
+    Values must be JSON-serializable.
+    """
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, ns: str, key: str, value: Any, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    def add(self, ns: str, key: str, value: Any, ttl: float | None = None) -> bool:
+        """Set only if absent (or expired). Returns True if this call created the key — usable as a lease."""
+        raise NotImplementedError
+
+    def replace(self, ns: str, key: str, expected: Any, value: Any, ttl: float | None = None) -> bool:
+        """
+        Set only if the key still holds `expected` (a value read back with `get`): compare-and-swap.
+        Returns False, leaving the key alone, if another writer changed it or it expired.
+        """
+        raise NotImplementedError
+
+    def pop(self, ns: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def delete(self, ns: str, key: str) -> None:
+        self.pop(ns, key)
+
+    def items(self, ns: str) -> Iterator[Tuple[str, Any]]:
+        raise NotImplementedError
+
+    def count(self, ns: str) -> int:
+        return sum(1 for _ in self.items(ns))
+
+    def purge_expired(self) -> int:
+        raise NotImplementedError
+
+
+def _expiry(ttl: float | None) -> float | None:
+    return None if ttl is None else time.time() + ttl
+
+
+class MemoryStateStore(StateStore):
+    """Per-process store. Only correct with a single worker; handy for tests and `flask run`."""
+
+    def __init__(self):
+        self._data: dict[tuple[str, str], tuple[Any, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, k: tuple[str, str], now: float):
+        rec = self._data.get(k)
+        if rec is None:
+            return None
+        if rec[1] is not None and rec[1] <= now:
+            self._data.pop(k, None)
+            return None
+        return rec
+
+    def get(self, ns, key):
+        with self._lock:
+            rec = self._live((ns, key), time.time())
+            return None if rec is None else json.loads(rec[0])
+
+    def set(self, ns, key, value, ttl=None):
+        with self._lock:
+            self._data[(ns, key)] = (json.dumps(value), _expiry(ttl))
+
+    def add(self, ns, key, value, ttl=None):
+        with self._lock:
+            if self._live((ns, key), time.time()) is not None:
+                return False
+            self._data[(ns, key)] = (json.dumps(value), _expiry(ttl))
+            return True
+
+    def replace(self, ns, key, expected, value, ttl=None):
+        with self._lock:
+            rec = self._live((ns, key), time.time())
+            if rec is None or rec[0] != json.dumps(expected):
+                return False
+            self._data[(ns, key)] = (json.dumps(value), _expiry(ttl))
+            return True
+
+    def pop(self, ns, key):
+        with self._lock:
+            rec = self._live((ns, key), time.time())
+            self._data.pop((ns, key), None)
+            return None if rec is None else json.loads(rec[0])
+
+    def items(self, ns):
+        now = time.time()
+        with self._lock:
+            snapshot = [(k[1], v) for k, (v, exp) in self._data.items() if k[0] == ns and (exp is None or exp > now)]
+        for key, raw in snapshot:
+            yield key, json.loads(raw)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            dead = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+            for k in dead:
+                self._data.pop(k, None)
+        return len(dead)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Store backed by a local SQLite file in WAL mode — shared by every worker process on
+    the host without running an external service. One connection per thread.
+    """
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS kv ("
+        " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL,"
+        " PRIMARY KEY (ns, key))"
+    )
+    _PURGE_EVERY = 500  # writes between opportunistic purges
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as c:
+            c.execute(self._SCHEMA)
+            c.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def get(self, ns, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE ns=? AND key=? AND (expires IS NULL OR expires > ?)",
+            (ns, key, time.time()),
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, ns, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value, expires=excluded.expires",
+            (ns, key, json.dumps(value), _expiry(ttl)),
+        )
+        self._wrote()
+
+    def add(self, ns, key, value, ttl=None):
+        cur = self._conn().execute(
+            "INSERT INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value, expires=excluded.expires"
+            " WHERE kv.expires IS NOT NULL AND kv.expires <= ?",
+            (ns, key, json.dumps(value), _expiry(ttl), time.time()),
+        )
+        self._wrote()
+        return cur.rowcount == 1
+
+    def replace(self, ns, key, expected, value, ttl=None):
+        # JSON round-trips keep key order and float repr, so the stored text is comparable
+        cur = self._conn().execute(
+            "UPDATE kv SET value=?, expires=? WHERE ns=? AND key=? AND value=? AND (expires IS NULL OR expires > ?)",
+            (json.dumps(value), _expiry(ttl), ns, key, json.dumps(expected), time.time()),
+        )
+        self._wrote()
+        return cur.rowcount == 1
+
+    def pop(self, ns, key):
+        row = self._conn().execute(
+            "DELETE FROM kv WHERE ns=? AND key=? RETURNING value, expires", (ns, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def items(self, ns):
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE ns=? AND (expires IS NULL OR expires > ?)", (ns, time.time())
+        ).fetchall()
+        for key, raw in rows:
+            yield key, json.loads(raw)
+
+    def count(self, ns):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM kv WHERE ns=? AND (expires IS NULL OR expires > ?)", (ns, time.time())
+        ).fetchone()[0]
+
+    def purge_expired(self):
+        cur = self._conn().execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        return cur.rowcount
+
+
+def from_url(url: str) -> StateStore:
+    """`memory://` or `sqlite:///relative/or/absolute/path.sqlite`."""
+    if url.startswith("memory://"):
+        return MemoryStateStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported STATE_URL: {url}")
+
+
+# --------- module-level default ---------
+
+_STORE: Optional[StateStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def configure(url: str) -> StateStore:
+    global _STORE
+    with _STORE_LOCK:
+        _STORE = from_url(url)
+    return _STORE
+
+
+def get_store() -> StateStore:
+    """Process-wide store, built from STATE_URL on first use (default: data/state.sqlite)."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = from_url(os.getenv("STATE_URL", "sqlite:///data/state.sqlite"))
+    return _STORE
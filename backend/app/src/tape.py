@@ -0,0 +1,123 @@
+from __future__ import annotations
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers that must not be replayed: credentials, or framing that no longer
+# matches the already-decoded body we store
+_DROP_HEADERS = {"set-cookie", "content-encoding", "content-length", "transfer-encoding", "connection"}
+# Credential-looking JSON fields (token endpoint responses) and cookie values echoed in pages
+_SECRET_FIELDS = re.compile(r'("(?:access_token|refresh_token|id_token)"\s*:\s*")[^"]*(")')
+_SECRET_COOKIES = re.compile(r"((?:BbRouter|JSESSIONID|sid)=)[^;\s\"']+")
+
+
+def _scrub(text: str) -> str:
+    text = _SECRET_FIELDS.sub(r"\1scrubbed\2", text)
+    return _SECRET_COOKIES.sub(r"\1scrubbed", text)
+
+
+def _body_digest(body) -> str:
+    if body is None:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha1(body).hexdigest()
+
+
+class Tape:
+    """
+    Request/response archive for the upstream transport: a gzip'd JSON-lines file, one
+    exchange per line ({method, url, body_sha1, status, reason, headers, body, elapsed}).
+    Cookies are never written: request headers aren't stored at all, Set-Cookie is dropped,
+    and token/cookie values inside bodies are replaced with "scrubbed".
+
+    Replay matches on (method, url, request body) and falls back to (method, url), since
+    token refresh bodies carry per-run secrets. Repeated requests are answered in recorded
+    order; the last recording for a key keeps answering once the rest are used up.
+    """
+
+    def __init__(self, path: str, mode: str, timing: bool = True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown tape mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._exchanges: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                ex = json.loads(line)
+                self._exchanges[(ex["method"], ex["url"])].append(ex)
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._exchanges.values())
+
+    # ===== record =====
+    def record(self, request: requests.PreparedRequest, resp: requests.Response, elapsed: float) -> None:
+        content = resp.content
+        try:
+            body, encoding = _scrub(content.decode("utf-8")), "text"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        ex = {
+            "method": request.method,
+            "url": request.url,
+            "body_sha1": _body_digest(request.body),
+            "status": resp.status_code,
+            "reason": resp.reason,
+            "headers": {k: v for k, v in resp.headers.items() if k.lower() not in _DROP_HEADERS},
+            "encoding": encoding,
+            "body": body,
+            "elapsed": round(elapsed, 4),
+        }
+        line = json.dumps(ex, separators=(",", ":")) + "\n"
+        with self._lock:
+            # Each append is its own gzip member; readers see one concatenated stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    # ===== replay =====
+    def _take(self, request: requests.PreparedRequest) -> Optional[dict]:
+        queue = self._exchanges.get((request.method, request.url))
+        if not queue:
+            return None
+        digest = _body_digest(request.body)
+        i = next((i for i, ex in enumerate(queue) if ex["body_sha1"] == digest), 0)
+        return queue.pop(i) if len(queue) > 1 else queue[0]
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        with self._lock:
+            ex = self._take(request)
+        if ex is None:
+            raise requests.ConnectionError(f"No recorded response for {request.method} {request.url}", request=request)
+        if self.timing and ex["elapsed"] > 0:
+            time.sleep(ex["elapsed"])
+        resp = requests.Response()
+        resp.status_code = ex["status"]
+        resp.reason = ex["reason"]
+        resp.headers = CaseInsensitiveDict(ex["headers"])
+        resp._content = base64.b64decode(ex["body"]) if ex["encoding"] == "base64" else ex["body"].encode("utf-8")
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers) or "utf-8"
+        resp.url = request.url
+        resp.request = request
+        resp.elapsed = timedelta(seconds=ex["elapsed"])
+        return resp
@@ -1,32 +1,85 @@
 from __future__ import annotations
-import base64, threading, time, requests
+import base64, os, threading, time, requests
 from typing import Optional
 
+from app.src import metrics, upstream
+from app.src.singleflight import SingleFlight
+from app.src.state import StateStore, get_store
+
+TOKEN_REFRESH_SECONDS = metrics.histogram(
+    "bb_token_refresh_seconds", "Latency of token endpoint calls", labels=("grant",)
+)
+TOKEN_WAIT_SECONDS = metrics.histogram(
+    "bb_token_wait_seconds", "Time callers spent blocked waiting for a token refresh", labels=("grant",)
+)
+TOKEN_REFRESH_FAILURES = metrics.counter(
+    "bb_token_refresh_failures_total", "Failed token endpoint calls", labels=("grant",)
+)
+SESSIONS_EVICTED = metrics.counter(
+    "bb_3lo_sessions_evicted_total", "3LO sessions dropped by the sweeper"
+)
+
+
+def _grant_rejected(exc: Exception) -> bool:
+    """True if the token endpoint refused the refresh token itself (400/401 `invalid_grant`)."""
+    resp = getattr(exc, "response", None)
+    if not isinstance(exc, requests.HTTPError) or resp is None or resp.status_code not in (400, 401):
+        return False
+    try:
+        body = resp.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("error") == "invalid_grant"
+
+
 class TokenManager:
     """
     Caches Anthology (Blackboard) tokens in-memory with auto refresh.
-    - 2LO: single, app-level token (client_credentials)
-    - 3LO: optional per-session storage (dict) if you choose to keep tokens server-side
+    - 2LO: single, app-level token (client_credentials). A background thread renews it
+      once `refresh_fraction` of its lifetime has passed; readers never take a lock and
+      only block (on a single shared fetch) if the token has actually expired.
+    - 3LO: optional per-session storage in the shared StateStore, so any worker can serve
+      any `sid`. Refreshes are coalesced per session (in-process flight + cross-process lease)
+      and start `early_refresh_3lo` seconds before expiry; idle records expire via TTL and a
+      sweeper evicts sessions whose refresh failed.
     """
-    def __init__(self, base_url: str, client_id: str, client_secret: str):
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        client_secret: str,
+        refresh_fraction: float = 0.8,
+        early_refresh_3lo: float = 120.0,
+        idle_ttl_3lo: float = 7 * 24 * 3600,
+        sweep_interval: float = 60.0,
+        store: StateStore | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.client_id = client_id
         self.client_secret = client_secret
+        self.refresh_fraction = refresh_fraction
 
-        # 2LO cache
+        # 2LO cache: (token, issued_at, expiry) swapped as one tuple so reads need no lock
         self._lock = threading.Lock()
-        self._two_lo_token: Optional[str] = None
-        self._two_lo_expiry: float = 0.0  # epoch seconds
+        self._two_lo: tuple[Optional[str], float, float] = (None, 0.0, 0.0)
+        self._two_lo_flights = SingleFlight()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
 
-        # Optional: 3LO store (session_id -> {access, refresh, exp})
-        self._3lo = {}
+        # Optional: 3LO store (ns "3lo": session_id -> {access, refresh, exp, last_used, failed})
+        self._store = store or get_store()
         self._3lo_lock = threading.Lock()
+        self._3lo_flights = SingleFlight()
+        self._3lo_early = early_refresh_3lo
+        self._3lo_idle_ttl = idle_ttl_3lo
+        self._sweep_interval = sweep_interval
+        self._sweeper: Optional[threading.Thread] = None
 
     # ===== 2LO (app token) =====
     def _fetch_2lo(self) -> tuple[str, int]:
         url = f"{self.base_url}/learn/api/public/v1/oauth2/token"
         auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
-        r = requests.post(
+        r = upstream.post(
             url,
             headers={
                 "Authorization": f"Basic {auth}",
@@ -39,73 +92,233 @@ class TokenManager:
         j = r.json()
         return j["access_token"], int(j.get("expires_in", 3600))
 
-    def get_2lo_token(self) -> str:
-        # Refresh if missing or expiring in <30s
-        with self._lock:
+    def _single_flight(self, flights: SingleFlight, key: str, grant: str, fetch):
+        """
+        Run `fetch()` once per key: the first caller becomes the leader and performs the
+        call, concurrent callers for the same key wait on (and share) its result or error.
+        """
+        def timed():
+            started = time.monotonic()
+            try:
+                return fetch()
+            except BaseException:
+                TOKEN_REFRESH_FAILURES.inc(grant=grant)
+                raise
+            finally:
+                TOKEN_REFRESH_SECONDS.observe(time.monotonic() - started, grant=grant)
+        return flights.do(key, timed)[0]
+
+    def _refresh_2lo(self) -> str:
+        def fetch() -> str:
+            token, ttl = self._fetch_2lo()
             now = time.time()
-            if not self._two_lo_token or (self._two_lo_expiry - now) < 30:
-                token, ttl = self._fetch_2lo()
-                self._two_lo_token = token
-                self._two_lo_expiry = now + ttl
-            return self._two_lo_token
+            self._two_lo = (token, now, now + ttl)
+            return token
+        return self._single_flight(self._two_lo_flights, "2lo", "2lo", fetch)
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="bb-2lo-refresher", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        retry = 1.0
+        while not self._stop.is_set():
+            token, issued, expiry = self._two_lo
+            due = issued + (expiry - issued) * self.refresh_fraction
+            delay = due - time.time() if token else 0.0
+            if delay > 0 and self._stop.wait(delay):
+                return
+            try:
+                self._refresh_2lo()
+                retry = 1.0
+            except Exception:
+                # Keep serving the current token; back off but never past its expiry
+                remaining = self._two_lo[2] - time.time()
+                wait = min(retry, max(1.0, remaining / 2)) if remaining > 0 else retry
+                retry = min(retry * 2, 60.0)
+                if self._stop.wait(wait):
+                    return
+
+    def health(self) -> dict:
+        token, _, expiry = self._two_lo
+        return {
+            "token_refresher_alive": bool(self._refresher and self._refresher.is_alive()),
+            "session_sweeper_alive": bool(self._sweeper and self._sweeper.is_alive()),
+            "2lo_expires_in": round(expiry - time.time()) if token else None,
+        }
+
+    def stop(self) -> None:
+        """Stop the background refresher and 3LO sweeper (tests / shutdown)."""
+        self._stop.set()
+
+    def get_2lo_token(self) -> str:
+        self._ensure_refresher()
+        token, _, expiry = self._two_lo
+        if token and expiry > time.time():
+            return token
+        # Missing or actually expired: block on the shared fetch
+        started = time.monotonic()
+        try:
+            return self._refresh_2lo()
+        finally:
+            TOKEN_WAIT_SECONDS.observe(time.monotonic() - started, grant="2lo")
 
     # ===== 3LO (optional server-side store) =====
+    _NS = "3lo"
+    _LEASE_NS = "3lo_refresh"
+    _LEASE_TTL = 30.0  # must outlive one token call (timeout=20)
+    _TOUCH_EVERY = 60.0  # don't rewrite last_used on every proxied request
+
+    @staticmethod
+    def _3lo_record(access: str, expires_in: int, refresh: str | None) -> dict:
+        now = time.time()
+        return {
+            "access": access,
+            "exp": now + max(30, expires_in - 30),
+            "refresh": refresh,
+            "last_used": now,
+            "failed": False,
+        }
+
     def save_3lo(self, session_id: str, access: str, expires_in: int=3600, refresh: str | None=None):
-        with self._3lo_lock:
-            self._3lo[session_id] = {
-                "access": access,
-                "exp": time.time() + max(30, expires_in - 30),
-                "refresh": refresh,
-            }
+        self._store.set(self._NS, session_id, self._3lo_record(access, expires_in, refresh), ttl=self._3lo_idle_ttl)
+        self._ensure_sweeper()
 
-    def get_3lo_access(self, session_id: str) -> Optional[str]:
-        with self._3lo_lock:
-            rec = self._3lo.get(session_id)
+    def _publish_3lo(self, session_id: str, refresh_token: str, rec: dict, new_rec: dict) -> str:
+        """
+        Swap in the refreshed tokens only over the record the refresh started from, so a
+        logout (clear_3lo) or a new login during the token call is never overwritten.
+        """
+        while not self._store.replace(self._NS, session_id, rec, new_rec, ttl=self._3lo_idle_ttl):
+            rec = self._store.get(self._NS, session_id)
             if not rec:
-                return None
-            if rec["exp"] > time.time():
-                return rec["access"]
-            # could auto-refresh here if refresh token exists
-            return None
+                raise RuntimeError("3LO session was cleared during refresh")
+            if rec.get("refresh") != refresh_token:
+                return rec["access"]  # replaced by a new login: its tokens win
+            # Same session, only touched (last_used) meanwhile: swap again over that
+        self._ensure_sweeper()
+        return new_rec["access"]
 
-    def clear_3lo(self, session_id: str):
-        with self._3lo_lock:
-            self._3lo.pop(session_id, None)
-            
-    def refresh_3lo_if_needed(self, session_id: str) -> str | None:
-        rec = None
-        with self._3lo_lock:
-            rec = self._3lo.get(session_id)
-        print(f"Refreshing 3LO for {session_id}: {rec}")
+    def _touch(self, session_id: str, rec: dict, now: float) -> None:
+        # Compare-and-swap: if another worker rotated the tokens since `rec` was read, its
+        # record is newer than ours and keeps its own last_used
+        if now - rec["last_used"] > self._TOUCH_EVERY:
+            self._store.replace(self._NS, session_id, rec, {**rec, "last_used": now}, ttl=self._3lo_idle_ttl)
+
+    def get_3lo_access(self, session_id: str) -> Optional[str]:
+        rec = self._store.get(self._NS, session_id)
         if not rec:
             return None
-        
-        # Still valid?
-        if rec["exp"] > time.time():
+        now = time.time()
+        if rec["exp"] > now:
+            self._touch(session_id, rec, now)
             return rec["access"]
-        print("Tp2")
-        # No refresh token -> can’t refresh
-        rt = rec.get("refresh")
-        if not rt:
-            return None
+        return None
+
+    def clear_3lo(self, session_id: str):
+        self._store.delete(self._NS, session_id)
 
-        # Do refresh
+    def _fetch_3lo(self, refresh_token: str) -> tuple[str, int, str]:
         url = f"{self.base_url}/learn/api/public/v1/oauth2/token"
         data = {
             "grant_type": "refresh_token",
             "client_id": self.client_id,
             "client_secret": self.client_secret,
-            "refresh_token": rt,
+            "refresh_token": refresh_token,
         }
-        r = requests.post(url, data=data, timeout=20)
-        if not r.ok:
-            # refresh failed; remove session
-            self.clear_3lo(session_id)
+        r = upstream.post(url, data=data, timeout=20)
+        r.raise_for_status()
+        j = r.json()
+        new_rt = j.get("refresh_token", refresh_token)  # sometimes unchanged
+        return j["access_token"], int(j.get("expires_in", 3600)), new_rt
+
+    def _await_other_worker(self, session_id: str, refresh_token: str) -> str:
+        """Another process holds the refresh lease: wait for it to publish the new record."""
+        deadline = time.time() + self._LEASE_TTL
+        while time.time() < deadline:
+            rec = self._store.get(self._NS, session_id)
+            if not rec or rec["failed"]:
+                raise RuntimeError("3LO refresh failed in another worker")
+            if rec.get("refresh") != refresh_token or rec["exp"] - time.time() > self._3lo_early:
+                return rec["access"]
+            if self._store.get(self._LEASE_NS, session_id) is None:
+                break
+            time.sleep(0.1)
+        raise TimeoutError("Timed out waiting for 3LO refresh in another worker")
+
+    def _refresh_3lo(self, session_id: str, refresh_token: str) -> str:
+        def fetch() -> str:
+            if not self._store.add(self._LEASE_NS, session_id, os.getpid(), ttl=self._LEASE_TTL):
+                return self._await_other_worker(session_id, refresh_token)
+            try:
+                # Another worker may have finished a refresh between our read and the lease
+                rec = self._store.get(self._NS, session_id)
+                if not rec:
+                    raise RuntimeError("3LO session was cleared")
+                if rec.get("refresh") != refresh_token or rec["exp"] - time.time() > self._3lo_early:
+                    return rec["access"]
+                try:
+                    access, expires_in, new_rt = self._fetch_3lo(refresh_token)
+                except Exception as e:
+                    # Only a rejected grant is final; timeouts and 5xx leave the session retryable
+                    if _grant_rejected(e):
+                        self._store.replace(self._NS, session_id, rec, {**rec, "failed": True}, ttl=self._3lo_idle_ttl)
+                    raise
+                return self._publish_3lo(session_id, refresh_token, rec, self._3lo_record(access, expires_in, new_rt))
+            finally:
+                self._store.delete(self._LEASE_NS, session_id)
+        return self._single_flight(self._3lo_flights, session_id, "3lo", fetch)
+
+    def refresh_3lo_if_needed(self, session_id: str) -> str | None:
+        rec = self._store.get(self._NS, session_id)
+        if not rec:
             return None
+        now = time.time()
+        self._touch(session_id, rec, now)
+        access, exp, rt, failed = rec["access"], rec["exp"], rec.get("refresh"), rec["failed"]
 
-        j = r.json()
-        access = j.get("access_token")
-        expires_in = int(j.get("expires_in", 3600))
-        new_rt = j.get("refresh_token", rt)  # sometimes unchanged
-        self.save_3lo(session_id, access, expires_in, new_rt)
-        return access
+        valid = exp > now
+        # Comfortably valid, or nothing we can do about it -> serve what we have
+        if exp - now > self._3lo_early or not rt or failed:
+            return access if valid else None
+
+        started = time.monotonic()
+        try:
+            return self._refresh_3lo(session_id, rt)
+        except Exception:
+            # Early refresh failed: the current token is still good until exp
+            return access if valid else None
+        finally:
+            if not valid:
+                TOKEN_WAIT_SECONDS.observe(time.monotonic() - started, grant="3lo")
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._3lo_lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="bb-3lo-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self._sweep_interval):
+            try:
+                self.sweep_3lo()
+            except Exception:
+                pass  # store briefly locked by another worker; try again next tick
+
+    def sweep_3lo(self) -> int:
+        """Evict sessions whose refresh failed (once expired); idle ones expire through the store TTL."""
+        now = time.time()
+        dead = [sid for sid, rec in self._store.items(self._NS) if rec["failed"] and rec["exp"] <= now]
+        for sid in dead:
+            self._store.delete(self._NS, sid)
+        self._store.purge_expired()
+        SESSIONS_EVICTED.inc(len(dead))
+        return len(dead)
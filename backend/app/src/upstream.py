@@ -0,0 +1,139 @@
+from __future__ import annotations
+import os
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.src import breaker, governor, metrics
+from app.src.tape import Tape
+
+# (connect, read) seconds — applied to any call that doesn't pass its own timeout
+DEFAULT_TIMEOUT = (6.0, 30.0)
+
+UPSTREAM_REQUESTS = metrics.counter(
+    "upstream_requests_total", "Outbound HTTP calls", labels=("host", "outcome")
+)
+UPSTREAM_SECONDS = metrics.histogram(
+    "upstream_request_seconds", "Outbound HTTP call latency", labels=("host",)
+)
+
+
+class UpstreamThrottled(requests.exceptions.ConnectionError):
+    """The rate governor refused the call (its host's wait queue is full or the wait too long)."""
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """The host's circuit is open: failed fast without a network call."""
+
+    def __init__(self, *args, retry_after: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """
+    Transport every outbound call goes through (shared session, proxy sessions, cookie
+    replay sessions): default timeout, the per-host circuit breaker and rate governor, plus
+    per-host call counts and latency. With a tape installed (see `use_tape`) calls are
+    recorded to, or answered from, a local archive.
+    """
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = DEFAULT_TIMEOUT
+        host = urlparse(request.url).hostname or "unknown"
+        tape = _tape
+        replay = tape is not None and tape.mode == "replay"
+        circuit = admit(host) if not replay else None
+        gov = governor.get_governor()
+        if gov is not None and not replay:
+            try:
+                gov.acquire(host)
+            except governor.RateLimited as e:
+                if circuit is not None:
+                    circuit.release_probe()
+                raise UpstreamThrottled(str(e), request=request) from None
+        started = time.perf_counter()
+        outcome = "error"
+        ok = False
+        try:
+            if replay:
+                resp = tape.replay(request)
+            else:
+                resp = super().send(request, **kwargs)
+                if tape is not None:
+                    tape.record(request, resp, time.perf_counter() - started)
+            outcome = f"{resp.status_code // 100}xx"
+            ok = not breaker.is_failure_status(resp.status_code)
+            return resp
+        finally:
+            if circuit is not None:
+                circuit.record(ok)
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=host)
+            UPSTREAM_REQUESTS.inc(host=host, outcome=outcome)
+
+
+def admit(host: str) -> breaker.CircuitBreaker | None:
+    """The host's circuit breaker, after checking it lets a call through (raises UpstreamUnavailable)."""
+    breakers = breaker.get_breakers()
+    if breakers is None:
+        return None
+    circuit = breakers.get(host)
+    try:
+        circuit.before_call()
+    except breaker.CircuitOpen as e:
+        raise UpstreamUnavailable(str(e), retry_after=e.retry_after) from None
+    return circuit
+
+
+_tape: Tape | None = None
+
+
+def use_tape(path: str | None, mode: str = "replay", timing: bool = True) -> Tape | None:
+    """
+    Record every outbound call to `path` (mode="record") or serve them back from it
+    (mode="replay", sleeping for the recorded latency unless timing=False). path=None
+    restores live calls.
+    """
+    global _tape
+    _tape = Tape(path, mode, timing) if path else None
+    return _tape
+
+
+def new_session(pool_maxsize: int = 32) -> requests.Session:
+    """A requests.Session whose calls go through UpstreamAdapter."""
+    s = requests.Session()
+    adapter = UpstreamAdapter(pool_connections=8, pool_maxsize=pool_maxsize)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+# Shared, connection-pooled session for stateless calls. It must never remember cookies:
+# per-request `cookies=` still apply, but a user's Set-Cookie can't leak into the next call.
+_SHARED = new_session()
+_SHARED.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    return _SHARED.request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+# UPSTREAM_TAPE=path + UPSTREAM_TAPE_MODE=record|replay (+ UPSTREAM_TAPE_TIMING=0) for the whole process
+if os.environ.get("UPSTREAM_TAPE"):
+    use_tape(
+        os.environ["UPSTREAM_TAPE"],
+        os.environ.get("UPSTREAM_TAPE_MODE", "replay"),
+        os.environ.get("UPSTREAM_TAPE_TIMING", "1").lower() not in ("0", "false", "no"),
+    )
@@ -0,0 +1,171 @@
+"""
+Per-user betting aggregates (wins, losses, amount staked, net P&L, open exposure) kept in the
+`user_stats` table, so profiles and the leaderboard never scan `bets`.
+
+Each code path that changes a bet passes (state before, state after) to `record()` before it
+commits: the difference in what the bet contributes to each party is added to their row in
+the same transaction. `rebuild()` recomputes the table from `bets`; `check()` reports rows
+that have drifted from it.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import Iterable
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.db import Bets, BetStatus, UserStats, db
+
+STAT_FIELDS = ("wins", "losses", "staked", "net_pnl", "open_exposure")
+_COUNTS = {"wins", "losses"}
+_NO_PARTY = (None, "", "NONE")  # "NONE": still on the open market
+
+LEADERBOARD_ORDER = {"net_pnl": UserStats.net_pnl, "wins": UserStats.wins}
+
+
+@dataclass(frozen=True)
+class BetState:
+    """The parts of a bet the aggregates depend on."""
+    u1: str | None
+    u2: str | None
+    status: BetStatus | None
+    wager1: float = 0.0
+    wager2: float = 0.0
+
+
+def bet_state(bet: Bets, **changes) -> BetState:
+    state = BetState(bet.u1, bet.u2, bet.status, bet.wager1 or 0.0, bet.wager2 or 0.0)
+    return replace(state, **changes) if changes else state
+
+
+def contribution(state: BetState | None) -> dict[str, list[float]]:
+    """{username: [wins, losses, staked, net_pnl, open_exposure]} that one bet adds to each party."""
+    out: dict[str, list[float]] = {}
+    if state is None:
+        return out
+    status = state.status
+    # u1 wins when the bet settles Win, u2 when it settles Loss
+    for name, stake, won in ((state.u1, state.wager1, BetStatus.Win), (state.u2, state.wager2, BetStatus.Loss)):
+        if name in _NO_PARTY:
+            continue
+        row = out.setdefault(name, [0.0] * len(STAT_FIELDS))
+        if status == BetStatus.Pending:
+            if name == state.u1:
+                row[4] += stake  # an offer: only its maker has money on it
+        elif status == BetStatus.Accepted:
+            row[2] += stake
+            row[4] += stake
+        elif status in (BetStatus.Win, BetStatus.Loss):
+            row[2] += stake
+            if status == won:
+                row[0] += 1
+                row[3] += stake
+            else:
+                row[1] += 1
+                row[3] -= stake
+    return out
+
+
+def _rows(totals: dict[str, list[float]]) -> list[dict]:
+    return [
+        {"username": name, **{f: int(v) if f in _COUNTS else v for f, v in zip(STAT_FIELDS, values)}}
+        for name, values in totals.items()
+    ]
+
+
+def record(changes: Iterable[tuple[BetState | None, BetState | None]]) -> int:
+    """
+    Add the effect of each (before, after) bet transition to the parties' rows: before=None
+    for a new bet. Runs in the caller's transaction (commit afterwards). Returns rows touched.
+    """
+    deltas: dict[str, list[float]] = {}
+    for before, after in changes:
+        for sign, state in ((-1, before), (1, after)):
+            for name, values in contribution(state).items():
+                acc = deltas.setdefault(name, [0.0] * len(STAT_FIELDS))
+                for i, v in enumerate(values):
+                    acc[i] += sign * v
+    rows = _rows({name: values for name, values in deltas.items() if any(values)})
+    if not rows:
+        return 0
+    if db.engine.dialect.name == "sqlite":
+        stmt = sqlite_insert(UserStats).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserStats.username],
+            set_={f: getattr(UserStats, f) + stmt.excluded[f] for f in STAT_FIELDS},
+        )
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            stats = db.session.get(UserStats, row["username"], with_for_update=True)
+            if stats is None:
+                db.session.add(UserStats(**row))
+            else:
+                for f in STAT_FIELDS:
+                    setattr(stats, f, getattr(stats, f) + row[f])
+    return len(rows)
+
+
+def user_stats(username: str) -> dict:
+    stats = db.session.get(UserStats, username)
+    if stats is None:
+        return {"username": username, **dict.fromkeys(STAT_FIELDS, 0)}
+    return stats.to_json()
+
+
+def leaderboard(limit: int = 10, by: str = "net_pnl") -> list[dict]:
+    """Top `limit` users by `by` (a key of LEADERBOARD_ORDER), read off its index."""
+    column = LEADERBOARD_ORDER[by]
+    stmt = (
+        select(UserStats.username, *(getattr(UserStats, f) for f in STAT_FIELDS))
+        .order_by(column.desc(), UserStats.username)
+        .limit(limit)
+    )
+    keys = ("username",) + STAT_FIELDS
+    return [dict(zip(keys, row)) for row in db.session.execute(stmt)]
+
+
+# ===== consistency =====
+def compute() -> dict[str, list[float]]:
+    """The aggregates recomputed from every row of `bets`."""
+    totals: dict[str, list[float]] = {}
+    stmt = select(Bets.u1, Bets.u2, Bets.status, Bets.wager1, Bets.wager2)
+    for u1, u2, status, wager1, wager2 in db.session.execute(stmt.execution_options(yield_per=1000)):
+        for name, values in contribution(BetState(u1, u2, status, wager1 or 0.0, wager2 or 0.0)).items():
+            acc = totals.setdefault(name, [0.0] * len(STAT_FIELDS))
+            for i, v in enumerate(values):
+                acc[i] += v
+    return totals
+
+
+def check(tolerance: float = 1e-6) -> list[dict]:
+    """Users whose stored aggregates differ from `compute()`: [{username, stored, expected}]."""
+    expected = {row["username"]: row for row in _rows(compute())}
+    stored = {s.username: s.to_json() for s in db.session.execute(select(UserStats)).scalars()}
+    zero = dict.fromkeys(STAT_FIELDS, 0)
+    drifted = []
+    for name in sorted(expected.keys() | stored.keys()):
+        want = expected.get(name, {"username": name, **zero})
+        have = stored.get(name, {"username": name, **zero})
+        if any(abs((have[f] or 0) - want[f]) > tolerance for f in STAT_FIELDS):
+            drifted.append({"username": name, "stored": have, "expected": want})
+    return drifted
+
+
+def rebuild() -> int:
+    """Replace `user_stats` with aggregates recomputed from `bets` (one transaction). Returns rows written."""
+    rows = _rows(compute())
+    db.session.execute(delete(UserStats))
+    if rows:
+        db.session.execute(insert(UserStats), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def rebuild_if_empty() -> bool:
+    """Build the table on first start after an upgrade (bets exist but no aggregates do)."""
+    has_stats = db.session.execute(select(UserStats.username).limit(1)).first() is not None
+    if has_stats or db.session.execute(select(Bets.uuid).limit(1)).first() is None:
+        return False
+    rebuild()
+    return True
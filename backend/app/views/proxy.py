@@ -3,17 +3,53 @@ from __future__ import annotations
 from flask import Blueprint, request, jsonify, current_app
 import requests, socket, ipaddress, uuid
 from urllib.parse import urlparse
-from typing import Dict
+from typing import Optional
+
+from app.src import upstream
+from app.src.state import get_store
 
 proxy_bp = Blueprint("proxy", __name__, url_prefix="/proxy")
 
-# ---- In-memory session store (swap for Redis if needed) ----
-SESSIONS: Dict[str, requests.Session] = {}
+# ---- Shared session store: cookie jars are persisted so any worker can continue a session ----
+_SESSION_NS = "proxy_sessions"
 
 # ---- Helpers / SSRF guards ----
 def _cfg(name: str, default):
     return current_app.config.get(name, default)
 
+def _session_ttl() -> float:
+    return float(_cfg("PROXY_SESSION_TTL", 3600))
+
+def _load_session(sid: str | None) -> Optional[requests.Session]:
+    """Rebuild a requests.Session from the stored cookie jar (None if unknown/expired)."""
+    if not sid:
+        return None
+    rec = get_store().get(_SESSION_NS, sid)
+    if rec is None:
+        return None
+    s = upstream.new_session()
+    s.max_redirects = rec.get("max_redirects", int(_cfg("PROXY_MAX_REDIRECTS", 5)))
+    for c in rec.get("cookies", []):
+        s.cookies.set_cookie(requests.cookies.create_cookie(**c))
+    return s
+
+def _save_session(sid: str, s: requests.Session) -> None:
+    cookies = [
+        {
+            "name": c.name,
+            "value": c.value,
+            "domain": c.domain,
+            "path": c.path,
+            "secure": c.secure,
+            "expires": c.expires,
+            "rest": dict(c._rest),
+        }
+        for c in s.cookies
+    ]
+    get_store().set(
+        _SESSION_NS, sid, {"cookies": cookies, "max_redirects": s.max_redirects}, ttl=_session_ttl()
+    )
+
 def _is_ip_private(host: str) -> bool:
     try:
         infos = socket.getaddrinfo(host, None)
@@ -84,9 +120,9 @@ def _collect_set_cookie(resp: requests.Response) -> list[str]:
 def start_session():
     """Create a new upstream session (persists cookies)."""
     sid = str(uuid.uuid4())
-    s = requests.Session()
+    s = upstream.new_session()
     s.max_redirects = int(_cfg("PROXY_MAX_REDIRECTS", 5))
-    SESSIONS[sid] = s
+    _save_session(sid, s)
     return jsonify({"session_id": sid})
 
 @proxy_bp.post("/session/request")
@@ -114,7 +150,8 @@ def session_request():
     extra_cookies = data.get("cookies") or {}
     follow_redirects = bool(data.get("follow_redirects", True))
 
-    if not sid or sid not in SESSIONS:
+    s = _load_session(sid)
+    if s is None:
         return jsonify({"error": "Invalid session_id"}), 400
 
     ok, err = _validate_url(url)
@@ -132,7 +169,6 @@ def session_request():
     ):
         headers.pop(hop, None)
 
-    s = SESSIONS[sid]
     timeout = (
         float(_cfg("PROXY_CONNECT_TIMEOUT", 6.0)),
         float(_cfg("PROXY_READ_TIMEOUT", 15.0)),
@@ -149,6 +185,7 @@ def session_request():
             allow_redirects=follow_redirects,
             stream=False,
         )
+        _save_session(sid, s)
 
         # Gather redirect chain cookies (if followed)
         redirects = []
@@ -202,13 +239,13 @@ def use_session():
     data = request.get_json(silent=True) or {}
     sid = data.get("session_id")
     new_website = data.get("url")
-    if sid not in SESSIONS:
+    s = _load_session(sid)
+    if s is None:
         return jsonify({"error": "Invalid session_id"}), 400
-    cookies = SESSIONS[sid].cookies.get_dict()
-    print(cookies)
+    cookies = s.cookies.get_dict()
     # use the cookies to access the new website using GET
     try:
-        resp = requests.get(new_website, cookies=cookies)
+        resp = upstream.get(new_website, cookies=cookies)
         return jsonify({"status": resp.status_code, "body": resp.text})
     except Exception as e:
         return jsonify({"error": f"Failed to access new website: {e}"}), 502
@@ -217,6 +254,6 @@ def use_session():
 def end_session():
     data = request.get_json(silent=True) or {}
     sid = data.get("session_id")
-    if sid in SESSIONS:
-        del SESSIONS[sid]
+    if sid:
+        get_store().delete(_SESSION_NS, sid)
     return jsonify({"ended": sid})
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from operator import or_
+from functools import partial
+from typing import Callable
 from app.models import db
 from app.src import session
 from flask import Blueprint, jsonify, request, make_response, redirect, current_app
@@ -8,13 +9,26 @@ from flask_cors import CORS
 from datetime import datetime
 import app.src.grade_extractor as ge
 from app.src.session import main as session_main, SessionManager
+from app.src.state import get_store
+from app.src.catalogue import get_catalogue, parse_offerings
+from app.src.grade_snapshots import SettlementView, get_grade_snapshots, grade_map
+from app.src.events import TooManySubscribers, bet_event, format_sse, get_events, publish_bet, publish_grades
+from app.src import breaker, governor, upstream, listings, parse_pool, pricing, settlement, user_stats
+from app.src.assessment_cache import current_offering
+from app.src.assessment_index import SEMESTER_NUMBERS, normalize
+from app.src.grade_histograms import get_grade_histograms
+from app.src.user_stats import bet_state
+from app.src.metrics import render_prometheus
 from dotenv import load_dotenv
 import os
 import secrets
 import requests
 import base64, hashlib, os, secrets, urllib.parse as urlparse
-from app.models.db import User, Bets, Courses, AssignmentMap, BetStatus, BetType
+from app.models.db import TOKEN_PROBE_COURSE, User, Bets, AssignmentMap, BetStatus, BetType
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import func
 from http.cookies import SimpleCookie
 import uuid
 from bs4 import BeautifulSoup, NavigableString
@@ -35,6 +49,8 @@ BB_BASE_URL = os.environ["BB_BASE_URL"].rstrip("/")
 BB_CLIENT_ID = os.environ["BB_CLIENT_ID"]
 BB_CLIENT_SECRET = os.environ["BB_CLIENT_SECRET"]
 BB_REDIRECT_URI = os.environ.get("BB_REDIRECT_URI")
+# Blackboard UI host for cookie-authenticated grade pages (separate from the REST BB_BASE_URL)
+LEARN_BASE_URL = os.environ.get("LEARN_BASE_URL", "https://learn.uq.edu.au").rstrip("/")
 
 COOKIE_KW = dict(httponly=True, secure=True, samesite="Lax", path="/")
 
@@ -76,144 +92,376 @@ def update_bets(username: str):
     if not user:
         return jsonify({"error": "User not found"}), 404
     token = user.token
-    if not check_token_status(token):
+    token_ok = token_probe(token)
+    if token_ok is None:
+        return blackboard_unavailable({"error": "Blackboard is unavailable"})
+    if not token_ok:
         return jsonify({"error": "Blackboard token has expired. please update"}), 404
-    bets = Bets.query.filter_by(u1=username, status=BetStatus.Accepted).all()
 
-    updates = 0
+    updates = settle_user_bets(user, lambda course_code: grade_scrape_with_cookie(course_code, token, username))
+    return jsonify({"number of bets updated": updates}), 200
+
+def settle_user_bets(user: User, page_for: Callable[[str], dict | str]) -> int:
+    """
+    update_bets once the token is known to be good, shared with the ASGI gateway:
+    `page_for(course_code)` gives a course's grade page, asked at most once per course and
+    only for courses with an accepted bet at settlement time. Returns the number settled.
+    """
+    snapshots = get_grade_snapshots()
+    views: dict[str, SettlementView] = {}  # one scrape per course, not per bet
+    def view_for(course_code: str) -> SettlementView:
+        if course_code not in views:
+            views[course_code] = snapshots.settlement_view(user.username, course_code, grade_map(page_for(course_code)))
+        return views[course_code]
+    return settle_and_commit(user, views, view_for)
+
+def settle_and_commit(user: User, views: dict[str, SettlementView], view_for: Callable[[str], SettlementView]) -> int:
+    """
+    settle_accepted_bets, then one commit, then record what this pass saw per course in
+    `views` and notify both parties of each settled bet. Returns the number settled.
+    """
+    username = user.username
+    settled = settle_accepted_bets(user, view_for)
+    events = [(bet_event(b), b.u1, b.u2) for b in settled]
+    # Every settled bet was Accepted before this pass
+    user_stats.record((bet_state(b, status=BetStatus.Accepted), bet_state(b)) for b in settled)
+    # One commit: committing per bet expired every loaded row and re-selected it on next access
+    db.session.commit()
+    snapshots = get_grade_snapshots()
+    for course_code, view in views.items():
+        snapshots.save_settlement(username, course_code, view)
+    for event, *parties in events:
+        publish_bet(event, *parties)
+    return len(settled)
+
+def settle_accepted_bets(user: User, view_for: Callable[[str], SettlementView]) -> list[Bets]:
+    """
+    Settle `user`'s accepted bets whose assessment now has a mark. `view_for(course_code)`
+    gives that course's marks and what changed since the last pass; bets already checked
+    against unchanged marks are skipped. Returns the bets settled; the caller commits.
+    """
+    bets = Bets.query.filter_by(u1=user.username, status=BetStatus.Accepted).all()
+    index_cache = current_app.extensions["assessment_index"]
+    decided = []
     for bet in bets:
         course_code = bet.coursecode
-        data = grade_scrape_with_cookie(course_code, token)
-        if data == {}:
+        if not course_code:
+            continue  # create_bet allows a bet without a course: nothing to settle it against
+        view = view_for(course_code)
+        if not view.grades:
             continue
-        target_name = AssignmentMap.query.filter_by(ECP_name=bet.assessment).first().Grade_name
-        grade = next((item['grade'] for item in data['grades'] if item['name'] == target_name), None)
-        if not grade:
+        index = index_cache.get(course_code, bet.semester, bet.year, view.grades, _assignment_overrides)
+        target_name = index.resolve(bet.assessment or "")
+        bet_id = str(bet.uuid)
+        grade = _parse_mark(view.grades.get(target_name)) if view.wants(bet_id, target_name) else None
+        if grade is None:
+            view.seen.add(bet_id)  # still open: skip until its mark changes
+            continue
+        decided.append((bet, grade))
+    return settlement.settle(decided, f"user:{user.username}")
+
+def settle_assessment(course_code: str, year: int, semester: int, assessment: str, workers: int = 8, batch_size: int = 200) -> dict:
+    """
+    Settle every accepted bet on one assessment, across all bettors. Each bettor's grade page
+    is fetched once, concurrently (at most `workers` in flight, background priority), then the
+    bets settle in transactions of `batch_size`. Safe to re-run: the settlement ledger pays each
+    bet once. Returns counts plus the bettors whose page couldn't be fetched.
+    """
+    target = normalize(assessment)
+    bets = [
+        b for b in Bets.query.filter(
+            func.upper(Bets.coursecode) == course_code.upper(), Bets.year == year,
+            Bets.semester == semester, Bets.status == BetStatus.Accepted,
+        )
+        if normalize(b.assessment or "") == target
+    ]
+    report = {"bets": len(bets), "settled": 0, "no_mark": 0, "already_settled": 0, "unavailable": []}
+    if not bets:
+        return report
+    bettors = {b.u1 for b in bets}
+    tokens = dict(db.session.query(User.username, User.token).filter(User.username.in_(bettors)))
+    app = current_app._get_current_object()
+
+    def fetch(username: str):
+        with app.app_context(), governor.priority(governor.BACKGROUND):
+            return grade_scrape_with_cookie(course_code, tokens[username], username)
+
+    pages = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(bettors))), thread_name_prefix="settle") as pool:
+        futures = {pool.submit(fetch, name): name for name in bettors if tokens.get(name)}
+        for f in as_completed(futures):
+            page = f.result()
+            # Error strings and stale snapshots: leave this bettor for the next run
+            if isinstance(page, dict) and not page.get("stale"):
+                pages[futures[f]] = page
+    report["unavailable"] = sorted(bettors - pages.keys())
+
+    index_cache = current_app.extensions["assessment_index"]
+    marks = {}
+    for bet in bets:
+        grades = grade_map(pages.get(bet.u1))
+        if not grades:
             continue
-        updates += 1
-        if bet.lower >= grade:
-            bet.status = BetStatus.Win
-            user.money += bet.wager1
-            u2 = User.query.filter_by(username=bet.u2).first()
-            u2.money -= bet.wager2
+        index = index_cache.get(course_code, semester, year, grades, _assignment_overrides)
+        grade = _parse_mark(grades.get(index.resolve(bet.assessment or "")))
+        if grade is None:
+            report["no_mark"] += 1
         else:
-            bet.status = BetStatus.Loss
-            user.money -= bet.wager1
-            u2 = User.query.filter_by(username=bet.u2).first()
-            u2.money += bet.wager2
+            marks[bet.uuid] = grade
+
+    run = f"assessment:{uuid.uuid4()}"
+    ids = list(marks)
+    for start in range(0, len(ids), batch_size):
+        # Re-read each batch in its own transaction: anything settled meanwhile is no longer Accepted
+        batch = Bets.query.filter(Bets.uuid.in_(ids[start:start + batch_size]), Bets.status == BetStatus.Accepted).all()
+        settled = settlement.settle(((b, marks[b.uuid]) for b in batch), run)
+        report["already_settled"] += len(ids[start:start + batch_size]) - len(settled)
+        events = [(bet_event(b), b.u1, b.u2) for b in settled]
+        user_stats.record((bet_state(b, status=BetStatus.Accepted), bet_state(b)) for b in settled)
         db.session.commit()
-    
-    db.session.commit()
-    return jsonify({"number of bets updated": updates}), 200
+        for event, *parties in events:
+            publish_bet(event, *parties)
+        report["settled"] += len(settled)
+    return report
 
-def check_token_status(token: str) -> bool:
-    if not token:
-        return False
+def _assignment_overrides() -> dict[str, str]:
+    """Manual /add_assaignment_map rows; consulted only when a course's name index is built."""
+    return {m.ECP_name: m.Grade_name for m in AssignmentMap.query.all()}
+
+def _parse_mark(text: str | None) -> float | None:
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None  # ungraded ('-') or non-numeric
+
+def mygrades_url(course_id: str) -> str:
+    return f"{LEARN_BASE_URL}/webapps/bb-mygrades-BB5fd17f67f4120/myGrades?course_id={course_id}&stream_name=mygrades&is_stream=true"
+
+def bbrouter_cookies(token: str) -> dict[str, str]:
     cookie_string = "BbRouter="+token+"; Path=/; Secure; HttpOnly;"
     # Parse the cookie string into a SimpleCookie object
     cookie = SimpleCookie()
     cookie.load(cookie_string)
     # Convert SimpleCookie to a dictionary for requests
-    cookies_dict = {key: morsel.value for key, morsel in cookie.items()}
+    return {key: morsel.value for key, morsel in cookie.items()}
 
-    courseId = Courses.query.filter_by(course_code="CSSE2010").first().course_id
-    url = f"https://learn.uq.edu.au/webapps/bb-mygrades-BB5fd17f67f4120/myGrades?course_id={courseId}&stream_name=mygrades&is_stream=true"
-    response = requests.get(url, cookies=cookies_dict)
+def check_token_status(token: str) -> bool:
+    if not token:
+        return False
+    courseId = get_catalogue().course_id("CSSE2010")
+    url = mygrades_url(courseId)
+    response = upstream.get(url, cookies=bbrouter_cookies(token))
     status_code = response.status_code
     if status_code != 200:
         return False
 
     return True
 
-def grade_scrape_with_cookie(course_code: str, token: str) -> str:
+def token_probe(token: str) -> bool | None:
+    """check_token_status, or None when Blackboard can't be reached (error, 5xx, open circuit)."""
+    if not token:
+        return False
+    try:
+        probe_id = get_catalogue().course_id(TOKEN_PROBE_COURSE["course_code"])
+        response = upstream.get(mygrades_url(probe_id), cookies=bbrouter_cookies(token))
+    except requests.exceptions.RequestException:
+        return None
+    if breaker.is_failure_status(response.status_code):
+        return None
+    return response.status_code == 200
+
+def stale_grades(username: str, course_code: str) -> dict:
+    """The user's last parsed grade page for the course, marked stale with its fetch time ({} if none)."""
+    last = get_grade_snapshots().last(username, course_code)
+    if not last or not last[0]:
+        return {}
+    page, as_of = last
+    return {**page, "stale": True, "as_of": as_of}
+
+def blackboard_retry_after() -> int:
+    """Seconds a client should wait before retrying: until the learn host's circuit half-opens, else 30."""
+    breakers = breaker.get_breakers()
+    wait = breakers.retry_after(urlparse.urlparse(LEARN_BASE_URL).hostname) if breakers else 0
+    return max(1, round(wait)) if wait else 30
+
+def grades_response(username: str, course_code: str, token_ok: bool | None, grades, available_only: bool = False) -> tuple[dict, int]:
+    """
+    grade_check's (or, with available_only, course_check's) body and status. token_ok=None:
+    Blackboard is unreachable, so the last snapshot is served marked stale, or 503 without one.
+    Shared with the ASGI gateway.
+    """
+    if token_ok is None:
+        if not (isinstance(grades, dict) and grades.get("stale")):
+            grades = stale_grades(username, course_code)
+        if not grades:
+            return {"error": "Blackboard is unavailable", "Course Grades Available": False}, 503
+    elif not token_ok or grades == {}:
+        return {"Course Grades Available": False}, 200
+    stale = {"stale": True, "as_of": grades["as_of"]} if isinstance(grades, dict) and grades.get("stale") else {}
+    if available_only:
+        return {"Course Grades Available": True, **stale}, 200
+    return {"Grades": grades, **stale}, 200
+
+def blackboard_unavailable(body: dict):
+    resp = jsonify(body)
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(blackboard_retry_after())
+    return resp
+
+def grade_scrape_with_cookie(course_code: str, token: str, username: str | None = None) -> str:
     """
     Scrapes the course grades for a given student
     Args:
-        url: The URL of the website to scrape.
-        cookie_string: The cookie string to set for the request.
+        course_code: Course to fetch the myGrades page for.
+        token: The student's BbRouter cookie value.
+        username: If given, the page is checked against the student's last snapshot and
+            only parsed when its content changed; if Blackboard can't be reached, that
+            snapshot is returned instead, marked stale (see stale_grades).
     Returns:
         Json of grade data (with empties or pending removed)
     """
     try:
-        cookie_string = "BbRouter="+token+"; Path=/; Secure; HttpOnly;"
-        # Parse the cookie string into a SimpleCookie object
-        cookie = SimpleCookie()
-        cookie.load(cookie_string)
-        # Convert SimpleCookie to a dictionary for requests
-        cookies_dict = {key: morsel.value for key, morsel in cookie.items()}
-
-        courseId = Courses.query.filter_by(course_code=course_code).first().course_id
-        url = f"https://learn.uq.edu.au/webapps/bb-mygrades-BB5fd17f67f4120/myGrades?course_id={courseId}&stream_name=mygrades&is_stream=true"
-        response = requests.get(url, cookies=cookies_dict)
-        if response.status_code != 200:
+        courseId = get_catalogue().course_id(course_code)
+        if not courseId:
             return {}
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        #check if user is allowwed to view grades for the course
-        main_body = soup.find('div', id='streamDetailMainBodyRight')
-        if not main_body:
-            return {}
-        # Find the first element (could be text or tag)
-        for child in main_body.contents:
-            if not child.strip():
-                continue  # skip empty whitespace
-            if not "mygrades" in str(child):
-                # print(f"e0 : {child}")
-                return {}
-            else:
-                break
-
-        # First real element is a tag
-        grades_wrapper = soup.find('div', id='grades_wrapper')
-        if not grades_wrapper:
+        url = mygrades_url(courseId)
+        response = upstream.get(url, cookies=bbrouter_cookies(token))
+        if response.status_code != 200:
+            if username and breaker.is_failure_status(response.status_code):
+                return stale_grades(username, course_code)
             return {}
-        
-        grades = []
-        rows = grades_wrapper.find_all('div', class_='graded_item_row')
-        for row in rows:
-            # Extract assessment name
-            name_span = row.select_one('.cell.gradable span')
-            name = name_span.get_text(strip=True) if name_span else None
-
-            # Extract grade
-            grade_span = row.select_one('.cell.grade span.grade')
-            grade = grade_span.get_text(strip=True) if grade_span else None
-
-            if name and grade:
-                grades.append({"name": name, "grade": grade})
-
-        return {"grades": grades}
+        if username:
+            return observe_grades(username, course_code, response.text)
+        return parse_pool.parse(parse_grades_page, response.text)
     except requests.exceptions.RequestException as e:
-        return f"Error scraping website: {e}"
+        # Includes upstream.UpstreamUnavailable: the circuit is open and nothing was sent
+        return (stale_grades(username, course_code) if username else None) or f"Error scraping website: {e}"
     except Exception as e:
         return f"An unexpected error occurred: {e}"
-    
+
+def observe_grades(username: str, course_code: str, html: str) -> dict:
+    """Parse `html` unless it matches the user's last snapshot; newly released marks go to their event stream."""
+    update = get_grade_snapshots().observe(username, course_code, html, partial(parse_pool.parse, parse_grades_page))
+    if update.changed and not update.first:
+        publish_grades(username, course_code, update.changed)
+    # Histograms compare against what the user already contributes (not this snapshot), so a
+    # page seen again after the snapshot store lost it changes nothing
+    if update.reparsed and update.grades != update.previous:
+        pricing.get_repricer().submit(apply_grade_change, username, course_code, update.grades)
+    return update.page
+
+def apply_grade_change(username: str, course_code: str, grades: dict[str, str]) -> int:
+    """
+    Background job for a grade page whose marks changed: move the user's marks in the current
+    offering's grade histograms, then re-price the course's open bets. The caller commits.
+    """
+    semester, year = current_offering()
+    get_grade_histograms().record(username, course_code, SEMESTER_NUMBERS[semester], year, grades)
+    return reprice_bets(course_code, {username: grades})
+
+def reprice_bets(course_code: str, known: dict[str, dict[str, str]] | None = None) -> int:
+    """
+    Re-price every open bet on the course in one batch: a bettor whose mark is out makes the
+    bet certain, the rest are priced off the assessment's grade histogram. `known`:
+    {username: marks} just parsed; other bettors' marks come from their last snapshot. The
+    caller commits.
+    """
+    index_cache = current_app.extensions["assessment_index"]
+    snapshots = get_grade_snapshots()
+    histograms = get_grade_histograms()
+    marks_by_user = dict(known or {})
+    offering_cdfs: dict[tuple[int, int], dict] = {}
+
+    def resolve(u1: str, semester: int, year: int, assessment: str):
+        if semester is None or year is None:
+            return None, None
+        if u1 not in marks_by_user:
+            last = snapshots.last(u1, course_code)
+            marks_by_user[u1] = grade_map(last[0]) if last else {}
+        grades = marks_by_user[u1]
+        if grades:
+            index = index_cache.get(course_code, semester, year, grades, _assignment_overrides)
+        else:
+            index = index_cache.peek(course_code, semester, year)
+        name = index.resolve(assessment or "") if index else None
+        if (semester, year) not in offering_cdfs:
+            offering_cdfs[(semester, year)] = histograms.cdfs(course_code, semester, year)
+        cdf = offering_cdfs[(semester, year)].get(normalize(name or assessment or ""))
+        return (_parse_mark(grades.get(name)) if name else None), cdf
+
+    return pricing.reprice([func.upper(Bets.coursecode) == course_code.upper()], resolve)
+
+def histogram_cdf(course_code: str, semester, year, assessment: str):
+    """The assessment's grade-histogram CDF for pricing a new bet (None: too few marks, or no offering)."""
+    try:
+        semester, year = int(semester), int(year)
+    except (TypeError, ValueError):
+        return None
+    if not course_code or not assessment:
+        return None
+    index = current_app.extensions["assessment_index"].peek(course_code, semester, year)
+    name = index.resolve(assessment) if index else None
+    return get_grade_histograms().cdf(course_code, semester, year, name or assessment)
+
+def parse_grades_page(html: str) -> dict:
+    """{"grades": [{name, grade}, ...]} from a myGrades stream page ({} if grades aren't visible)."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    #check if user is allowwed to view grades for the course
+    main_body = soup.find('div', id='streamDetailMainBodyRight')
+    if not main_body:
+        return {}
+    # Find the first element (could be text or tag)
+    for child in main_body.contents:
+        if not child.strip():
+            continue  # skip empty whitespace
+        if not "mygrades" in str(child):
+            # print(f"e0 : {child}")
+            return {}
+        else:
+            break
+
+    # First real element is a tag
+    grades_wrapper = soup.find('div', id='grades_wrapper')
+    if not grades_wrapper:
+        return {}
+
+    grades = []
+    rows = grades_wrapper.find_all('div', class_='graded_item_row')
+    for row in rows:
+        # Extract assessment name
+        name_span = row.select_one('.cell.gradable a, .cell.gradable span')
+        name = name_span.get_text(strip=True) if name_span else None
+
+        # Extract grade
+        grade_span = row.select_one('.cell.grade span.grade')
+        grade = grade_span.get_text(strip=True) if grade_span else None
+
+        if name and grade:
+            grades.append({"name": name, "grade": grade})
+
+    return {"grades": grades}
+
 @api.route('/course_check/<string:username>/<string:course_code>', methods=['GET'])
 def course_check(username: str, course_code: str):
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
-    if not check_token_status(user.token):
-        return jsonify({"Course Grades Available": False}), 200
-    token = user.token
-    grades = grade_scrape_with_cookie(course_code, token)
-    print(grades)
-    if grades == {}:
-        return jsonify({"Course Grades Available": False}), 200
-    return jsonify({"Course Grades Available": True}), 200
+    token_ok = token_probe(user.token)
+    grades = grade_scrape_with_cookie(course_code, user.token, username) if token_ok else None
+    return _grades_reply(*grades_response(username, course_code, token_ok, grades, available_only=True))
 
 @api.route('/grade_check/<string:username>/<string:course_code>', methods=['GET'])
 def grade_check(username: str, course_code: str):
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
-    if not check_token_status(user.token):
-        return jsonify({"Course Grades Available": False}), 200
-    token = user.token
-    grades = grade_scrape_with_cookie(course_code, token)
-    if grades == {}:
-        return jsonify({"Course Grades Available": False}), 200
-    return jsonify({"Grades": grades}), 200
+    token_ok = token_probe(user.token)
+    grades = grade_scrape_with_cookie(course_code, user.token, username) if token_ok else None
+    return _grades_reply(*grades_response(username, course_code, token_ok, grades))
+
+def _grades_reply(body: dict, status: int):
+    return blackboard_unavailable(body) if status == 503 else (jsonify(body), status)
 
 @api.route('/update_token/<string:user>/<string:token>', methods=['GET'])
 def update_token(user: str,token: str):
@@ -234,11 +482,28 @@ def add_course():
     course_name = data.get("course_name")
     if not course_id or not course_code:
         return jsonify({"error": "Missing course code, course id"}), 400
-    course = Courses(course_code=course_code, course_id=course_id, course_name=course_name)
-    db.session.add(course)
-    db.session.commit()
+    get_catalogue().upsert([{"course_code": course_code.upper(), "course_id": course_id, "course_name": course_name}])
     return jsonify({"succesful addition": True}), 200
 
+@api.route('/courses/import', methods=['POST'])
+def import_courses():
+    """
+    Bulk upsert a semester's offerings.
+    Accepts a multipart `file` (.csv or .json) or a JSON body (list or {"courses": [...]}).
+    """
+    batch_size = request.args.get("batch_size", 500, type=int)
+    upload = request.files.get("file")
+    try:
+        if upload:
+            fmt = upload.filename.rsplit(".", 1)[-1].lower()
+            rows = parse_offerings(upload.read().decode("utf-8-sig"), fmt)
+        else:
+            rows = parse_offerings(request.get_data(as_text=True), "json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    count = get_catalogue().upsert(rows, batch_size=batch_size)
+    return jsonify({"upserted": count, "catalogue_size": len(get_catalogue())}), 200
+
 @api.route('/add_assaignment_map', methods=['POST'])
 def add_assaignment_map():
     data = request.json
@@ -249,8 +514,30 @@ def add_assaignment_map():
     aMap = AssignmentMap(uuid = uuid.uuid4(), ECP_name=ECP_name, Grade_name=Grade_name)
     db.session.add(aMap)
     db.session.commit()
+    current_app.extensions["assessment_index"].invalidate()
+    get_grade_snapshots().forget_settlement()
     return jsonify({"succesful addition": True}), 200
 
+@api.route('/settle_assessment', methods=['POST'])
+def settle_assessment_route():
+    """
+    Settle every accepted bet on one assessment once its marks are out. Body: coursecode,
+    year, semester, assessment (optional workers). Idempotent; see settle_assessment.
+    """
+    data = request.json or {}
+    coursecode, assessment = data.get("coursecode"), data.get("assessment")
+    try:
+        year, semester = int(data.get("year")), int(data.get("semester"))
+    except (TypeError, ValueError):
+        year = semester = None
+    if not coursecode or not assessment or year is None:
+        return jsonify({"error": "Missing required contents: coursecode, year, semester, assessment"}), 400
+    try:
+        workers = min(max(int(data.get("workers", 8)), 1), 32)
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers must be an integer"}), 400
+    return jsonify(settle_assessment(coursecode, year, semester, assessment, workers=workers)), 200
+
 @api.route('/get_balance/<string:username>', methods=['GET'])
 def get_balance(username: str):
     user = User.query.filter_by(username=username).first()
@@ -260,8 +547,7 @@ def get_balance(username: str):
 
 @api.route('/get_users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.username for user in users]), 200
+    return listings.json_response(listings.usernames())
 
 @api.route('/check_user', methods=['POST'])
 def check_user():
@@ -320,8 +606,10 @@ def create_bet():
         lower=lower, 
         wager1=wager1, 
         wager2=wager1, 
-        description=description)
+        description=description,
+        implied_prob=pricing.price(lower, cdf=histogram_cdf(coursecode, semester, year, assesment)))
     db.session.add(bet)
+    user_stats.record([(None, bet_state(bet))])
     db.session.commit()
     return jsonify({"message": "Bet successfully added"}), 201
 
@@ -339,29 +627,23 @@ def get_bet(user: str, id: str):
     if bet.u1 == user:
         return jsonify({"error": "You cannot accept your own bet"}), 400
     
+    before = bet_state(bet)
     bet.status = BetStatus.Accepted
     bet.u1 = user
+    user_stats.record([(before, bet_state(bet))])
+    event, parties = bet_event(bet), (bet.u1, bet.u2)
     db.session.commit()
+    publish_bet(event, *parties)
     return jsonify({"message": "Bet successfully accepted"}), 200
 
 
 @api.route('/check_bets/<string:username>/<int:bet_status>', methods=['GET'])
 def check_bets(username: str, bet_status: int):
-    q = Bets.query.filter(or_(Bets.u1 == username, Bets.u2 == username))
-    if bet_status != 0:
-        status_enum = BetStatus(bet_status)
-        q = q.filter(Bets.status == status_enum)
-    bets = q.all()
-    return jsonify([Bets.to_json(b) for b in bets]), 200
+    return listings.json_response(listings.user_bets(username, bet_status))
 
 @api.route('/check_open_bets/<string:username>/<int:bet_status>', methods=['GET']) 
 def check_open_bets(username: str, bet_status: int):
-    q = Bets.query.filter(Bets.u1 != username, Bets.u2 == "NONE")
-    if bet_status != 0:
-        status_enum = BetStatus(bet_status)
-        q = q.filter(Bets.status == status_enum)
-    bets = q.all()
-    return jsonify([Bets.to_json(b) for b in bets]), 200
+    return listings.json_response(listings.open_bets(username, bet_status))
 
 @api.route('/accept_open_bet/<string:username>/<string:bet_id>', methods=['POST'])
 def accept_open_bet(username: str, bet_id: str):
@@ -386,18 +668,92 @@ def accept_open_bet(username: str, bet_id: str):
         db.session.rollback()
         return jsonify({"error": "Bet not found, already accepted, or not pending"}), 409
 
+    # The claimed row, as updated (read inside the transaction, so it can't change under us)
+    bet = db.session.get(Bets, bet_uuid, populate_existing=True)
+    user_stats.record([(bet_state(bet, status=BetStatus.Pending, u2=None), bet_state(bet))])
+    event, parties = bet_event(bet), (bet.u1, bet.u2)
     db.session.commit()
+    publish_bet(event, *parties)
     return jsonify({"message": "Bet successfully accepted"}), 200
 
+@api.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Top users by net P&L (`?by=wins` for most wins); `?limit=` up to 100."""
+    by = request.args.get("by", "net_pnl")
+    if by not in user_stats.LEADERBOARD_ORDER:
+        return jsonify({"error": f"by must be one of: {', '.join(user_stats.LEADERBOARD_ORDER)}"}), 400
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    return jsonify(user_stats.leaderboard(limit, by)), 200
+
+@api.route('/user_stats/<string:username>', methods=['GET'])
+def get_user_stats(username: str):
+    if db.session.get(User, username) is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(user_stats.user_stats(username)), 200
+
+@api.route('/events/<string:username>', methods=['GET'])
+def user_events(username: str):
+    """
+    Server-sent events for one user: `bet` (accepted / won / lost) and `grades` (newly
+    released marks) as they happen, with a comment heartbeat so proxies keep the stream open.
+    """
+    bus = get_events()
+    try:
+        sub = bus.subscribe(username)
+    except TooManySubscribers:
+        resp = jsonify({"error": "Too many open event streams"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "30"
+        return resp
+    heartbeat = current_app.config.get("EVENTS_HEARTBEAT", 15)
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = sub.get(timeout=heartbeat)
+                yield format_sse(event) if event else ": heartbeat\n\n"
+        finally:
+            bus.unsubscribe(sub)
+
+    resp = current_app.response_class(stream(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
 @api.route('/health')
 def health():
-    health = 200 ## Health should always be 200 for now, scalability not a concern
-    if health == 200: # Service is healthy
-        return jsonify(
-            {
-                "healthy": True
-            }
-            ), 200
+    """Liveness plus DB, background-thread and cache health. 503 if the DB or state store is unreachable."""
+    checks = {}
+    started = time.perf_counter()
+    try:
+        db.session.execute(db.text("SELECT 1"))
+        checks["db"] = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        checks["db"] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    try:
+        state_entries = get_store().count("3lo")
+        checks["state_store"] = {"ok": True, "3lo_sessions": state_entries}
+    except Exception as e:
+        checks["state_store"] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    checks["threads"] = {
+        "active": threading.active_count(),
+        **current_app.extensions["bb_tokens"].health(),
+        "event_streams": len(get_events()),
+    }
+    checks["caches"] = {
+        "catalogue_courses": len(get_catalogue()),
+        "assessment_tables": current_app.extensions["assessment_cache"].size(),
+        "assessment_name_indexes": len(current_app.extensions["assessment_index"]),
+    }
+    breakers = breaker.get_breakers()
+    checks["upstream_circuits"] = breakers.open_hosts() if breakers else {}
+    healthy = checks["db"]["ok"] and checks["state_store"]["ok"]
+    return jsonify({"healthy": healthy, "checks": checks}), 200 if healthy else 503
+
+@api.route('/metrics')
+def prometheus_metrics():
+    return current_app.response_class(render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 @api.route('/courses/<string:course_code>/<int:semester>/<int:year>/assessments', methods=['GET'])
 def get_assessments(course_code: str, semester: int, year: int=2025):
@@ -412,13 +768,18 @@ def get_assessments(course_code: str, semester: int, year: int=2025):
         semester = ge.Semester.SUMMER
     else:
         return jsonify({"error": "Invalid semester"}), 400
-    extractor = ge.CourseExtractor(courses=[course_code])
     try:
-        site = extractor.get_page(course_code, semester, year)
-        table = extractor.get_table(site)
-        return jsonify(table), 200
+        body, etag = current_app.extensions["assessment_cache"].get_response(course_code, semester, year)
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    resp = make_response(body, 200)
+    resp.mimetype = "application/json"
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = current_app.config.get("ASSESSMENTS_MAX_AGE", 600)
+    return resp.make_conditional(request)
 
 
 def _b64url(data: bytes) -> str:
@@ -432,24 +793,12 @@ def make_pkce():
 
 @api.get("/test")
 def scrape():
-    website = "https://learn.uq.edu.au"
-    response = requests.get(website)
+    website = LEARN_BASE_URL
+    response = upstream.get(website)
     if response.status_code == 200:
         return jsonify({"content": response.text}), 200
     return jsonify({"error": "Failed to retrieve content"}), 500
 
-@api.route('/grade_check/<string:username>/<string:course_code>', methods=['GET'])
-def grade_check(username: str, course_code: str):
-    user = User.query.filter_by(username=username).first()
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    if not check_token_status(user.token):
-        return jsonify({"Course Grades Available": False}), 200
-    token = user.token
-    grades = grade_scrape_with_cookie(course_code, token)
-    if grades == {}:
-        return jsonify({"Course Grades Available": False}), 200
-    return jsonify({"Grades": grades}), 200
 # @api.get("/auth/3lo/login")
 # def three_legged_login():
 #     cfg = current_app.config
@@ -481,12 +830,8 @@ def grade_check(username: str, course_code: str):
 #     resp = make_response(redirect(auth_url, code=302))
 #     return resp
 
-@dataclass
-class _Pending3LO:
-    verifier: str
-    created_at: float
-
-_PENDING: dict[str, _Pending3LO] = {}
+# PKCE verifiers live in the shared store so the callback can land on any worker
+_PENDING_NS = "pkce"
 _PENDING_TTL = 600  # seconds
 
 
@@ -498,16 +843,11 @@ def _make_pkce() -> tuple[str, str]:
 
 
 def _remember_state(state: str, verifier: str) -> None:
-    _PENDING[state] = _Pending3LO(verifier=verifier, created_at=time.time())
+    get_store().set(_PENDING_NS, state, verifier, ttl=_PENDING_TTL)
 
 
 def _pop_verifier(state: str) -> str | None:
-    rec = _PENDING.pop(state, None)
-    if not rec:
-        return None
-    if time.time() - rec.created_at > _PENDING_TTL:
-        return None
-    return rec.verifier
+    return get_store().pop(_PENDING_NS, state)
 
 @api.route("/auth/3lo/login", methods=["GET"])
 def three_legged_login():
@@ -585,7 +925,7 @@ def three_legged_callback():
         "redirect_uri": cfg["BB_REDIRECT_URI"],
     }
 
-    r = requests.post(token_url, headers=headers, data=body, timeout=20)
+    r = upstream.post(token_url, headers=headers, data=body, timeout=20)
     if not r.ok:
         return f"Token exchange failed: {r.text}", 502
 
@@ -642,7 +982,6 @@ def bb_proxy(api_path: str):
     # 1) Try 3LO server-side session
     token = None
     sid = request.cookies.get("sid")
-    print(sid)
     if sid:
         token = mgr.refresh_3lo_if_needed(sid)
 
@@ -660,9 +999,9 @@ def bb_proxy(api_path: str):
 
     try:
         if request.method in ("GET", "HEAD"):
-            rr = requests.request(request.method, upstream_url, headers=headers, params=request.args, timeout=30)
+            rr = upstream.request(request.method, upstream_url, headers=headers, params=request.args, timeout=30)
         else:
-            rr = requests.request(
+            rr = upstream.request(
                 request.method, upstream_url, headers=headers, params=request.args, data=request.get_data(), timeout=60
             )
     except requests.RequestException as e:
@@ -703,5 +1042,7 @@ def get_pending_bets(user_id: str,bet_status: int):
         return jsonify(table), 200
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
     
     
\ No newline at end of file
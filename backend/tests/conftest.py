@@ -0,0 +1,60 @@
+import os
+import uuid
+
+os.environ.setdefault("BB_BASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("BB_CLIENT_ID", "dev")
+os.environ.setdefault("BB_CLIENT_SECRET", "dev")
+
+import pytest
+
+from app import create_app
+from app.models.db import Bets, BetStatus, BetType, User, db
+import app.views.routes as routes
+
+# In-memory database and state store; a fixed salt so nothing is written under data/
+TEST_CONFIG = {
+    "SQLALCHEMY_DATABASE_URI": "sqlite://", "STATE_URL": "memory://", "TESTING": True,
+    "GRADE_HISTOGRAM_SALT": "test-salt",
+}
+ASSESSMENT = "Assignment 1 (25%)"
+# What grade_scrape_with_cookie returns for every bettor: 14.00 on the bets' assessment
+GRADES = {"grades": [{"name": "Assigment 1", "grade": "14.00"}]}
+
+
+@pytest.fixture
+def app():
+    """A fresh app on an in-memory database and state store, inside an app context."""
+    app = create_app(TEST_CONFIG)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """No upstream: every token is valid and every grade page is GRADES."""
+    monkeypatch.setattr(routes, "token_probe", lambda token: True)
+    monkeypatch.setattr(routes, "grade_scrape_with_cookie", lambda course_code, token, username=None: GRADES)
+
+
+def add_users(*names: str) -> None:
+    db.session.add_all(User(username=n, email=f"{n}@example.com", password="x", token="cookie", money=100) for n in names)
+    db.session.commit()
+
+
+def add_bets(n: int, status: BetStatus = BetStatus.Accepted, u1: str = "alice", u2: str = "bob", lower: float = 15, **kw) -> list[Bets]:
+    bets = [
+        Bets(
+            uuid=uuid.uuid4(), u1=u1, u2=u2, type=BetType.Monetary, status=status, coursecode="CSSE2010",
+            year=2025, semester=2, assessment=ASSESSMENT, upper=20, lower=lower, wager1=1, wager2=1, **kw,
+        )
+        for _ in range(n)
+    ]
+    db.session.add_all(bets)
+    db.session.commit()
+    return bets
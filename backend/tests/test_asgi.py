@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+import requests
+
+pytest.importorskip("a2wsgi")
+httpx = pytest.importorskip("httpx")
+
+from app.asgi import AsyncGateway
+from app.models.db import BetStatus, Bets, db
+import app.views.routes as routes
+
+from conftest import GRADES, add_bets, add_users
+
+
+def request(gateway: AsyncGateway, method: str, path: str, **kwargs) -> httpx.Response:
+    async def call():
+        transport = httpx.ASGITransport(app=gateway)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(call())
+
+
+def get(gateway: AsyncGateway, path: str, **kwargs) -> httpx.Response:
+    return request(gateway, "GET", path, **kwargs)
+
+
+@pytest.fixture
+def gateway(app):
+    return AsyncGateway(app)
+
+
+def test_update_bets_checks_token_before_fetching_pages(gateway, monkeypatch):
+    add_users("alice", "bob")
+    add_bets(1)
+    fetched = []
+
+    async def token_ok(token, probe_id):
+        return False
+
+    async def grade_page(username, course_code, course_id, token):
+        fetched.append(course_code)
+        return GRADES
+    monkeypatch.setattr(gateway, "_token_ok", token_ok)
+    monkeypatch.setattr(gateway, "_grade_page", grade_page)
+    assert get(gateway, "/update_bets/alice").status_code == 404
+    assert get(gateway, "/grade_check/alice/CSSE2010").json() == {"Course Grades Available": False}
+    assert fetched == []
+
+
+def test_update_bets_fetches_course_accepted_meanwhile(gateway, monkeypatch):
+    add_users("alice", "bob")
+    add_bets(1)
+
+    async def token_ok(token, probe_id):
+        # Between update_bets' bet lookup and settlement, a bet on another course is accepted
+        def accept():
+            bet, = add_bets(1)
+            bet.coursecode = "CSSE2310"
+            db.session.commit()
+        await gateway._sync(accept)
+        return True
+
+    async def grade_page(username, course_code, course_id, token):
+        return GRADES
+    monkeypatch.setattr(gateway, "_token_ok", token_ok)
+    monkeypatch.setattr(gateway, "_grade_page", grade_page)
+    monkeypatch.setattr(routes, "grade_scrape_with_cookie", lambda course_code, token, username=None: GRADES)
+    resp = get(gateway, "/update_bets/alice")
+    assert resp.status_code == 200
+    assert resp.json() == {"number of bets updated": 2}
+    assert {b.status for b in db.session.scalars(db.select(Bets))} == {BetStatus.Win}
+
+
+def test_native_routes_send_the_same_cors_headers_as_flask(gateway, client, app, monkeypatch):
+    add_users("alice")
+
+    async def token_ok(token, probe_id):
+        return False
+    monkeypatch.setattr(gateway, "_token_ok", token_ok)
+    monkeypatch.setattr(routes, "token_probe", lambda token: False)
+    origin = {"Origin": "http://localhost:5173"}
+    native = get(gateway, "/grade_check/alice/CSSE2010", headers=origin)
+    threaded = client.get("/grade_check/alice/CSSE2010", headers=origin)
+    assert native.headers["access-control-allow-origin"] == threaded.headers["Access-Control-Allow-Origin"]
+    assert native.headers["access-control-allow-origin"] == "http://localhost:5173"
+
+    # Preflight isn't routed natively: Flask (and its CORS handling) answers it
+    preflight = request(gateway, "OPTIONS", "/update_bets/alice", headers={**origin, "Access-Control-Request-Method": "GET"})
+    assert preflight.status_code == 200
+    assert preflight.headers["access-control-allow-origin"] == "http://localhost:5173"
+    assert "GET" in preflight.headers["access-control-allow-methods"]
+
+
+def test_event_stream_sends_cors_headers(gateway, app):
+    app.config["EVENTS_HEARTBEAT"] = 0.01
+    started = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            started.append(dict(message["headers"]))
+    scope = {
+        "type": "http", "method": "GET", "path": "/events/alice", "query_string": b"",
+        "headers": [(b"origin", b"http://localhost:5173")],
+    }
+    asyncio.run(gateway(scope, receive, send))
+    assert started[0][b"content-type"] == b"text/event-stream"
+    assert started[0][b"access-control-allow-origin"] == b"http://localhost:5173"
+
+
+def test_assessments_upstream_error_is_502(gateway, app, monkeypatch):
+    def unavailable(*args):
+        raise requests.HTTPError("503 Server Error")
+    monkeypatch.setattr(app.extensions["assessment_cache"], "get_response", unavailable)
+    resp = get(gateway, "/courses/CSSE2010/2/2025/assessments")
+    assert resp.status_code == 502
+    assert app.test_client().get("/courses/CSSE2010/2/2025/assessments").status_code == 502
+
+
+def test_update_bets_skips_bets_without_a_course(gateway, monkeypatch):
+    add_users("alice", "bob")
+    add_bets(1)
+    bet, = add_bets(1)
+    bet.coursecode = None
+    db.session.commit()
+
+    async def token_ok(token, probe_id):
+        return True
+
+    async def grade_page(username, course_code, course_id, token):
+        assert course_code is not None
+        return GRADES
+    monkeypatch.setattr(gateway, "_token_ok", token_ok)
+    monkeypatch.setattr(gateway, "_grade_page", grade_page)
+    resp = get(gateway, "/update_bets/alice")
+    assert resp.status_code == 200
+    assert resp.json() == {"number of bets updated": 1}
@@ -0,0 +1,22 @@
+from app.src import governor
+
+
+def test_limits_are_split_across_workers(monkeypatch):
+    monkeypatch.setenv("UPSTREAM_RATE", "20")
+    monkeypatch.setenv("UPSTREAM_HOST_LIMITS", "learn.uq.edu.au=8/16")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    gov = governor.from_env()
+    assert (gov.default.rate, gov.default.burst) == (5, 10)
+    assert (gov.hosts["learn.uq.edu.au"].rate, gov.hosts["learn.uq.edu.au"].burst) == (2, 4)
+
+    monkeypatch.setenv("UPSTREAM_WORKERS", "2")
+    assert governor.from_env().default.rate == 10
+
+
+def test_single_worker_keeps_configured_limits(monkeypatch):
+    monkeypatch.setenv("UPSTREAM_RATE", "20")
+    monkeypatch.delenv("UPSTREAM_BURST", raising=False)
+    monkeypatch.delenv("UPSTREAM_WORKERS", raising=False)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    gov = governor.from_env()
+    assert (gov.default.rate, gov.default.burst) == (20, 40)
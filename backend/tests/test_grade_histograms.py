@@ -0,0 +1,79 @@
+import numpy as np
+from sqlalchemy import delete, select
+
+from app.models.db import GradeContribution, db
+from app.src.assessment_cache import current_offering
+from app.src.assessment_index import SEMESTER_NUMBERS
+from app.src.grade_histograms import BINS, at_most_probability, cdf_of, get_grade_histograms
+from app.src.grade_snapshots import GradeSnapshots
+from app.src.pricing import get_repricer
+from app.src.state import MemoryStateStore
+import app.views.routes as routes
+
+
+def test_at_most_probability_whole_marks():
+    counts = np.zeros(BINS)
+    counts[[10, 20, 30]] = [1, 2, 1]
+    cdf = cdf_of(counts)[None, :]
+    assert at_most_probability(cdf, [9.5])[0] == 0.0
+    assert at_most_probability(cdf, [10])[0] == 0.25
+    assert at_most_probability(cdf, [20])[0] == 0.75
+    assert at_most_probability(cdf, [100])[0] == 1.0
+    assert at_most_probability(cdf, [-1])[0] == 0.0
+
+
+def test_record_adds_moves_and_removes_marks(app):
+    hist = get_grade_histograms()
+    assert hist.record("alice", "csse2010", 2, 2025, {"Quiz 1 (5%)": "80", "Exam": "-"}) == 1
+    assert hist.record("alice", "CSSE2010", 2, 2025, {"Quiz 1 (5%)": "90.5"}) == 1
+    counts = hist.counts("CSSE2010", 2, 2025, "Quiz 1")
+    assert counts.sum() == 1 and counts[90] == 1
+    assert hist.record("alice", "CSSE2010", 2, 2025, {}) == 1
+    assert hist.counts("CSSE2010", 2, 2025, "Quiz 1").sum() == 0
+    assert hist.counts("CSSE2010", 2, 2025, "Exam").sum() == 0
+
+
+def test_recording_the_same_marks_again_changes_nothing(app):
+    hist = get_grade_histograms()
+    hist.record("alice", "CSSE2010", 2, 2025, {"Quiz 1": "80"})
+    hist.record("bob", "CSSE2010", 2, 2025, {"Quiz 1": "80"})
+    assert hist.record("alice", "CSSE2010", 2, 2025, {"Quiz 1": "80.4"}) == 0  # same whole-mark bin
+    assert hist.counts("CSSE2010", 2, 2025, "Quiz 1").sum() == 2
+    stored = db.session.scalars(select(GradeContribution.user_key)).all()
+    assert "alice" not in stored and len(stored) == 2
+
+
+def test_page_seen_again_with_a_fresh_snapshot_store(app, monkeypatch):
+    """Snapshots expired, wiped or on memory:// across a restart: the marks are not counted twice."""
+    monkeypatch.setattr(routes, "parse_grades_page", lambda html: {"grades": [{"name": "Quiz 1", "grade": "80"}]})
+    semester, year = current_offering()
+
+    def observe():
+        routes.observe_grades("alice", "CSSE2010", "<div>Quiz 1: 80</div>")
+        get_repricer().submit(lambda: 0).result()  # jobs run in order: wait for the histogram update
+        return get_grade_histograms().counts("CSSE2010", SEMESTER_NUMBERS[semester], year, "Quiz 1").sum()
+
+    assert observe() == 1
+    app.extensions["grade_snapshots"] = GradeSnapshots(store=MemoryStateStore())
+    assert observe() == 1
+
+
+def test_cdf_needs_min_samples(app):
+    hist = get_grade_histograms()
+    for n in range(hist.min_samples - 1):
+        hist.record(f"user{n}", "CSSE2010", 2, 2025, {"Quiz 1": str(50 + n)})
+    assert hist.cdf("CSSE2010", 2, 2025, "Quiz 1") is None
+    hist.record("last", "CSSE2010", 2, 2025, {"Quiz 1": "100"})
+    cdf = hist.cdf("CSSE2010", 2, 2025, "Quiz 1")
+    assert cdf[-1] == 1.0 and cdf[50] == 0.0
+    assert set(hist.cdfs("CSSE2010", 2, 2025)) == {"quiz 1"}
+
+
+def test_histograms_without_contributions_are_reset(app):
+    hist = get_grade_histograms()
+    hist.record("alice", "CSSE2010", 2, 2025, {"Quiz 1": "80"})
+    assert not hist.reset_untracked()
+    db.session.execute(delete(GradeContribution))
+    db.session.commit()
+    assert hist.reset_untracked()
+    assert hist.counts("CSSE2010", 2, 2025, "Quiz 1").sum() == 0
@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.src.grade_snapshots import GradeSnapshots
+from app.src.state import MemoryStateStore, SQLiteStateStore
+
+PAGE_A = '<div id="streamDetailMainBodyRight">Quiz 1: 80</div>'
+PAGE_B = '<div id="streamDetailMainBodyRight">Quiz 1: 90</div>'
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def snapshots(request, tmp_path):
+    store = MemoryStateStore() if request.param == "memory" else SQLiteStateStore(tmp_path / "state.sqlite")
+    return GradeSnapshots(store=store)
+
+
+def parse(html: str) -> dict:
+    return {"grades": [{"name": "Quiz 1", "grade": html.split(": ")[1][:2]}]}
+
+
+def test_unchanged_page_is_not_reparsed(snapshots):
+    first = snapshots.observe("alice", "csse2010", PAGE_A, parse)
+    again = snapshots.observe("alice", "CSSE2010", PAGE_A, parse)
+    changed = snapshots.observe("alice", "CSSE2010", PAGE_B, parse)
+    assert (first.reparsed, first.first, first.changed) == (True, True, {"Quiz 1": "80"})
+    assert (again.reparsed, again.changed) == (False, {})
+    assert (changed.reparsed, changed.previous, changed.changed) == (True, {"Quiz 1": "80"}, {"Quiz 1": "90"})
+
+
+def test_overlapping_fetches_report_a_change_once(snapshots):
+    snapshots.observe("alice", "CSSE2010", PAGE_A, parse)
+    # Every fetch reads the old snapshot before any of them swaps in the new page
+    all_parsed = threading.Barrier(8, timeout=10)
+
+    def slow_parse(html: str) -> dict:
+        all_parsed.wait()
+        return parse(html)
+
+    with ThreadPoolExecutor(8) as pool:
+        updates = list(pool.map(lambda _: snapshots.observe("alice", "CSSE2010", PAGE_B, slow_parse), range(8)))
+    winners = [u for u in updates if u.reparsed]
+    assert len(winners) == 1
+    assert winners[0].previous == {"Quiz 1": "80"}
+    assert all(u.changed == {} for u in updates if not u.reparsed)
+    assert snapshots.last("alice", "CSSE2010")[0] == parse(PAGE_B)
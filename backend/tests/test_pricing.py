@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+
+from app.models.db import BetStatus
+from app.src import pricing, settlement
+from app.src.grade_histograms import BINS, cdf_of
+
+from conftest import add_bets, add_users
+
+
+def test_released_mark_prices_what_settlement_pays(app):
+    add_users("alice", "bob")
+    bet, = add_bets(1, lower=15)
+    for mark in (10.0, 15.0, 15.5, 19.0, 25.0):
+        won = settlement.outcome(bet, mark) == BetStatus.Win
+        assert pricing.price(bet.lower, mark=mark) == (1.0 if won else 0.0), mark
+
+
+def test_prior_is_probability_of_mark_at_most_lower():
+    assert pricing.price(55) == 0.5
+    assert pricing.price(40) < pricing.price(70)
+    assert pricing.price("not a number") is None
+
+
+def test_histogram_price():
+    counts = np.zeros(BINS)
+    counts[[10, 20, 30, 40]] = 1
+    cdf = cdf_of(counts)
+    assert pricing.price(20, cdf=cdf) == 0.5
+    assert pricing.price(20, mark=25, cdf=cdf) == 0.0
+    probs = pricing.implied_probability([20, 35, math.nan], [math.nan] * 3, [cdf, None, cdf])
+    assert probs[0] == 0.5 and 0 < probs[1] < 1 and math.isnan(probs[2])
+
+
+def test_reprice_bets_command(app):
+    add_users("alice", "bob")
+    bets = add_bets(2, lower=55)
+    result = app.test_cli_runner().invoke(args=["reprice-bets"])
+    assert result.exit_code == 0, result.output
+    assert "Re-priced 2 bet(s) across 1 course(s)" in result.output
+    assert {b.implied_prob for b in bets} == {0.5}
@@ -0,0 +1,41 @@
+"""N+1 guard for the bet endpoints: the number of SQL statements must not grow with the number of bets."""
+import pytest
+
+from app import create_app
+from app.models.db import BetStatus, db
+from app.src.query_guard import QueryCounter, assert_max_queries
+import app.src.grade_extractor as ge
+
+from conftest import ASSESSMENT, TEST_CONFIG, add_bets, add_users
+
+SIZES = (1, 10, 100)
+# Upper bounds per request; exceeding them means a query crept into a loop
+LIMITS = {"update_bets": 7, "check_bets": 1, "check_open_bets": 1}
+URLS = {
+    "check_bets": "/check_bets/alice/0",
+    "check_open_bets": "/check_open_bets/bob/0",
+    "update_bets": "/update_bets/alice",
+}
+
+
+def measure(n: int, endpoint: str) -> int:
+    app = create_app(TEST_CONFIG)
+    with app.app_context():
+        add_users("alice", "bob")
+        add_bets(n)  # accepted, alice vs bob
+        add_bets(n, status=BetStatus.Pending, u2="NONE")  # open-market offers
+        app.extensions["assessment_cache"].put("CSSE2010", ge.Semester.SEM2, 2025, [{"Assessment task": ASSESSMENT}])
+        client = app.test_client()
+        with QueryCounter(db.engine) as qc:
+            assert client.get(URLS[endpoint]).status_code == 200
+        with assert_max_queries(db.engine, LIMITS[endpoint]):
+            client.get(URLS[endpoint])
+        db.session.remove()
+    return qc.count
+
+
+@pytest.mark.parametrize("endpoint", sorted(LIMITS))
+def test_queries_do_not_grow_with_bets(offline, endpoint):
+    counts = [measure(n, endpoint) for n in SIZES]
+    assert len(set(counts)) == 1, f"{endpoint}: {dict(zip(SIZES, counts))} queries"
+    assert counts[0] <= LIMITS[endpoint]
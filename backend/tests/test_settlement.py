@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from app import create_app
+from app.models.db import BetStatus, Bets, SettlementLedger, User, db
+from app.src import settlement, user_stats
+import app.views.routes as routes
+
+from conftest import GRADES, TEST_CONFIG, add_bets, add_users
+
+
+def money(name: str) -> float:
+    return db.session.get(User, name).money
+
+
+def test_outcome_u1_wins_at_or_below_lower(app):
+    add_users("alice", "bob")
+    bet, = add_bets(1, lower=15)
+    assert settlement.outcome(bet, 14.0) == BetStatus.Win
+    assert settlement.outcome(bet, 15.0) == BetStatus.Win
+    assert settlement.outcome(bet, 15.5) == BetStatus.Loss
+
+
+def test_settle_moves_stakes_and_records_ledger(app):
+    add_users("alice", "bob")
+    win, loss = add_bets(2, lower=15)
+    settled = settlement.settle([(win, 10.0), (loss, 18.0)], "user:alice")
+    db.session.commit()
+    assert {b.uuid for b in settled} == {win.uuid, loss.uuid}
+    assert (win.status, loss.status) == (BetStatus.Win, BetStatus.Loss)
+    assert money("alice") == money("bob") == 100  # +1 - 1 each
+    assert db.session.scalar(select(func.count()).select_from(SettlementLedger)) == 2
+
+
+def test_rerun_pays_nothing(app):
+    add_users("alice", "bob")
+    bets = add_bets(3, lower=15)
+    assert len(settlement.settle([(b, 10.0) for b in bets], "user:alice")) == 3
+    db.session.commit()
+    # A second pass over the same bets (e.g. a stale read of them as Accepted) is a no-op
+    assert settlement.settle([(b, 10.0) for b in bets], "assessment:x") == []
+    db.session.commit()
+    assert money("alice") == 103
+    assert money("bob") == 97
+
+
+def test_overlapping_passes_pay_each_bet_once(app):
+    add_users("alice", "bob")
+    bets = add_bets(4, lower=15)
+    first = settlement.settle([(b, 10.0) for b in bets[:3]], "user:alice")
+    second = settlement.settle([(b, 10.0) for b in bets[1:]], "assessment:x")
+    db.session.commit()
+    assert len(first) == 3
+    assert [b.uuid for b in second] == [bets[3].uuid]
+    assert money("alice") == 104
+    assert money("bob") == 96
+
+
+def test_update_bets_settles_and_keeps_stats(client, offline):
+    add_users("alice", "bob")
+    add_bets(2, lower=15)  # GRADES has 14.00: alice wins both
+    add_bets(1, status=BetStatus.Pending, u2="NONE")
+    user_stats.rebuild()
+    resp = client.get("/update_bets/alice")
+    assert resp.get_json() == {"number of bets updated": 2}
+    assert client.get("/update_bets/alice").get_json() == {"number of bets updated": 0}
+    statuses = db.session.scalars(select(Bets.status).where(Bets.u2 == "bob")).all()
+    assert statuses == [BetStatus.Win, BetStatus.Win]
+    assert money("alice") == 102
+    assert user_stats.check() == []
+    assert client.get("/user_stats/alice").get_json()["wins"] == 2
+
+
+def test_settle_assessment_route_validates_input(client, offline):
+    body = {"coursecode": "CSSE2010", "year": 2025, "semester": 2, "assessment": "Assignment 1"}
+    assert client.post("/settle_assessment", json={**body, "workers": "x"}).status_code == 400
+    assert client.post("/settle_assessment", json={**body, "year": "soon"}).status_code == 400
+    assert client.post("/settle_assessment", json={**body, "workers": 4}).status_code == 200
+
+
+def test_settle_assessment_rerun_pays_nothing(client, offline):
+    add_users("alice", "bob", "carol")
+    add_bets(2)
+    add_bets(1, u1="carol", u2="bob")
+    user_stats.rebuild()
+    body = {"coursecode": "csse2010", "year": 2025, "semester": 2, "assessment": "Assignment 1"}
+    first = client.post("/settle_assessment", json=body).get_json()
+    assert (first["bets"], first["settled"], first["unavailable"]) == (3, 3, [])
+    second = client.post("/settle_assessment", json=body).get_json()
+    assert (second["bets"], second["settled"]) == (0, 0)
+    assert (money("alice"), money("carol"), money("bob")) == (102, 101, 97)
+    assert db.session.scalar(select(func.count()).select_from(SettlementLedger)) == 3
+    assert user_stats.check() == []
+
+
+def test_overlapping_user_and_assessment_passes(tmp_path, monkeypatch):
+    """update_bets and settle_assessment both read the bets as Accepted before either settles."""
+    app = create_app({**TEST_CONFIG, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'db.sqlite'}"})
+    both_fetched = threading.Barrier(2, timeout=10)
+
+    def scrape(course_code, token, username=None):
+        both_fetched.wait()
+        return GRADES
+    monkeypatch.setattr(routes, "token_probe", lambda token: True)
+    monkeypatch.setattr(routes, "grade_scrape_with_cookie", scrape)
+    with app.app_context():
+        add_users("alice", "bob")
+        add_bets(5)
+        user_stats.rebuild()
+
+    def user_pass():
+        return app.test_client().get("/update_bets/alice").get_json()["number of bets updated"]
+
+    def assessment_pass():
+        body = {"coursecode": "CSSE2010", "year": 2025, "semester": 2, "assessment": "Assignment 1", "workers": 1}
+        return app.test_client().post("/settle_assessment", json=body).get_json()["settled"]
+
+    with ThreadPoolExecutor(2) as pool:
+        settled = [f.result() for f in [pool.submit(user_pass), pool.submit(assessment_pass)]]
+    assert sum(settled) == 5
+    with app.app_context():
+        assert (money("alice"), money("bob")) == (105, 95)
+        assert db.session.scalar(select(func.count()).select_from(SettlementLedger)) == 5
+        assert user_stats.check() == []
+        db.session.remove()
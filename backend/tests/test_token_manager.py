@@ -0,0 +1,49 @@
+import pytest
+
+from app.src.state import MemoryStateStore, SQLiteStateStore
+from app.src.token_manager import TokenManager
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def tokens(request, tmp_path):
+    store = MemoryStateStore() if request.param == "memory" else SQLiteStateStore(tmp_path / "state.sqlite")
+    mgr = TokenManager("https://bb.example", "id", "secret", early_refresh_3lo=120.0, store=store)
+    yield mgr
+    mgr.stop()
+
+
+def test_refresh_publishes_new_tokens(tokens, monkeypatch):
+    tokens.save_3lo("sid", "old", expires_in=60, refresh="rt1")
+    monkeypatch.setattr(tokens, "_fetch_3lo", lambda rt: ("new", 3600, "rt2"))
+    assert tokens.refresh_3lo_if_needed("sid") == "new"
+    assert tokens.get_3lo_access("sid") == "new"
+
+
+def test_logout_during_refresh_is_not_undone(tokens, monkeypatch):
+    tokens.save_3lo("sid", "old", expires_in=60, refresh="rt1")
+
+    def fetch(rt):
+        tokens.clear_3lo("sid")  # logout while the token call is in flight
+        return "new", 3600, "rt2"
+    monkeypatch.setattr(tokens, "_fetch_3lo", fetch)
+    tokens.refresh_3lo_if_needed("sid")
+    assert tokens.get_3lo_access("sid") is None
+
+
+def test_login_during_refresh_keeps_its_tokens(tokens, monkeypatch):
+    tokens.save_3lo("sid", "old", expires_in=60, refresh="rt1")
+
+    def fetch(rt):
+        tokens.save_3lo("sid", "fresh-login", expires_in=3600, refresh="rt9")
+        return "new", 3600, "rt2"
+    monkeypatch.setattr(tokens, "_fetch_3lo", fetch)
+    assert tokens.refresh_3lo_if_needed("sid") == "fresh-login"
+    assert tokens.get_3lo_access("sid") == "fresh-login"
+
+
+def test_refresh_of_a_cleared_session_makes_no_call(tokens, monkeypatch):
+    def fetch(rt):
+        raise AssertionError("token endpoint called for a cleared session")
+    monkeypatch.setattr(tokens, "_fetch_3lo", fetch)
+    with pytest.raises(RuntimeError):
+        tokens._refresh_3lo("sid", "rt1")
@@ -0,0 +1,39 @@
+from app.models.db import BetStatus
+from app.src import user_stats
+from app.src.user_stats import BetState
+
+from conftest import add_bets, add_users
+
+
+def test_contribution_by_status():
+    pending = BetState("alice", "NONE", BetStatus.Pending, 5, 7)
+    accepted = BetState("alice", "bob", BetStatus.Accepted, 5, 7)
+    won = BetState("alice", "bob", BetStatus.Win, 5, 7)
+    assert user_stats.contribution(pending) == {"alice": [0, 0, 0, 0, 5]}
+    assert user_stats.contribution(accepted) == {"alice": [0, 0, 5, 0, 5], "bob": [0, 0, 7, 0, 7]}
+    assert user_stats.contribution(won) == {"alice": [1, 0, 5, 5, 0], "bob": [0, 1, 7, -7, 0]}
+    assert user_stats.contribution(None) == {}
+
+
+def test_record_matches_rebuild(app):
+    add_users("alice", "bob", "carol")
+    bets = add_bets(3)
+    user_stats.rebuild()
+    bet = bets[0]
+    before = user_stats.bet_state(bet)
+    bet.status = BetStatus.Loss
+    user_stats.record([(before, user_stats.bet_state(bet))])
+    new, = add_bets(1, u1="carol", u2="NONE", status=BetStatus.Pending)
+    user_stats.record([(None, user_stats.bet_state(new))])
+    assert user_stats.check() == []
+    assert user_stats.user_stats("bob")["wins"] == 1
+    assert user_stats.user_stats("carol")["open_exposure"] == 1
+
+
+def test_leaderboard_orders_by_net_pnl(app):
+    add_users("alice", "bob")
+    add_bets(2, status=BetStatus.Win)
+    user_stats.rebuild()
+    board = user_stats.leaderboard(10, "net_pnl")
+    assert [row["username"] for row in board] == ["alice", "bob"]
+    assert board[0]["net_pnl"] == 2 and board[1]["net_pnl"] == -2
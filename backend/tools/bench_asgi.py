@@ -0,0 +1,102 @@
+"""
+Threaded (gunicorn gthread) vs ASGI (uvicorn + app/asgi.py) on the upstream-bound endpoints.
+Starts tools/fake_blackboard.py with a fixed upstream latency, then runs tools/loadtest.py
+against one process of each mode with the same number of concurrent users.
+
+    cd backend && pip install ".[asgi]" gunicorn
+    python -m tools.bench_asgi --latency-ms 500 --users 200 --threads 16 --duration 20
+"""
+from __future__ import annotations
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from tools import loadtest
+
+FAKE_PORT = 8099
+
+
+def _config() -> dict:
+    data = os.environ["BENCH_DATA_DIR"]
+    return {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{data}/app.sqlite",
+        "STATE_URL": f"sqlite:///{data}/state.sqlite",
+    }
+
+
+def wsgi_app():
+    from app import create_app
+    return create_app(_config())
+
+
+def asgi_app():
+    from app.asgi import create_asgi_app
+    return create_asgi_app(_config())
+
+
+def _wait_for(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def _serve(mode: str, port: int, threads: int, env: dict) -> subprocess.Popen:
+    if mode == "threaded":
+        cmd = [sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread", "--threads", str(threads),
+               "-b", f"127.0.0.1:{port}", "tools.bench_asgi:wsgi_app()"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "--factory", "tools.bench_asgi:asgi_app",
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16, help="gthread worker threads in threaded mode")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--modes", default="threaded,asgi")
+    args = parser.parse_args()
+
+    fake_url = f"http://127.0.0.1:{FAKE_PORT}"
+    env = dict(
+        os.environ, LEARN_BASE_URL=fake_url, MYUQ_BASE_URL=fake_url, BB_BASE_URL=fake_url,
+        BB_CLIENT_ID=os.environ.get("BB_CLIENT_ID", "dev"), BB_CLIENT_SECRET=os.environ.get("BB_CLIENT_SECRET", "dev"),
+        UPSTREAM_RATE=os.environ.get("UPSTREAM_RATE", "0"),  # measure the server, not the rate governor
+    )
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "tools.fake_blackboard", "--port", str(FAKE_PORT), "--latency-ms", str(args.latency_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for(f"{fake_url}/course-profiles/warmup")
+        for port, mode in enumerate(args.modes.split(","), start=5101):
+            with tempfile.TemporaryDirectory() as data:
+                server = _serve(mode, port, args.threads, dict(env, BENCH_DATA_DIR=data))
+                try:
+                    api = f"http://127.0.0.1:{port}"
+                    _wait_for(f"{api}/health")
+                    users = loadtest.seed(api, args.users, mode)
+                    print(f"\n=== {mode}: {args.users} users, upstream latency {args.latency_ms:.0f} ms ===")
+                    loadtest.report(loadtest.run(api, users, args.duration), args.duration)
+                finally:
+                    server.terminate()
+                    server.wait()
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
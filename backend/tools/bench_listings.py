@@ -0,0 +1,91 @@
+"""
+Rows/second for the bet listings: the old ORM path (Bets.query + to_json() + jsonify) against
+app/src/listings.py (Core select + orjson), on an in-memory DB seeded with `--bets` bets.
+Also times full check_bets requests through the test client, plain and gzip.
+
+    cd backend && python -m tools.bench_listings --bets 10000
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("BB_BASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("BB_CLIENT_ID", "dev")
+os.environ.setdefault("BB_CLIENT_SECRET", "dev")
+
+from flask import jsonify
+from sqlalchemy import or_
+
+from app import create_app
+from app.models.db import db, User, Bets, BetStatus, BetType
+from app.src import listings
+
+
+def _seed(n: int) -> None:
+    db.session.add_all([
+        User(username="alice", email="a@example.com", password="x"),
+        User(username="bob", email="b@example.com", password="x"),
+    ])
+    db.session.add_all(
+        Bets(
+            uuid=uuid.uuid4(), u1="alice", u2="bob", type=BetType.Monetary, status=BetStatus.Accepted,
+            coursecode="CSSE2010", year=2025, semester=2, assessment=f"Assignment {i % 4 + 1}",
+            upper=20, lower=10, wager1=5.0, wager2=5.0, description="benchmark bet",
+        )
+        for i in range(n)
+    )
+    db.session.commit()
+
+
+def _orm(username: str) -> bytes:
+    bets = Bets.query.filter(or_(Bets.u1 == username, Bets.u2 == username)).all()
+    return jsonify([Bets.to_json(b) for b in bets]).get_data()
+
+
+def _core(username: str) -> bytes:
+    return listings.dumps(listings.user_bets(username))
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        db.session.expunge_all()  # each ORM run builds its objects from scratch, as a request would
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bets", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant; the best is reported")
+    args = parser.parse_args()
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "STATE_URL": "memory://"})
+    print(f"encoder: {'orjson' if listings.orjson else 'json'}, brotli: {'yes' if listings.brotli else 'no'}")
+    with app.app_context():
+        _seed(args.bets)
+        with app.test_request_context():
+            assert json.loads(_orm("alice")) == json.loads(_core("alice"))
+            print(f"{'path':<28}{'ms':>10}{'rows/s':>14}")
+            for name, fn in (("ORM + to_json + jsonify", _orm), ("Core select + fast encoder", _core)):
+                t = _time(lambda: fn("alice"), args.repeat)
+                print(f"{name:<28}{t * 1000:>10.1f}{args.bets / t:>14,.0f}")
+
+    client = app.test_client()
+    print(f"\n{'GET /check_bets/alice/0':<28}{'ms':>10}{'bytes':>14}")
+    for encoding in ("identity", "gzip", "br"):
+        if encoding == "br" and listings.brotli is None:
+            continue
+        started = time.perf_counter()
+        resp = client.get("/check_bets/alice/0", headers={"Accept-Encoding": encoding})
+        elapsed = time.perf_counter() - started
+        print(f"{encoding:<28}{elapsed * 1000:>10.1f}{len(resp.get_data()):>14,}")
+
+
+if __name__ == "__main__":
+    main()
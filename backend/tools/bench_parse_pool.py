@@ -0,0 +1,81 @@
+"""
+Grade-page parse throughput with `--threads` request threads, inline vs app/src/parse_pool.py
+with `--workers` processes. While the threads parse, a probe thread measures how long a
+trivial task waits for the GIL: that is the stall other requests see.
+
+    cd backend && python -m tools.bench_parse_pool --workers 4 --threads 8 --pages 200
+"""
+from __future__ import annotations
+import argparse
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("BB_BASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("BB_CLIENT_ID", "dev")
+os.environ.setdefault("BB_CLIENT_SECRET", "dev")
+
+from app.src import parse_pool
+from app.views.routes import parse_grades_page
+
+EXAMPLE = Path(__file__).resolve().parents[2] / "example_grades.html"
+
+
+def _page(copies: int) -> str:
+    """example_grades.html with its graded rows repeated `copies` times (a long-running course)."""
+    html = EXAMPLE.read_text(encoding="utf-8")
+    starts = [m.start() for m in re.finditer(r'<div id="\d+"[^>]*sortable_item_row', html)]
+    if len(starts) < 2 or copies <= 1:
+        return html
+    block = html[starts[0]:starts[-1]]  # every row but the last (the running total)
+    return html[:starts[0]] + block * copies + html[starts[-1]:]
+
+
+def _probe(stop: threading.Event, waits: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(0.001)
+        waits.append(time.perf_counter() - started - 0.001)
+
+
+def _run(html: str, pages: int, threads: int) -> tuple[float, float]:
+    stop, waits = threading.Event(), []
+    probe = threading.Thread(target=_probe, args=(stop, waits))
+    probe.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda _: parse_pool.parse(parse_grades_page, html), range(pages)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe.join()
+    waits.sort()
+    return pages / elapsed, waits[int(len(waits) * 0.99)] if waits else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--copies", type=int, default=10, help="Repeat the example page's graded rows this many times")
+    args = parser.parse_args()
+
+    html = _page(args.copies)
+    expected = parse_grades_page(html)
+    print(f"page: {len(html):,} bytes, {len(expected.get('grades', []))} grades; {os.cpu_count()} cores")
+    print(f"{'mode':<18}{'pages/s':>10}{'p99 GIL wait ms':>18}")
+    for mode in ("inline", "pool"):
+        parse_pool.configure(args.workers if mode == "pool" else 0, max_pending=args.threads)
+        if mode == "pool":
+            parse_pool._pool.start()
+            assert parse_pool.parse(parse_grades_page, html) == expected
+        rate, wait = _run(html, args.pages, args.threads)
+        print(f"{mode:<18}{rate:>10.1f}{wait * 1000:>18.1f}")
+    parse_pool.configure(0)
+
+
+if __name__ == "__main__":
+    main()
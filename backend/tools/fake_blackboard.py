@@ -0,0 +1,119 @@
+"""
+Local stand-in for learn.uq.edu.au / my.uq.edu.au so grade paths can be benchmarked without
+a live Blackboard session. Serves:
+
+  - the myGrades stream page (example_grades.html) for any course_id, given a BbRouter cookie
+  - my.uq course pages + course profiles with an assessment table matching that grade page
+  - the Learn REST OAuth token endpoint and a stub /learn/api/public/v1/* for bb_proxy
+
+Point the API at it with:
+
+    LEARN_BASE_URL=http://127.0.0.1:8099 MYUQ_BASE_URL=http://127.0.0.1:8099 BB_BASE_URL=http://127.0.0.1:8099
+
+    cd backend && python -m tools.fake_blackboard --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import random
+import secrets
+import time
+from pathlib import Path
+
+from flask import Flask, abort, jsonify, request
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_GRADES = REPO_ROOT / "example_grades.html"
+
+# Matches the graded items on example_grades.html (spelt the way the course profile spells them)
+ASSESSMENTS = [
+    ("Assignment 1", "Assignment", "25%", "23/08/2024 4:00 pm"),
+    ("Assignment 2 - Event Detection", "Assignment", "25%", "13/09/2024 4:00 pm"),
+    ("Assignment 3: fMRI", "Assignment", "25%", "11/10/2024 4:00 pm"),
+    ("Assignment 4: Conference paper", "Paper/ Report/ Annotation", "25%", "1/11/2024 4:00 pm"),
+]
+SEMESTERS = ("Semester 1", "Semester 2", "Summer Semester")
+
+
+def create_fake(latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, grades_file: Path = DEFAULT_GRADES) -> Flask:
+    app = Flask(__name__)
+    grades_html = grades_file.read_text(encoding="utf-8")
+
+    @app.before_request
+    def _inject_latency_and_errors():
+        delay = max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000 if latency_ms or jitter_ms else 0.0
+        if delay:
+            time.sleep(delay)
+        if error_rate and random.random() < error_rate:
+            return "Service Unavailable (injected)", 503
+
+    # ---- learn.uq.edu.au: grade page ----
+    @app.get("/webapps/bb-mygrades-BB5fd17f67f4120/myGrades")
+    def my_grades():
+        cookie = request.cookies.get("BbRouter")
+        if not cookie or cookie == "expired":
+            return "Unauthorized", 401
+        return grades_html
+
+    # ---- my.uq.edu.au: course page + profiles ----
+    @app.get("/programs-courses/course.html")
+    def course_page():
+        code = request.args.get("course_code", "")
+        if code.upper().startswith("NOPE"):
+            return '<div id="course-notfound">Course not found</div>'
+        year = datetime.date.today().year
+        rows = []
+        for y in (year - 1, year):
+            for i, sem in enumerate(SEMESTERS, 1):
+                href = f"{request.host_url}course-profiles/{code}-{i}-{y}"
+                rows.append(
+                    f'<tr><td>{sem}, {y}</td><td>St Lucia</td><td>Internal</td>'
+                    f'<td><a class="profile-available" href="{href}">Course profile</a></td></tr>'
+                )
+        return f"<html><body><table><tbody>{''.join(rows)}</tbody></table></body></html>"
+
+    @app.get("/course-profiles/<profile_id>")
+    def course_profile(profile_id: str):
+        rows = "".join(
+            f"<tr><td>{name}<ul class='icon-list'><li>Individual</li></ul></td><td>{cat}</td><td>{weight}</td><td>{due}</td></tr>"
+            for name, cat, weight, due in ASSESSMENTS
+        )
+        return (
+            "<html><body><h1>Course profile</h1><table><thead><tr><th>Assessment task</th><th>Category</th>"
+            f"<th>Weight</th><th>Due date</th></tr></thead><tbody>{rows}</tbody></table></body></html>"
+        )
+
+    # ---- Learn REST ----
+    @app.post("/learn/api/public/v1/oauth2/token")
+    def token():
+        return jsonify(
+            access_token=secrets.token_urlsafe(24),
+            token_type="bearer",
+            expires_in=3600,
+            refresh_token=secrets.token_urlsafe(24),
+        )
+
+    @app.route("/learn/api/public/v1/<path:rest>", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    def rest_stub(rest: str):
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            abort(401)
+        return jsonify(path=rest, results=[{"id": "_1_1", "name": "stub"}])
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Std-dev of the added latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 503")
+    parser.add_argument("--grades-file", type=Path, default=DEFAULT_GRADES)
+    args = parser.parse_args()
+    app = create_fake(args.latency_ms, args.jitter_ms, args.error_rate, args.grades_file)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Concurrent-user load test against a running API (normally pointed at tools/fake_blackboard.py).
+Seeds users with BbRouter tokens and accepted bets, gets each user a 3LO session, then has
+`--users` simulated users loop over course_check, grade_check, update_bets, bb_proxy and assessments
+for `--duration` seconds. Reports per-endpoint p50/p95/p99 latency, error count and throughput.
+
+    cd backend && python -m tools.fake_blackboard --latency-ms 150 --jitter-ms 50 &
+    LEARN_BASE_URL=http://127.0.0.1:8099 MYUQ_BASE_URL=http://127.0.0.1:8099 \
+        BB_BASE_URL=http://127.0.0.1:8099 BB_CLIENT_ID=dev BB_CLIENT_SECRET=dev UPSTREAM_RATE=0 \
+        gunicorn -w 4 --threads 8 -b 127.0.0.1:5000 "app:create_app()" &
+    python -m tools.loadtest --api http://127.0.0.1:5000 --users 50 --duration 30
+"""
+from __future__ import annotations
+import argparse
+import random
+import secrets
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+import requests
+
+COURSE = "CSSE2010"
+ASSESSMENT = "Assignment 1"
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+
+def seed(api: str, n_users: int, run: str) -> list[dict]:
+    """Create users (with a BbRouter token and a 3LO sid each) and one accepted bet per pair."""
+    def create(i: int) -> dict:
+        name = f"load-{run}-{i}"
+        r = requests.post(f"{api}/create_user", json={"username": name, "password": "x", "email": f"{name}@example.com"})
+        r.raise_for_status()
+        requests.get(f"{api}/update_token/{name}/{secrets.token_urlsafe(12)}").raise_for_status()
+        return {"username": name, "sid": _login_3lo(api)}
+
+    # Each user costs a couple of upstream round trips (token check, 3LO exchange): seed in parallel
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        users = list(pool.map(create, range(n_users)))
+    for a, b in zip(users[::2], users[1::2]):
+        requests.post(f"{api}/create_bet", json={
+            "u1": a["username"], "coursecode": COURSE, "year": 2025, "semester": 2, "assessment": ASSESSMENT,
+            "upper": 20, "lower": 15, "wager1": 1, "wager2": 1, "description": "loadtest",
+        }).raise_for_status()
+        for bet in requests.get(f"{api}/check_bets/{a['username']}/1").json():
+            requests.post(f"{api}/accept_open_bet/{b['username']}/{bet['uuid']}").raise_for_status()
+    return users
+
+
+def _login_3lo(api: str) -> str | None:
+    """Run the 3LO callback directly (the fake token endpoint accepts any code)."""
+    state = f"xsrf_{secrets.token_urlsafe(8)}"
+    r = requests.get(
+        f"{api}/auth/3lo/callback", params={"code": "loadtest", "state": state},
+        cookies={"oauth_state": state}, allow_redirects=False,
+    )
+    # The sid cookie is Secure, so a plain-http client jar drops it: read Set-Cookie instead
+    jar = SimpleCookie()
+    for header in r.raw.headers.getlist("Set-Cookie"):
+        jar.load(header)
+    return jar["sid"].value if "sid" in jar else None
+
+
+def _actions(user: dict) -> list[tuple[str, str, dict]]:
+    name = user["username"]
+    cookies = {"sid": user["sid"]} if user["sid"] else {}
+    return [
+        ("course_check", f"/course_check/{name}/{COURSE}", {}),
+        ("grade_check", f"/grade_check/{name}/{COURSE}", {}),
+        ("update_bets", f"/update_bets/{name}", {}),
+        ("bb_proxy", "/api/bb/learn/api/public/v1/users/me", cookies),
+        ("assessments", f"/courses/{COURSE}/2/2025/assessments", {}),
+    ]
+
+
+def run(api: str, users: list[dict], duration: float) -> dict[str, list[tuple[float, bool]]]:
+    samples: dict[str, list[tuple[float, bool]]] = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user_loop(user: dict) -> None:
+        session = requests.Session()
+        actions = _actions(user)
+        while time.monotonic() < deadline:
+            name, path, cookies = random.choice(actions)
+            started = time.perf_counter()
+            try:
+                ok = session.get(api + path, cookies=cookies, timeout=60).status_code < 500
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[name].append((elapsed, ok))
+
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        list(pool.map(user_loop, users))
+    return samples
+
+
+def report(samples: dict[str, list[tuple[float, bool]]], duration: float) -> None:
+    print(f"{'endpoint':<14}{'reqs':>8}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    total = 0
+    for name in sorted(samples):
+        rows = samples[name]
+        lat = sorted(t for t, _ in rows)
+        errors = sum(1 for _, ok in rows if not ok)
+        total += len(rows)
+        print(
+            f"{name:<14}{len(rows):>8}{errors:>8}{len(rows) / duration:>9.1f}"
+            f"{_percentile(lat, 50) * 1000:>10.1f}{_percentile(lat, 95) * 1000:>10.1f}{_percentile(lat, 99) * 1000:>10.1f}"
+        )
+    print(f"{'total':<14}{total:>8}{'':>8}{total / duration:>9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://127.0.0.1:5000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to drive load for")
+    args = parser.parse_args()
+    api = args.api.rstrip("/")
+    users = seed(api, args.users, secrets.token_hex(3))
+    print(f"seeded {len(users)} users ({sum(1 for u in users if u['sid'])} with a 3LO session)")
+    samples = run(api, users, args.duration)
+    report(samples, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Offline CPU profile of the scraping paths. `record` runs each scenario once against the live
+(or LEARN_BASE_URL / MYUQ_BASE_URL / BB_BASE_URL configured) hosts and saves the exchanges
+to a tape; `replay` runs them from the tape with no network, so CPU time per call can be
+compared between versions.
+
+    cd backend && python -m tools.profile_upstream record --tape data/profile.tape.gz --cookie "$BBROUTER"
+    python -m tools.profile_upstream replay --tape data/profile.tape.gz --iterations 50 [--timing] [--profile]
+"""
+from __future__ import annotations
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import time
+
+os.environ.setdefault("BB_BASE_URL", "https://learn.uq.edu.au")
+os.environ.setdefault("BB_CLIENT_ID", "dev")
+os.environ.setdefault("BB_CLIENT_SECRET", "dev")
+
+from app import create_app
+from app.src import upstream
+from app.src.assessment_cache import current_offering
+import app.src.grade_extractor as ge
+import app.views.routes as routes
+
+
+def scenarios(app, course: str, cookie: str) -> dict:
+    sem, year = current_offering()
+    mgr = app.extensions["bb_tokens"]
+
+    def grade_scrape():
+        with app.app_context():
+            return routes.grade_scrape_with_cookie(course, cookie)
+
+    def course_extractor():
+        ge.CourseExtractor._offerings.clear()  # measure the page fetch + parse, not the offerings cache
+        extractor = ge.CourseExtractor(courses=[course])
+        return extractor.get_table(extractor.get_page(course, sem, year))
+
+    def token_manager():
+        return mgr._fetch_2lo()
+
+    return {"grade_scrape_with_cookie": grade_scrape, "CourseExtractor": course_extractor, "TokenManager": token_manager}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--tape", default="data/profile.tape.gz")
+    parser.add_argument("--course", default="CSSE2010")
+    parser.add_argument("--cookie", default=os.environ.get("BBROUTER", "replay"), help="BbRouter cookie (record only)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--timing", action="store_true", help="Replay with the recorded upstream latency")
+    parser.add_argument("--profile", action="store_true", help="Print the top cProfile entries per scenario")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.mode == "record" and os.path.exists(args.tape):
+        os.remove(args.tape)
+    upstream.use_tape(args.tape, args.mode, timing=args.timing)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "STATE_URL": "memory://"})
+    iterations = 1 if args.mode == "record" else args.iterations
+
+    results = {}
+    for name, fn in scenarios(app, args.course, args.cookie).items():
+        profiler = cProfile.Profile() if args.profile else None
+        wall = cpu = 0.0
+        error = None
+        for _ in range(iterations):
+            w0, c0 = time.perf_counter(), time.process_time()
+            if profiler:
+                profiler.enable()
+            try:
+                fn()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                if profiler:
+                    profiler.disable()
+            wall += time.perf_counter() - w0
+            cpu += time.process_time() - c0
+        results[name] = {"iterations": iterations, "wall_ms": wall / iterations * 1000, "cpu_ms": cpu / iterations * 1000, "error": error}
+        if profiler:
+            print(f"--- {name} ---")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+    if args.mode == "record":
+        print(f"recorded {len(upstream.use_tape(args.tape, 'replay'))} exchanges to {args.tape}")
+        upstream.use_tape(None)
+    print(f"{'scenario':<26}{'wall ms':>10}{'cpu ms':>10}  error")
+    for name, r in results.items():
+        print(f"{name:<26}{r['wall_ms']:>10.2f}{r['cpu_ms']:>10.2f}  {r['error'] or ''}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Times grade_parser.parse_grades_page on saved grade pages for the full field set, the
+full set with lazy feedback, and the minimal set settlement needs (name + marks).
+
+    python gambler/bench_grade_parser.py                      # example_grades.html
+    python gambler/bench_grade_parser.py page1.html page2.htm --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from grade_parser import FIELDS, MINIMAL_FIELDS, parse_grades_page
+
+DEFAULT_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'example_grades.html')
+
+VARIANTS = {
+    'full': dict(fields=FIELDS),
+    'full, lazy feedback': dict(fields=FIELDS, lazy_feedback=True),
+    'minimal (name, marks)': dict(fields=MINIMAL_FIELDS),
+}
+
+
+def bench(html_content, repeat, **kwargs):
+    """Best-of-3 mean milliseconds per parse."""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            parse_grades_page(html_content, **kwargs)
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', default=[DEFAULT_PAGE])
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    for path in args.pages:
+        with open(path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        rows = len(parse_grades_page(html_content, MINIMAL_FIELDS)['assessments'])
+        print(f'{os.path.basename(path)}: {len(html_content):,} bytes, {rows} assessments')
+        baseline = None
+        for name, kwargs in VARIANTS.items():
+            ms = bench(html_content, args.repeat, **kwargs)
+            baseline = baseline or ms
+            print(f'  {name:<24}{ms:>8.2f} ms{baseline / ms:>8.2f}x  {1000 / ms:>8.0f} pages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,64 +1,149 @@
 import json
 import re
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import argparse
+import datetime
+import glob
 import html
+import multiprocessing
+import os
+import sys
+import time
 
-def parse_grades_page(html_content):
-    """
-    Parses the HTML content of a Blackboard grades page to extract course
-    and assessment information.
+# Per-assessment fields parse_grades_page can extract, and the key each is returned under
+FIELD_KEYS = {
+    'name': 'name',
+    'marks': 'mark_achieved',
+    'possible': 'mark_possible',
+    'feedback': 'feedback',
+    'status': 'status',
+}
+FIELDS = frozenset(FIELD_KEYS)
+# What settlement needs
+MINIMAL_FIELDS = frozenset({'name', 'marks'})
 
-    Args:
-        html_content (str): The HTML content of the page as a string.
+_CONTEXT = re.compile(r'<span class="context">(.*?)</span>', re.S)
+_COURSE = re.compile(r'\[(.*?)\]\s*(.*?)\s*\((.*?)\)')
+# Second argument (the HTML content) of the lightbox call in a feedback link's onclick
+_FEEDBACK = re.compile(r"mygrades\.showInLightBox\s*\(\s*'.*?',\s*'(.*?)',\s*'.*?'\s*\);")
 
-    Returns:
-        dict: A dictionary containing the course information and a list of
-              assessments, ready to be serialized to JSON.
+
+def feedback_text(onclick):
+    """Plain text of the feedback embedded in a comment icon's onclick attribute (None if absent)."""
+    feedback_match = _FEEDBACK.search(onclick)
+    if not feedback_match:
+        return None
+    # Use the html module to robustly unescape the string
+    feedback_html = html.unescape(feedback_match.group(1))
+    feedback_soup = BeautifulSoup(feedback_html, 'html.parser')
+    return feedback_soup.get_text(strip=True, separator=' ')
+
+
+class LazyFeedback:
+    """
+    A row's feedback kept as the raw onclick attribute until it's read: the regex, unescape and
+    second parse only run for rows whose feedback is actually used.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    __slots__ = ('onclick', '_text', '_resolved')
 
-    # --- 1. Extract Course Information ---
+    def __init__(self, onclick):
+        self.onclick = onclick
+        self._text = None
+        self._resolved = False
+
+    @property
+    def text(self):
+        if not self._resolved:
+            self._text = feedback_text(self.onclick)
+            self._resolved = True
+        return self._text
+
+    def __str__(self):
+        return self.text or ''
+
+    def __eq__(self, other):
+        if isinstance(other, LazyFeedback):
+            other = other.text
+        return self.text == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'LazyFeedback({self.text!r})' if self._resolved else 'LazyFeedback(<unparsed>)'
+
+
+def _course_info(html_content):
     course_info = {
         'course_code': None,
         'course_name': None,
         'course_id': None,
     }
-    context_span = soup.find('span', class_='context')
-    if context_span:
-        context_text = context_span.get_text(strip=True)
+    # The context span is plain text: read it with a regex instead of parsing the whole page
+    context = _CONTEXT.search(html_content)
+    if context:
+        inner = context.group(1)
+        context_text = BeautifulSoup(inner, 'html.parser').get_text(strip=True) if '<' in inner else html.unescape(inner).strip()
         # Example: [ENGG3800] Team Project II (St Lucia). Semester 2, 2024 (ENGG3800_7460_60972)
-        match = re.search(r'\[(.*?)\]\s*(.*?)\s*\((.*?)\)', context_text)
+        match = _COURSE.search(context_text)
         if match:
             course_info['course_code'] = match.group(1).strip()
             course_info['course_name'] = match.group(2).strip()
             course_info['course_id'] = match.group(3).strip()
+    return course_info
+
+
+def parse_grades_page(html_content, fields=FIELDS, lazy_feedback=False):
+    """
+    Parses the HTML content of a Blackboard grades page to extract course
+    and assessment information.
+
+    Args:
+        html_content (str): The HTML content of the page as a string.
+        fields (Iterable[str]): Assessment fields to extract, from FIELDS
+            (name, marks, possible, feedback, status). Fields not asked for are
+            neither extracted nor included in the result.
+        lazy_feedback (bool): Return feedback as LazyFeedback objects that are
+            only extracted when read, instead of as strings.
+
+    Returns:
+        dict: A dictionary containing the course information and a list of
+              assessments, ready to be serialized to JSON (unless lazy_feedback).
+    """
+    fields = frozenset(fields)
+    unknown = fields - FIELDS
+    if unknown:
+        raise ValueError(f"Unknown grade fields: {', '.join(sorted(unknown))}")
+
+    # --- 1. Extract Course Information ---
+    course_info = _course_info(html_content)
 
     # --- 2. Extract Assessment Information ---
+    # Only the grade rows are needed from the page: skip the markup before them and don't
+    # build a tree for anything outside them
+    wrapper_at = html_content.find('id="grades_wrapper"')
+    rows_html = html_content[html_content.rfind('<', 0, wrapper_at):] if wrapper_at > 0 else html_content
+    soup = BeautifulSoup(rows_html, 'html.parser', parse_only=SoupStrainer(id='grades_wrapper'))
     assessments = []
     # Each assessment item is in a div with this class
     assessment_rows = soup.select('#grades_wrapper > .sortable_item_row')
+    keys = [FIELD_KEYS[f] for f in FIELD_KEYS if f in fields]
+    want_marks = 'marks' in fields or 'possible' in fields
 
     for row in assessment_rows:
-        assessment_data = {
-            'name': None,
-            'mark_achieved': None,
-            'mark_possible': None,
-            'feedback': None,
-            'status': None,
-        }
+        assessment_data = dict.fromkeys(keys)
 
         # Extract Name from the first span or link in the 'gradable' cell
-        name_cell = row.find('div', class_='gradable')
-        if name_cell:
-            name_tag = name_cell.find(['span', 'a'])
-            if name_tag:
-                assessment_data['name'] = name_tag.get_text(strip=True)
+        if 'name' in fields:
+            name_cell = row.find('div', class_='gradable')
+            if name_cell:
+                name_tag = name_cell.find(['span', 'a'])
+                if name_tag:
+                    assessment_data['name'] = name_tag.get_text(strip=True)
 
         # Extract Grade/Mark from the 'grade' cell
-        grade_cell = row.find('div', class_='grade')
+        grade_cell = row.find('div', class_='grade') if want_marks else None
         if grade_cell:
-            mark_span = grade_cell.find('span', class_='grade')
+            mark_span = grade_cell.find('span', class_='grade') if 'marks' in fields else None
             if mark_span:
                 mark_text = mark_span.get_text(strip=True)
                 try:
@@ -67,7 +152,7 @@ def parse_grades_page(html_content):
                     # Handle non-numeric grades like '-'
                     assessment_data['mark_achieved'] = None
 
-            possible_span = grade_cell.find('span', class_='pointsPossible')
+            possible_span = grade_cell.find('span', class_='pointsPossible') if 'possible' in fields else None
             if possible_span:
                 possible_text = possible_span.get_text(strip=True).replace('/', '')
                 try:
@@ -76,23 +161,22 @@ def parse_grades_page(html_content):
                     assessment_data['mark_possible'] = None
 
         # Extract Feedback from the 'onclick' attribute of the comment icon
-        feedback_link = row.find('a', class_='grade-feedback')
-        if feedback_link and 'onclick' in feedback_link.attrs:
-            onclick_attr = feedback_link['onclick']
-            # Regex to capture the second argument (the HTML content) of the JS function
-            feedback_match = re.search(r"mygrades\.showInLightBox\s*\(\s*'.*?',\s*'(.*?)',\s*'.*?'\s*\);", onclick_attr)
-            if feedback_match:
-                # Use the html module to robustly unescape the string
-                feedback_html = html.unescape(feedback_match.group(1))
-                feedback_soup = BeautifulSoup(feedback_html, 'html.parser')
-                assessment_data['feedback'] = feedback_soup.get_text(strip=True, separator=' ')
+        if 'feedback' in fields:
+            feedback_link = row.find('a', class_='grade-feedback')
+            if feedback_link and 'onclick' in feedback_link.attrs:
+                onclick_attr = feedback_link['onclick']
+                if lazy_feedback:
+                    assessment_data['feedback'] = LazyFeedback(onclick_attr)
+                else:
+                    assessment_data['feedback'] = feedback_text(onclick_attr)
 
         # Extract Status from the alt text of the image in the 'gradeStatus' cell
-        status_cell = row.find('div', class_='gradeStatus')
-        if status_cell:
-            status_img = status_cell.find('img')
-            if status_img and 'alt' in status_img.attrs:
-                assessment_data['status'] = status_img['alt']
+        if 'status' in fields:
+            status_cell = row.find('div', class_='gradeStatus')
+            if status_cell:
+                status_img = status_cell.find('img')
+                if status_img and 'alt' in status_img.attrs:
+                    assessment_data['status'] = status_img['alt']
 
         assessments.append(assessment_data)
 
@@ -102,21 +186,103 @@ def parse_grades_page(html_content):
         'assessments': assessments
     }
 
-if __name__ == '__main__':
-    # Default file path if not provided via command line arguments
-    # In a real application, you might get this from user input or configuration
-    file_path = '/Users/felixpountney/Desktop/Hackathon/2025-uqcs-hackathon/gambler/Blackboard_example_grade.htm'
-    
-    
+PAGE_SUFFIXES = ('.htm', '.html')
+
+
+def find_pages(inputs):
+    """Saved pages named by `inputs`: files, directories (searched recursively) or glob patterns."""
+    pages = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                pages.extend(os.path.join(root, f) for f in files if f.lower().endswith(PAGE_SUFFIXES))
+        elif os.path.isfile(item):
+            pages.append(item)
+        else:
+            pages.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(set(pages))
 
+
+def parse_file(job):
+    """Pool task: (path, fields) -> (path, JSON line or None, error or None)."""
+    path, fields = job
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
             html_content = f.read()
+        if 'id="grades_wrapper"' not in html_content:
+            return path, None, 'not a grades page (no grades_wrapper)'
+        grade_data = parse_grades_page(html_content, fields)
+        modified = datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc)
+        record = {'file': path, 'modified': modified.isoformat(timespec='seconds'), **grade_data}
+        return path, json.dumps(record, ensure_ascii=False), None
+    except Exception as e:
+        return path, None, f'{type(e).__name__}: {e}'
 
-        grade_data = parse_grades_page(html_content)
-        print(json.dumps(grade_data, indent=2))
 
-    except FileNotFoundError: # type: ignore
-        print(f"Error: The file was not found at {file_path}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+def main():
+    parser = argparse.ArgumentParser(
+        description='Parse saved Blackboard grade pages into JSON lines, one per page, across a process pool.',
+    )
+    parser.add_argument('inputs', nargs='+', help='Grade pages, directories of them, or glob patterns (quote them)')
+    parser.add_argument('-o', '--output', help='Write JSON lines here instead of stdout')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        '--fields', default=','.join(FIELD_KEYS),
+        help=f"Comma-separated assessment fields (default: all of {', '.join(FIELD_KEYS)})",
+    )
+    parser.add_argument('--errors', help='Also write the per-file error report here (JSON lines)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='No progress output')
+    args = parser.parse_args()
+
+    fields = frozenset(f.strip() for f in args.fields.split(',') if f.strip())
+    if fields - FIELDS:
+        parser.error(f"unknown field(s): {', '.join(sorted(fields - FIELDS))}")
+    pages = find_pages(args.inputs)
+    if not pages:
+        parser.error('no grade pages found')
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    live = not args.quiet and sys.stderr.isatty()
+    errors = []
+    done = 0
+    started = last_update = time.perf_counter()
+
+    def progress(end=''):
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        print(f'\r{done}/{len(pages)} pages, {len(errors)} failed, {rate:.0f} pages/s', end=end, file=sys.stderr)
+
+    try:
+        with multiprocessing.Pool(max(1, min(args.workers, len(pages)))) as pool:
+            # Unordered: each line is written as soon as its page is parsed
+            results = pool.imap_unordered(parse_file, [(p, fields) for p in pages], chunksize=4)
+            for path, line, error in results:
+                done += 1
+                if error:
+                    errors.append({'file': path, 'error': error})
+                else:
+                    out.write(line + '\n')
+                if time.perf_counter() - last_update > 0.25:
+                    last_update = time.perf_counter()
+                    out.flush()
+                    if live:
+                        progress()
+    except BrokenPipeError:
+        # Output piped into something that stopped reading (e.g. head)
+        sys.stdout = open(os.devnull, 'w')
+        return 1
+    finally:
+        if args.output:
+            out.close()
+    if not args.quiet:
+        progress(end='\n')
+
+    for e in errors:
+        print(f"error: {e['file']}: {e['error']}", file=sys.stderr)
+    if args.errors:
+        with open(args.errors, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(e) + '\n' for e in errors)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
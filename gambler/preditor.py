@@ -1,7 +1,7 @@
 import numpy as np
 from scipy.stats import norm
 
-def calculate_grade_probability(current_marks, remaining_marks_possible, target_grade_min, target_grade_max):
+def calculate_grade_probability(current_marks, remaining_marks_possible, target_grade_min, target_grade_max, grade_cdf=None):
     """
     Calculates the probability of a student reaching a certain grade.
 
@@ -10,6 +10,10 @@ def calculate_grade_probability(current_marks, remaining_marks_possible, target_
         remaining_marks_possible (float): The remaining marks possible to achieve.
         target_grade_min (float): The minimum percentage for the target grade.
         target_grade_max (float): The maximum percentage for the target grade.
+        grade_cdf (array, optional): An empirical grade distribution for the
+            assessment: grade_cdf[i] is the share of grades below i, for whole
+            grades 0..100 (102 entries, as built by the backend's grade_histograms).
+            When given it replaces the normal assumption with two array lookups.
 
     Returns:
         float: The probability of the student reaching the target grade.
@@ -23,6 +27,13 @@ def calculate_grade_probability(current_marks, remaining_marks_possible, target_
         else:
             return 0.0
 
+    if grade_cdf is not None:
+        if target_grade_max < target_grade_min:
+            return 0.0
+        lowest = int(np.clip(np.floor(target_grade_min), 0, len(grade_cdf) - 2))
+        highest = int(np.clip(np.floor(target_grade_max), 0, len(grade_cdf) - 2))
+        return float(grade_cdf[highest + 1] - grade_cdf[lowest])
+
     # The final grade for the course is assumed to follow a normal distribution
     # with a mean of 55 and a standard deviation of 15.
     mean_final_grade = 55